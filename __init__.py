@@ -7,84 +7,21 @@ bl_info = {
     "version": (2, 1),
 }
 
-import bpy
-from . import ui, bake_settings, texture_manager
+from . import ui, node_cache, bake_cache, bake_tuning, bake_settings, bake_queue, texture_index, texture_manager, channel_pack, atlas_bake, spool_export
 
-def register():
-    ui.register()
-    bake_settings.register()
-    texture_manager.register()
-    
-    # Samples用のプロパティを定義
-    bpy.types.Scene.simple_bake_samples = bpy.props.EnumProperty(
-        name="Samples",
-        description="Set the number of samples for rendering",
-        items=[
-            ('1', "1", ""),
-            ('8', "8", ""),
-            ('64', "64", ""),
-            ('256', "256", ""),
-            ('1024', "1024", "")
-        ],
-        default='1'
-    )
-    
-    # UVチャンネル用のプロパティを定義
-    bpy.types.Scene.simple_bake_uv_channel = bpy.props.IntProperty(
-        name="Set Bake UV",
-        description="Set the UV channel to be used for baking",
-        default=0,
-        min=0,
-        max=10
-    )
-    
-    # 元のUVチャンネルに戻すかどうかのチェックボックスプロパティを定義
-    bpy.types.Scene.simple_bake_return_to_original_uv = bpy.props.BoolProperty(
-        name="Return to Selected UV",
-        description="Return to the selected UV channel after baking",
-        default=True
-    )
-
-    # Bake Type用のプロパティを定義
-    bpy.types.Scene.simple_bake_type = bpy.props.EnumProperty(
-        name="Bake Type",
-        description="Choose the type of bake",
-        items=[
-            ('EMIT', "Emit", ""),
-            ('NORMAL', "Normal", ""),
-            ('SHADOW', "Shadow", ""),
-            ('AO', "AO", "")
-        ],
-        default='EMIT'
-    )
+# 各モジュールが自分のクラスと Scene プロパティを登録する
+# NumPy を使う処理は、その機能が使われたときに読み込まれる
+_modules = (ui, node_cache, bake_cache, bake_tuning, bake_settings, bake_queue, texture_index, texture_manager, channel_pack, atlas_bake, spool_export)
 
-    # Auto Save用のプロパティを定義
-    bpy.types.Scene.simple_bake_auto_save = bpy.props.BoolProperty(
-        name="Auto Save",
-        description="Automatically save the image after baking",
-        default=False
-    )
 
-    # Render Samplesを元に戻すプロパティを定義
-    bpy.types.Scene.simple_bake_return_to_render_samples = bpy.props.BoolProperty(
-        name="Return to Render Samples",
-        description="Return to the original Render Samples after baking",
-        default=True
-    )
+def register():
+    for module in _modules:
+        module.register()
 
 
 def unregister():
-    ui.unregister()
-    bake_settings.unregister()
-    texture_manager.unregister()
-    
-    # プロパティを削除
-    del bpy.types.Scene.simple_bake_samples
-    del bpy.types.Scene.simple_bake_uv_channel
-    del bpy.types.Scene.simple_bake_return_to_original_uv
-    del bpy.types.Scene.simple_bake_type
-    del bpy.types.Scene.simple_bake_auto_save
-    del bpy.types.Scene.simple_bake_return_to_render_samples
+    for module in reversed(_modules):
+        module.unregister()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+import bpy
+import numpy as np
+
+from . import tiled_bake
+
+# ノイズを測りながらサンプル数を上げていくベイク
+# 同じサンプル数で seed を変えて 2 回ベイクし、その差から領域ごとのノイズを見積もる
+# ノイズが閾値以下になった画像は確定し、残りの画像だけをサンプル数を上げてベイクし直す
+# 各回の結果はサンプル数で重み付けして平均するので、前の回のサンプルも無駄にならない
+# 全ての回のサンプル数の合計は Samples (max_samples) を超えない
+
+SAMPLE_GROWTH = 4
+NOISE_GRID = 8
+
+
+def read_pixels(img):
+    width, height = img.size
+    pixels = np.empty(width * height * img.channels, np.float32)
+    img.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, img.channels)
+
+
+def estimate_noise(first, second, grid=NOISE_GRID):
+    """2 回のベイクの差から、平均した画像に残るノイズ (標準偏差) を領域ごとに見積もり最大値を返す
+
+    各ベイクの分散は E[(a - b)^2] / 2 で、2 回の平均ではその半分になる
+    ベイクされていない (どちらも 0 の) テクセルは計算に含めない
+    """
+    color_channels = min(3, first.shape[2])
+    diff = first[:, :, :color_channels] - second[:, :, :color_channels]
+    squared = np.mean(diff * diff, axis=2)
+    covered = np.any(first[:, :, :color_channels] != 0.0, axis=2) | np.any(second[:, :, :color_channels] != 0.0, axis=2)
+
+    height, width = squared.shape
+    rows = np.array_split(np.arange(height), min(grid, height))
+    cols = np.array_split(np.arange(width), min(grid, width))
+    worst = 0.0
+    for row in rows:
+        for col in cols:
+            mask = covered[row[0]:row[-1] + 1, col[0]:col[-1] + 1]
+            count = np.count_nonzero(mask)
+            if count:
+                region = squared[row[0]:row[-1] + 1, col[0]:col[-1] + 1][mask]
+                worst = max(worst, float(np.sqrt(region.sum() / count / 4.0)))
+    return worst
+
+
+def bake_adaptive_pass(bake_pass, objects, scene, view_layer, min_samples, max_samples, threshold, report):
+    """ノイズが閾値以下になるまでサンプル数を上げてベイクし、{画像名: 実効サンプル数} を返す"""
+    images = {name: bpy.data.images[name] for name in bake_pass.image_names if name in bpy.data.images}
+    # 1 サンプルでは 2 回に分けられないので普通にベイクする
+    if not images or max_samples < 2:
+        bpy.ops.object.bake(type=bake_pass.bake_type)
+        return {}
+
+    nodes = []
+    for mat_name, node_name, image_name in bake_pass.nodes:
+        nodes.append((bpy.data.materials[mat_name].node_tree.nodes[node_name], image_name))
+    materials_by_image = {}
+    for mat_name, _node_name, image_name in bake_pass.nodes:
+        materials_by_image.setdefault(image_name, set()).add(mat_name)
+
+    original_seed = scene.cycles.seed
+    original_samples = scene.cycles.samples
+    selection = [obj for obj in view_layer.objects if obj.select_get()]
+    scratch = None
+    pending = set(images)
+    used_samples = {}
+    accumulated = {}  # 画像名 → これまでの回のピクセルのサンプル数で重み付けした和
+    total = 0  # 未確定の画像にこれまでベイクしたサンプル数の合計 (未確定の画像は全て同じ回をベイクする)
+    # 1 回は seed を変えた 2 回のベイクなので、1 回のベイクは max_samples の半分まで
+    samples = max(1, min(min_samples, max_samples // 2))
+    round_index = 0
+    try:
+        while pending:
+            # 未確定の画像を使うオブジェクトだけを選択し、確定した画像のノードは捨て画像に向ける
+            pending_materials = set().union(*(materials_by_image[name] for name in pending))
+            for obj in objects:
+                obj.select_set(any(slot.material and slot.material.name in pending_materials for slot in obj.material_slots))
+            if len(pending) < len(images):
+                scratch = scratch or tiled_bake.get_scratch_image()
+                for node, image_name in nodes:
+                    node.image = images[image_name] if image_name in pending else scratch
+
+            scene.cycles.samples = samples
+            passes = []
+            # 回ごとに別の seed を使う (同じ seed では前の回と同じサンプルが含まれ、平均しても減らない)
+            for seed_offset in (0, 1):
+                scene.cycles.seed = original_seed + round_index * 2 + seed_offset
+                bpy.ops.object.bake(type=bake_pass.bake_type)
+                passes.append({name: read_pixels(images[name]) for name in pending})
+            round_index += 1
+
+            total += samples * 2
+            # 次の回にベイクできるサンプル数 (0 ならこれ以上ベイクできない)
+            next_samples = min(samples * SAMPLE_GROWTH, (max_samples - total) // 2)
+            for name in list(pending):
+                first, second = passes[0][name], passes[1][name]
+                # この回の 2 回のベイクのノイズを、これまでの全サンプルの平均のノイズに換算する
+                noise = estimate_noise(first, second) * (samples * 2 / total) ** 0.5
+                accumulated[name] = accumulated.get(name, 0.0) + (first + second) * samples
+                images[name].pixels.foreach_set((accumulated[name] / total).ravel())
+                images[name].update()
+                if noise <= threshold or next_samples < 1:
+                    used_samples[name] = total
+                    pending.discard(name)
+                    del accumulated[name]
+                    report({'INFO'}, f"{name}: {total} samples (noise {noise:.4f})")
+            samples = next_samples
+    finally:
+        scene.cycles.seed = original_seed
+        scene.cycles.samples = original_samples
+        for node, image_name in nodes:
+            node.image = images[image_name]
+        for obj in objects:
+            obj.select_set(obj in selection)
+        if scratch is not None:
+            bpy.data.images.remove(scratch)
+    return used_samples
@@ -0,0 +1,259 @@
+import array
+
+import bpy
+
+from . import bake_targets
+from .bake_settings import PASS_TARGET_DEFAULTS, BakeSession
+
+# 選択した全オブジェクトを 1 枚の共有画像 (アトラス) にベイクする
+# ベイク用 UV をコピーしたアトラス用 UV レイヤーを作り、全オブジェクトの島をまとめてパックしてから
+# 各マテリアルに一時的なイメージノードを追加し、ベイクタイプごとに 1 回だけベイクする
+
+ATLAS_UV_NAME = "SimpleBakeAtlas"
+ATLAS_NODE_LABEL = "SimpleBakeAtlas"
+
+
+def atlas_label(bake_type):
+    return f"{ATLAS_NODE_LABEL} {bake_type}"
+
+
+def unique_meshes(objects):
+    meshes = {}
+    for obj in objects:
+        meshes.setdefault(obj.data.name, obj.data)
+    return list(meshes.values())
+
+
+def create_atlas_uvs(objects, uv_channel):
+    # 既にアトラス用 UV がある場合は作り直さず、ベイク用 UV で上書きする
+    for mesh in unique_meshes(objects):
+        index = uv_channel if 0 <= uv_channel < len(mesh.uv_layers) else mesh.uv_layers.active_index
+        uvs = array.array('f', bytes(len(mesh.loops) * 2 * 4))
+        mesh.uv_layers[index].data.foreach_get("uv", uvs)
+        layer = mesh.uv_layers.get(ATLAS_UV_NAME)
+        if layer is None:
+            layer = mesh.uv_layers.new(name=ATLAS_UV_NAME, do_init=False)
+            if layer is None:
+                raise RuntimeError(f"{mesh.name} has no free UV map slot for the atlas")
+        layer.data.foreach_set("uv", uvs)
+
+
+def pack_atlas_uvs(context, objects, margin):
+    # 全オブジェクトを同時に編集モードにして、アトラス用 UV の島をまとめてパックする
+    view_layer = context.view_layer
+    selection = [obj for obj in view_layer.objects if obj.select_get()]
+    active_object = view_layer.objects.active
+    active_indices = {}
+    for mesh in unique_meshes(objects):
+        active_indices[mesh.name] = mesh.uv_layers.active_index
+        mesh.uv_layers.active = mesh.uv_layers[ATLAS_UV_NAME]
+
+    for obj in selection:
+        obj.select_set(False)
+    for obj in objects:
+        obj.select_set(True)
+    view_layer.objects.active = objects[0]
+    bpy.ops.object.mode_set(mode='EDIT')
+    try:
+        bpy.ops.mesh.select_all(action='SELECT')
+        bpy.ops.uv.select_all(action='SELECT')
+        bpy.ops.uv.pack_islands(rotate=True, margin_method='FRACTION', margin=margin)
+    finally:
+        bpy.ops.object.mode_set(mode='OBJECT')
+        for obj in objects:
+            obj.select_set(False)
+        for obj in selection:
+            obj.select_set(True)
+        view_layer.objects.active = active_object
+        for mesh in unique_meshes(objects):
+            mesh.uv_layers.active_index = active_indices[mesh.name]
+
+
+def get_atlas_image(name, size, is_data):
+    img = bpy.data.images.get(name)
+    if img is not None and tuple(img.size) != (size, size):
+        bpy.data.images.remove(img)
+        img = None
+    if img is None:
+        img = bpy.data.images.new(name=name, width=size, height=size, alpha=True)
+    if is_data:
+        img.colorspace_settings.name = 'Non-Color'
+    # Blend ファイルが保存されていれば隣に置き、Auto Save で保存できるようにする
+    if bpy.data.filepath and not img.filepath_raw:
+        img.filepath_raw = f"//{name}"
+        img.file_format = 'PNG'
+    return img
+
+
+def add_atlas_nodes(objects, images):
+    # images はベイクタイプ → 画像。追加したノードは (ノードツリー, ノード) で返す
+    added = []
+    for mat in bake_targets.iter_materials(objects):
+        tree = mat.node_tree
+        for index, (bake_type, img) in enumerate(images.items()):
+            node = tree.nodes.new(type='ShaderNodeTexImage')
+            node.image = img
+            node.label = atlas_label(bake_type)
+            node.location = (-600, 300 - index * 40)
+            node.hide = True
+            added.append((tree, node))
+    return added
+
+
+def remove_nodes(nodes):
+    for tree, node in nodes:
+        tree.nodes.remove(node)
+
+
+def create_atlas_material(name, images):
+    # アトラスの画像をアトラス用 UV で参照するマテリアル
+    mat = bpy.data.materials.get(name) or bpy.data.materials.new(name)
+    mat.use_nodes = True
+    tree = mat.node_tree
+    tree.nodes.clear()
+    output = tree.nodes.new(type='ShaderNodeOutputMaterial')
+    output.location = (400, 300)
+    principled = tree.nodes.new(type='ShaderNodeBsdfPrincipled')
+    principled.location = (100, 300)
+    tree.links.new(principled.outputs['BSDF'], output.inputs['Surface'])
+    uv_map = tree.nodes.new(type='ShaderNodeUVMap')
+    uv_map.uv_map = ATLAS_UV_NAME
+    uv_map.location = (-500, 300)
+
+    for index, (bake_type, img) in enumerate(images.items()):
+        node = tree.nodes.new(type='ShaderNodeTexImage')
+        node.image = img
+        node.label = PASS_TARGET_DEFAULTS[bake_type]
+        node.location = (-250, 300 - index * 280)
+        tree.links.new(uv_map.outputs['UV'], node.inputs['Vector'])
+        if bake_type == 'EMIT':
+            tree.links.new(node.outputs['Color'], principled.inputs['Base Color'])
+        elif bake_type == 'NORMAL':
+            normal_map = tree.nodes.new(type='ShaderNodeNormalMap')
+            normal_map.uv_map = ATLAS_UV_NAME
+            normal_map.location = (-50, 300 - index * 280)
+            tree.links.new(node.outputs['Color'], normal_map.inputs['Color'])
+            tree.links.new(normal_map.outputs['Normal'], principled.inputs['Normal'])
+    return mat
+
+
+def remap_materials(objects, mat):
+    for obj in objects:
+        for slot in obj.material_slots:
+            slot.material = mat
+
+
+class SimpleBakeAtlasOperator(bpy.types.Operator):
+    bl_idname = "object.simple_bake_atlas"
+    bl_label = "Atlas Bake"
+    bl_description = "Pack the UVs of all selected objects into one atlas UV map and bake them into one shared image"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    name: bpy.props.StringProperty(name="Name", default="Atlas")
+    image_size: bpy.props.EnumProperty(
+        name="Image Size",
+        description="Set the size of the atlas image",
+        items=[
+            ('1024', "1024", ""),
+            ('2048', "2048", ""),
+            ('4096', "4096", ""),
+            ('8192', "8K", ""),
+            ('16384', "16K", "")
+        ],
+        default='4096'
+    )
+    island_margin: bpy.props.IntProperty(
+        name="Island Margin",
+        description="Space between UV islands in pixels",
+        default=8,
+        min=0,
+        max=256
+    )
+    remap: bpy.props.BoolProperty(
+        name="Remap Materials",
+        description="Replace the materials of the baked objects with one material that uses the atlas",
+        default=False
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'OBJECT' and bool(BakeSession.get_valid_objects(context))
+
+    def execute(self, context):
+        scene = context.scene
+        # Selected to Active ではアクティブなオブジェクトしかベイク対象にならず、アトラスにならない
+        if scene.simple_bake_selected_to_active:
+            self.report({'ERROR'}, "Atlas Bake cannot be used with Selected to Active")
+            return {'CANCELLED'}
+        objects = BakeSession.get_valid_objects(context)
+        if not self.name:
+            self.report({'ERROR'}, "Enter a name for the atlas")
+            return {'CANCELLED'}
+        if len(unique_meshes(objects)) < len(objects):
+            self.report({'WARNING'}, "Objects that share mesh data also share their place in the atlas")
+
+        session = BakeSession(scene, objects, self.report)
+        if not session.bake_passes:
+            self.report({'ERROR'}, "Select at least one bake type")
+            return {'CANCELLED'}
+
+        size = int(self.image_size)
+        try:
+            create_atlas_uvs(objects, session.uv_channel)
+            pack_atlas_uvs(context, objects, self.island_margin / size)
+        except RuntimeError as e:
+            self.report({'ERROR'}, f"Could not pack the atlas UVs: {e}")
+            return {'CANCELLED'}
+
+        images = {
+            bake_type: get_atlas_image(f"{self.name}{PASS_TARGET_DEFAULTS[bake_type]}.png", size, bake_type == 'NORMAL')
+            for bake_type, _target_label in session.bake_passes
+        }
+        nodes = add_atlas_nodes(objects, images)
+
+        # アトラス用 UV はオブジェクトごとにインデックスが違うので名前で指定する
+        # アトラスは毎回パックし直すので、ベイクキャッシュは使わない
+        session.bake_passes = [(bake_type, atlas_label(bake_type)) for bake_type, _target_label in session.bake_passes]
+        session.uv_name = ATLAS_UV_NAME
+        session.use_cache = False
+        try:
+            session.begin()
+            for bake_type, target_label in session.bake_passes:
+                if session.prepare_pass(bake_type, target_label):
+                    session.bake_pass(bake_type, target_label)
+                    session.finish_pass(bake_type, target_label)
+        except Exception as e:
+            session.restore()
+            remove_nodes(nodes)
+            self.report({'ERROR'}, f"Bake failed: {e}")
+            return {'CANCELLED'}
+
+        session.restore()
+        remove_nodes(nodes)
+        if self.remap:
+            remap_materials(objects, create_atlas_material(self.name, images))
+        session.save_images()
+        session.record_profile()
+
+        self.report({'INFO'}, f"Baked {len(objects)} object(s) into {', '.join(img.name for img in images.values())}")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        if context.scene.simple_bake_selected_to_active:
+            return self.execute(context)
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "name", text="Name")
+        layout.prop(self, "image_size", text="Image Size")
+        layout.prop(self, "island_margin", text="Island Margin")
+        layout.prop(self, "remap", text="Remap Materials")
+
+
+def register():
+    bpy.utils.register_class(SimpleBakeAtlasOperator)
+
+
+def unregister():
+    bpy.utils.unregister_class(SimpleBakeAtlasOperator)
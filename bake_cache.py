@@ -0,0 +1,341 @@
+import hashlib
+import os
+import tempfile
+
+import bpy
+
+# ベイク結果のキャッシュ
+# ベイク結果に影響するもの (メッシュ、UV、法線、マテリアルのノードツリー、ベイク設定、画像のサイズと色空間) の
+# ハッシュをキーにしてピクセルをディスクに保存し、変更が無ければベイクせずに復元する
+# NumPy はアドオンの起動を速くするため、キャッシュを使うときに読み込む
+
+CACHE_VERSION = b"simple-bake-cache-3"
+
+# ノードのハッシュに含めないプロパティ (見た目だけのもの)
+_IGNORED_NODE_PROPERTIES = {
+    "rna_type", "name", "label", "location", "width", "width_hidden", "height", "dimensions",
+    "select", "show_options", "show_preview", "show_texture", "hide", "mute", "use_custom_color",
+    "color", "parent", "type", "bl_idname", "bl_label", "bl_description", "bl_icon", "bl_static_type",
+    "bl_width_default", "bl_width_min", "bl_width_max", "bl_height_default", "bl_height_min",
+    "bl_height_max", "internal_links", "inputs", "outputs",
+}
+
+# ライトなどのデータブロックのハッシュに含めないプロパティ (ID の管理用で、ベイク結果に影響しないもの)
+_IGNORED_ID_PROPERTIES = {
+    "rna_type", "name", "name_full", "id_type", "session_uid", "users", "use_fake_user", "use_extra_user",
+    "tag", "is_embedded_data", "is_evaluated", "is_missing", "is_runtime_data", "is_library_indirect",
+    "is_editmode",
+}
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def reset(self):
+        self.__init__()
+
+
+stats = CacheStats()
+
+
+def default_cache_dir():
+    return os.path.join(tempfile.gettempdir(), "simple_bake_cache")
+
+
+def _update_array(h, values):
+    import numpy as np
+    h.update(np.ascontiguousarray(values).tobytes())
+
+
+def _update_value(h, value):
+    h.update(repr(value).encode())
+
+
+def hash_mesh(h, obj, uv_channel, depsgraph):
+    # モディファイアー適用後のメッシュでベイクされるので評価済みのメッシュを使う
+    import numpy as np
+    mesh = obj.evaluated_get(depsgraph).data
+    co = np.empty(len(mesh.vertices) * 3, np.float32)
+    mesh.vertices.foreach_get("co", co)
+    loops = np.empty(len(mesh.loops), np.int32)
+    mesh.loops.foreach_get("vertex_index", loops)
+    loop_totals = np.empty(len(mesh.polygons), np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    material_indices = np.empty(len(mesh.polygons), np.int32)
+    mesh.polygons.foreach_get("material_index", material_indices)
+    smooth = np.empty(len(mesh.polygons), bool)
+    mesh.polygons.foreach_get("use_smooth", smooth)
+    for values in (co, loops, loop_totals, material_indices, smooth):
+        _update_array(h, values)
+
+    # カスタム分割法線と自動スムーズはノーマルやシェーディングに影響するので、コーナーごとの法線をハッシュする
+    normals = np.empty(len(mesh.loops) * 3, np.float32)
+    if hasattr(mesh, "corner_normals"):  # Blender 4.1 以降
+        mesh.corner_normals.foreach_get("vector", normals)
+    else:
+        mesh.calc_normals_split()
+        mesh.loops.foreach_get("normal", normals)
+    _update_array(h, normals)
+    _update_value(h, (mesh.has_custom_normals, getattr(mesh, "use_auto_smooth", None),
+                      getattr(mesh, "auto_smooth_angle", None)))
+
+    if 0 <= uv_channel < len(mesh.uv_layers):
+        uvs = np.empty(len(mesh.loops) * 2, np.float32)
+        mesh.uv_layers[uv_channel].data.foreach_get("uv", uvs)
+        _update_array(h, uvs)
+    _update_array(h, np.array(obj.matrix_world, np.float32))
+
+
+def bake_settings_key(img, bake_type, samples, margin, uv_channel, scene):
+    # ベイク設定と保存先の画像の設定 (色空間によってバイト画像に書き込まれる値が変わる)
+    key = (bake_type, samples, margin, uv_channel, tuple(img.size), img.channels, img.is_float,
+           img.colorspace_settings.name)
+    if bake_type == 'NORMAL':
+        bake = scene.render.bake
+        key += (bake.normal_space, bake.normal_r, bake.normal_g, bake.normal_b)
+    return key
+
+
+def _plain_value(value):
+    # 配列プロパティ (色やベクトル) は値のタプルにする
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, set):
+        return tuple(sorted(value))
+    try:
+        return tuple(value)
+    except TypeError:
+        return repr(value)
+
+
+def hash_properties(h, owner, ignored=_IGNORED_NODE_PROPERTIES):
+    # owner の単純なプロパティ (数値・文字列・列挙・色など) を全てハッシュする
+    for prop in owner.bl_rna.properties:
+        if prop.identifier in ignored:
+            continue
+        if prop.type in {'BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM'}:
+            _update_value(h, (prop.identifier, _plain_value(getattr(owner, prop.identifier))))
+
+
+def hash_image(h, image):
+    # ファイルの画像はパスで区別できるが、パックされた画像・生成画像・未保存の変更がある画像は
+    # 同じ名前のまま中身が変わるので、データ自体をハッシュする
+    _update_value(h, (image.name, image.filepath, image.source, image.colorspace_settings.name))
+    if image.is_dirty and image.has_data:
+        import numpy as np
+        pixels = np.empty(len(image.pixels), np.float32)
+        image.pixels.foreach_get(pixels)
+        _update_array(h, pixels)
+    elif image.packed_file:
+        h.update(image.packed_file.data)
+    elif image.source == 'GENERATED':
+        _update_value(h, (image.generated_type, image.generated_width, image.generated_height,
+                          tuple(image.generated_color), image.use_generated_float))
+
+
+def hash_node_tree(h, tree, skip_node=None, seen=None):
+    seen = set() if seen is None else seen
+    if tree.name in seen:
+        return
+    seen.add(tree.name)
+
+    for node in sorted(tree.nodes, key=lambda n: n.name):
+        if node == skip_node:
+            continue
+        _update_value(h, (node.name, node.bl_idname, node.mute))
+        hash_properties(h, node)
+        for socket in node.inputs:
+            if not socket.is_linked:
+                _update_value(h, (socket.identifier, _plain_value(getattr(socket, "default_value", None))))
+        image = getattr(node, "image", None)
+        if image is not None:
+            if any(output.is_linked for output in node.outputs):
+                hash_image(h, image)
+            else:
+                # どこにも繋がっていない画像 (他のパスのベイク先など) はベイク結果に影響しない
+                _update_value(h, image.name)
+        if getattr(node, "node_tree", None) is not None:
+            hash_node_tree(h, node.node_tree, seen=seen)
+
+    links = sorted(
+        (link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier)
+        for link in tree.links if not link.is_muted
+    )
+    _update_value(h, links)
+
+
+def hash_scene_context(h, scene, depsgraph, mesh_hash):
+    # AO と Shadow は周囲のオブジェクト (遮蔽物) やライトにも影響される
+    # mesh_hash(obj, uv_channel, depsgraph) はメッシュのハッシュ (同じベイク中は使い回す)
+    import numpy as np
+    for obj in sorted(scene.objects, key=lambda o: o.name):
+        if obj.type not in {'MESH', 'LIGHT'} or not obj.visible_get():
+            continue
+        _update_value(h, (obj.name, obj.type))
+        # 影やレイに対する可視性 (visible_shadow など)
+        _update_value(h, tuple(getattr(obj, name, None) for name in (
+            "visible_camera", "visible_diffuse", "visible_glossy", "visible_transmission",
+            "visible_volume_scatter", "visible_shadow",
+        )))
+        if obj.type == 'MESH':
+            # 遮蔽物の形が変わると AO や影が変わるので、頂点数ではなくメッシュ全体をハッシュする
+            h.update(mesh_hash(obj, -1, depsgraph))
+            continue
+        _update_array(h, np.array(obj.matrix_world, np.float32))
+        # 色・大きさ・角度・影の設定などライトのプロパティを全て含める
+        light = obj.data
+        hash_properties(h, light, _IGNORED_ID_PROPERTIES)
+        cycles = getattr(light, "cycles", None)
+        if cycles is not None:
+            hash_properties(h, cycles, _IGNORED_ID_PROPERTIES)
+        if light.use_nodes and light.node_tree:
+            hash_node_tree(h, light.node_tree)
+    world = scene.world
+    if world is not None:
+        # AO の距離とワールドの光
+        _update_value(h, world.light_settings.distance)
+        if world.use_nodes and world.node_tree:
+            hash_node_tree(h, world.node_tree)
+
+
+class BakeCache:
+    def __init__(self, cache_dir, max_size_mb):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.mesh_hashes = {}  # (オブジェクト名, UV チャンネル) → ハッシュ
+
+    def mesh_hash(self, obj, uv_channel, depsgraph):
+        key = (obj.name, uv_channel)
+        if key not in self.mesh_hashes:
+            h = hashlib.sha256()
+            hash_mesh(h, obj, uv_channel, depsgraph)
+            self.mesh_hashes[key] = h.digest()
+        return self.mesh_hashes[key]
+
+    def image_key(self, img, bake_type, samples, margin, uv_channel, objects, materials, scene, depsgraph):
+        h = hashlib.sha256(CACHE_VERSION)
+        _update_value(h, bake_settings_key(img, bake_type, samples, margin, uv_channel, scene))
+        for obj in objects:
+            h.update(self.mesh_hash(obj, uv_channel, depsgraph))
+        for mat in materials:
+            target_node = next((node for node in mat.node_tree.nodes
+                                if node.type == 'TEX_IMAGE' and node.image == img), None)
+            hash_node_tree(h, mat.node_tree, skip_node=target_node)
+        if bake_type in {'AO', 'SHADOW'}:
+            hash_scene_context(h, scene, depsgraph, self.mesh_hash)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def load(self, key, img):
+        # ヒットした場合はピクセルを画像に書き戻して True を返す
+        import numpy as np
+        path = self.path(key)
+        if not os.path.exists(path):
+            stats.misses += 1
+            return False
+        try:
+            pixels = np.load(path)
+        except (OSError, ValueError):
+            stats.misses += 1
+            return False
+        if pixels.dtype == np.uint8:
+            pixels = pixels.astype(np.float32) / 255.0
+        if pixels.size != len(img.pixels):
+            stats.misses += 1
+            return False
+        img.pixels.foreach_set(pixels)
+        img.update()
+        os.utime(path)  # LRU のために最終アクセス時刻を更新
+        stats.hits += 1
+        return True
+
+    def store(self, key, img):
+        import numpy as np
+        pixels = np.empty(len(img.pixels), np.float32)
+        img.pixels.foreach_get(pixels)
+        if not img.is_float:
+            # バイト画像は 8-bit で保存しても情報が失われない
+            pixels = np.round(pixels * 255.0).astype(np.uint8)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp.npy"
+        np.save(temp_path, pixels)
+        os.replace(temp_path, path)
+        stats.stored += 1
+        self.evict()
+
+    def evict(self):
+        # 上限を超えたら最後に使われた時刻が古いものから削除する
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".npy"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _mtime, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(root, name))
+
+
+def get_cache(scene):
+    cache_dir = bpy.path.abspath(scene.simple_bake_cache_dir) if scene.simple_bake_cache_dir else default_cache_dir()
+    return BakeCache(cache_dir, scene.simple_bake_cache_size_mb)
+
+
+class SimpleBakeClearCacheOperator(bpy.types.Operator):
+    bl_idname = "object.simple_bake_clear_cache"
+    bl_label = "Clear Bake Cache"
+    bl_description = "Delete all cached bake results"
+
+    def execute(self, context):
+        get_cache(context.scene).clear()
+        stats.reset()
+        self.report({'INFO'}, "Bake cache cleared")
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(SimpleBakeClearCacheOperator)
+    bpy.types.Scene.simple_bake_use_cache = bpy.props.BoolProperty(
+        name="Use Bake Cache",
+        description="Reuse cached bake results when nothing that affects the bake has changed",
+        default=False
+    )
+    bpy.types.Scene.simple_bake_cache_dir = bpy.props.StringProperty(
+        name="Cache Directory",
+        description="Directory for cached bake results (the system temp directory when empty)",
+        subtype='DIR_PATH',
+        default=""
+    )
+    bpy.types.Scene.simple_bake_cache_size_mb = bpy.props.IntProperty(
+        name="Cache Size (MB)",
+        description="Maximum size of the bake cache on disk",
+        default=2048,
+        min=64
+    )
+
+
+def unregister():
+    bpy.utils.unregister_class(SimpleBakeClearCacheOperator)
+    del bpy.types.Scene.simple_bake_use_cache
+    del bpy.types.Scene.simple_bake_cache_dir
+    del bpy.types.Scene.simple_bake_cache_size_mb
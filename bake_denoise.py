@@ -0,0 +1,150 @@
+import bpy
+import numpy as np
+
+from . import bake_targets, bake_tuning, image_writer
+
+# 少ないサンプル数でベイクした画像を OpenImageDenoise でノイズ除去する
+# 一時的なシーンのコンポジターで Denoise ノードを実行し、Viewer Node の結果をベイク先の画像に書き戻す
+# ガイドにはベイクしたオブジェクトの法線とアルベド (Diffuse の Color) を同じ UV でベイクして使う
+
+DENOISE_SCENE_NAME = "SimpleBakeDenoise"
+GUIDE_SAMPLES = 4
+
+
+def read_pixels(img):
+    width, height = img.size
+    pixels = np.empty(width * height * img.channels, np.float32)
+    img.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, img.channels)
+
+
+def new_guide_image(name, width, height):
+    img = bpy.data.images.new(name, width, height, alpha=False, float_buffer=True)
+    img.colorspace_settings.name = 'Non-Color'
+    return img
+
+
+def bake_guides(bake_pass, images, scene):
+    """{画像名: (法線の画像, アルベドの画像)} を返す (呼び出し側で削除する)"""
+    guides = {
+        name: (new_guide_image(f"{name} Normal Guide", *img.size), new_guide_image(f"{name} Albedo Guide", *img.size))
+        for name, img in images.items()
+    }
+    nodes = []
+    for mat_name, node_name, image_name in bake_pass.nodes:
+        if image_name in guides:
+            nodes.append((bpy.data.materials[mat_name].node_tree.nodes[node_name], image_name))
+
+    samples = scene.cycles.samples
+    normal_space = scene.render.bake.normal_space
+    scene.cycles.samples = min(samples, GUIDE_SAMPLES)
+    # タンジェント空間の法線はどの面もほぼ同じ向きになるので、面の向きが分かるオブジェクト空間でベイクする
+    scene.render.bake.normal_space = 'OBJECT'
+    bake_targets.activate_pass(bake_pass)
+    try:
+        for guide_index, (bake_type, pass_filter) in enumerate((('NORMAL', set()), ('DIFFUSE', {'COLOR'}))):
+            for node, image_name in nodes:
+                node.image = guides[image_name][guide_index]
+            bpy.ops.object.bake(type=bake_type, pass_filter=pass_filter)
+    finally:
+        scene.cycles.samples = samples
+        scene.render.bake.normal_space = normal_space
+        for node, image_name in nodes:
+            node.image = images[image_name]
+
+    # ベイクした法線は 0〜1 に詰められているので、OpenImageDenoise が期待する -1〜1 に戻す
+    for normal_guide, _albedo_guide in guides.values():
+        pixels = read_pixels(normal_guide)
+        pixels[..., :3] = pixels[..., :3] * 2.0 - 1.0
+        normal_guide.pixels.foreach_set(pixels.ravel())
+        normal_guide.update()
+    return guides
+
+
+def build_denoise_scene():
+    # Render Layers ノードが無いので、カメラが無くてもコンポジットだけを実行できる
+    scene = bpy.data.scenes.new(DENOISE_SCENE_NAME)
+    scene.use_nodes = True
+    scene.render.use_compositing = True
+    scene.render.use_sequencer = False
+    scene.render.resolution_percentage = 100
+    tree = scene.node_tree
+    tree.nodes.clear()
+    image_nodes = {}
+    for index, name in enumerate(("Image", "Normal", "Albedo")):
+        node = tree.nodes.new(type='CompositorNodeImage')
+        node.location = (-300, 200 - index * 200)
+        image_nodes[name] = node
+    denoise = tree.nodes.new(type='CompositorNodeDenoise')
+    denoise.prefilter = 'ACCURATE'
+    denoise.use_hdr = True
+    composite = tree.nodes.new(type='CompositorNodeComposite')
+    composite.location = (300, 200)
+    viewer = tree.nodes.new(type='CompositorNodeViewer')
+    viewer.location = (300, 0)
+    tree.links.new(image_nodes["Image"].outputs['Image'], denoise.inputs['Image'])
+    tree.links.new(denoise.outputs['Image'], composite.inputs['Image'])
+    tree.links.new(denoise.outputs['Image'], viewer.inputs['Image'])
+    return scene, image_nodes, denoise
+
+
+def denoise_image(scene, image_nodes, denoise, img, guides):
+    width, height = img.size
+    scene.render.resolution_x = width
+    scene.render.resolution_y = height
+    tree = scene.node_tree
+    image_nodes["Image"].image = img
+    for link in list(denoise.inputs['Normal'].links) + list(denoise.inputs['Albedo'].links):
+        tree.links.remove(link)
+    if guides is not None:
+        image_nodes["Normal"].image, image_nodes["Albedo"].image = guides
+        tree.links.new(image_nodes["Normal"].outputs['Image'], denoise.inputs['Normal'])
+        tree.links.new(image_nodes["Albedo"].outputs['Image'], denoise.inputs['Albedo'])
+    # 前のコンポジットの結果 (同じサイズなら区別できない) を読まないように、既存の Viewer Node の画像を消してから実行する
+    viewer = bpy.data.images.get("Viewer Node")
+    if viewer is not None:
+        bpy.data.images.remove(viewer)
+    bpy.ops.render.render(scene=scene.name)
+
+    viewer = bpy.data.images.get("Viewer Node")
+    if viewer is None or tuple(viewer.size) != (width, height):
+        raise RuntimeError("The compositor did not produce a result")
+    result = read_pixels(viewer)
+    pixels = read_pixels(img)
+    # コンポジターの結果はリニアなので、バイトの sRGB 画像には sRGB に戻して書き込む (アルファは元のまま)
+    color = result[..., :3]
+    if not img.is_float and img.colorspace_settings.name not in image_writer.DATA_COLORSPACES:
+        color = image_writer.linear_to_srgb(color)
+    channels = min(img.channels, 3)
+    pixels[..., :channels] = color[..., :channels]
+    img.pixels.foreach_set(pixels.ravel())
+    img.update()
+
+
+def denoise_pass(bake_pass, objects, sources, scene, use_guides, report):
+    """bake_pass のターゲット画像をノイズ除去する。失敗した場合は警告してノイズのある結果を残す"""
+    images = {
+        name: bpy.data.images[name] for name in bake_pass.image_names
+        if name in bpy.data.images and bpy.data.images[name].source != 'TILED' and bpy.data.images[name].has_data
+    }
+    if not images:
+        return
+    denoise_scene = None
+    guides = {}
+    try:
+        if use_guides:
+            # ベイクキューでは非同期のベイクの後に呼ばれるので、ベイクするオブジェクトを選択し直す
+            with bake_tuning.selected_for_bake(bpy.context.view_layer, objects + sources, objects[0]):
+                guides = bake_guides(bake_pass, images, scene)
+        denoise_scene, image_nodes, denoise = build_denoise_scene()
+        for name, img in images.items():
+            denoise_image(denoise_scene, image_nodes, denoise, img, guides.get(name))
+        report({'INFO'}, f"{bake_pass.bake_type}: denoised {len(images)} image(s)")
+    except (RuntimeError, KeyError, TypeError) as e:
+        report({'WARNING'}, f"Denoise failed, keeping the noisy {bake_pass.bake_type} bake: {e}")
+    finally:
+        if denoise_scene is not None:
+            bpy.data.scenes.remove(denoise_scene)
+        for normal_guide, albedo_guide in guides.values():
+            bpy.data.images.remove(normal_guide)
+            bpy.data.images.remove(albedo_guide)
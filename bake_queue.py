@@ -0,0 +1,276 @@
+import time
+
+import bpy
+from bpy.app.handlers import persistent
+
+from . import bake_tuning
+from .bake_settings import BakeSession, SimpleBakeOperator
+
+
+class BakeJob:
+    def __init__(self, session, bake_type, target_label):
+        self.session = session
+        self.bake_type = bake_type
+        self.target_label = target_label
+        self.baked = False
+        self.bake_started = None  # バックグラウンドのベイクを開始した時刻
+
+
+class BakeQueue:
+    # ベイクジョブを順番に実行するキュー (SimpleBakeQueueOperator のモーダルから進める)
+
+    def __init__(self):
+        self.pending = []
+        self.current = None
+        self.active_session = None
+        self.running = False
+        self.cancel_requested = False
+        self.completed = 0
+        self.total = 0
+        self.job_started = 0.0
+        self.durations = []
+        self.last_message = ""
+
+    def reset(self):
+        self.__init__()
+
+    def report(self, type, message):
+        self.last_message = message
+        print(f"Simple Bake: {message}")
+
+    def add_session(self, session):
+        for bake_type, target_label in session.bake_passes:
+            self.pending.append(BakeJob(session, bake_type, target_label))
+            self.total += 1
+
+    def progress(self):
+        if not self.total:
+            return 0.0
+        return self.completed / self.total
+
+    def eta(self):
+        # 終わったジョブの平均時間から残り時間を見積もる
+        if not self.durations:
+            return None
+        average = sum(self.durations) / len(self.durations)
+        remaining = len(self.pending) * average
+        if self.current:
+            remaining += max(0.0, average - (time.perf_counter() - self.job_started))
+        return remaining
+
+    def status_text(self):
+        text = f"Baking {min(self.completed + 1, self.total)}/{self.total} ({self.progress() * 100:.0f}%)"
+        if self.current:
+            text += f" {self.current.bake_type}"
+        eta = self.eta()
+        if eta is not None:
+            minutes, seconds = divmod(int(eta), 60)
+            text += f"  ETA {minutes}m{seconds:02d}s"
+        if self.cancel_requested:
+            text += "  Cancelling..."
+        return text
+
+    def finish_current(self):
+        self.durations.append(time.perf_counter() - self.job_started)
+        self.completed += 1
+        session = self.current.session
+        if self.current.baked:
+            if self.current.bake_started is not None:
+                session.profile.add("bake", time.perf_counter() - self.current.bake_started)
+            session.finish_pass(self.current.bake_type, self.current.target_label)
+        self.current = None
+        # セッションのジョブが全て終わったら設定を戻して保存する
+        if not any(job.session is session for job in self.pending):
+            session.restore()
+            session.save_images()
+            session.record_profile()
+            self.active_session = None
+
+    def restore_active_session(self):
+        # 削除されたオブジェクトの設定は戻せないので、戻せるものだけ戻す
+        if self.active_session:
+            try:
+                self.active_session.restore()
+            except ReferenceError:
+                pass
+            self.active_session = None
+
+    def cancel_pending(self):
+        self.pending.clear()
+        self.restore_active_session()
+        self.report({'INFO'}, "Bake queue cancelled")
+
+    def start_next(self, context):
+        job = self.pending.pop(0)
+        session = job.session
+        if session is not self.active_session:
+            session.begin()
+            self.active_session = session
+        self.current = job
+        self.job_started = time.perf_counter()
+
+        if not session.prepare_pass(job.bake_type, job.target_label):
+            self.finish_current()
+            return
+
+        # 分割ベイクやアダプティブサンプリングは複数回のベイクを順に行うので同期的に実行する
+        if session.needs_sync_bake:
+            # バッチのオブジェクトだけをベイクする (選択中の他のオブジェクトをベイクしない)
+            with bake_tuning.selected_for_bake(context.view_layer, session.objects + session.sources, session.objects[0]):
+                session.bake_pass(job.bake_type, job.target_label)
+            job.baked = True
+            return
+
+        # ベイクジョブは開始時の選択を使うので、開始後はユーザーの選択に戻す
+        view_layer = context.view_layer
+        user_selection = [obj for obj in view_layer.objects if obj.select_get()]
+        user_active = view_layer.objects.active
+        for obj in user_selection:
+            obj.select_set(False)
+        for obj in session.objects + session.sources:
+            obj.select_set(True)
+        view_layer.objects.active = session.objects[0]
+        job.bake_started = time.perf_counter()
+        try:
+            result = bpy.ops.object.bake('INVOKE_DEFAULT', type=job.bake_type)
+        finally:
+            for obj in session.objects + session.sources:
+                obj.select_set(False)
+            for obj in user_selection:
+                obj.select_set(True)
+            view_layer.objects.active = user_active
+
+        if 'CANCELLED' in result:
+            self.report({'ERROR'}, f"Bake {job.bake_type} could not be started")
+            self.finish_current()
+        else:
+            job.baked = True
+
+
+bake_queue = BakeQueue()
+
+
+def tag_redraw(context):
+    for window in context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'PROPERTIES':
+                area.tag_redraw()
+
+
+class SimpleBakeQueueOperator(bpy.types.Operator):
+    bl_idname = "object.simple_bake_queue"
+    bl_label = "Queue Bake"
+    bl_description = "Add the bake to the queue and run it in the background"
+
+    _timer = None
+
+    @classmethod
+    def poll(cls, context):
+        return SimpleBakeOperator.poll(context)
+
+    def invoke(self, context, event):
+        valid_objects = BakeSession.get_valid_objects(context)
+        if not valid_objects:
+            self.report({'ERROR'}, "Select the object that contains the material")
+            return {'CANCELLED'}
+
+        sources = BakeSession.get_source_objects(context)
+        if context.scene.simple_bake_selected_to_active and not sources:
+            self.report({'ERROR'}, "Select the high poly objects and make the low poly object active")
+            return {'CANCELLED'}
+
+        session = BakeSession(context.scene, valid_objects, bake_queue.report, sources)
+        if not session.bake_passes:
+            self.report({'ERROR'}, "Select at least one bake type")
+            return {'CANCELLED'}
+
+        # メモリの予算を超える場合はバッチごとのセッションを順に追加する
+        sessions = session.split_by_memory()
+        for batch_session in sessions:
+            bake_queue.add_session(batch_session)
+        if bake_queue.running:
+            # 実行中のキューにジョブを追加するだけ
+            self.report({'INFO'}, f"Added {len(session.bake_passes) * len(sessions)} bake job(s) to the queue")
+            return {'FINISHED'}
+
+        bake_queue.running = True
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.5, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        tag_redraw(context)
+        if bpy.app.is_job_running('OBJECT_BAKE'):
+            return {'PASS_THROUGH'}
+
+        try:
+            if bake_queue.current:
+                bake_queue.finish_current()
+            if bake_queue.cancel_requested:
+                bake_queue.cancel_pending()
+            elif bake_queue.pending:
+                bake_queue.start_next(context)
+                return {'PASS_THROUGH'}
+            else:
+                bake_queue.report({'INFO'}, "Bake queue completed")
+        except ReferenceError:
+            # キュー中にオブジェクトやマテリアルが削除された
+            bake_queue.report({'ERROR'}, "Bake queue stopped: a queued object was removed")
+            bake_queue.pending.clear()
+            bake_queue.restore_active_session()
+        except Exception as e:
+            bake_queue.cancel_pending()
+            bake_queue.report({'ERROR'}, f"Bake failed: {e}")
+
+        self.finish(context)
+        return {'FINISHED'}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        message = bake_queue.last_message
+        bake_queue.reset()
+        bake_queue.last_message = message
+        tag_redraw(context)
+
+
+class SimpleBakeQueueCancelOperator(bpy.types.Operator):
+    bl_idname = "object.simple_bake_queue_cancel"
+    bl_label = "Cancel Bake Queue"
+    bl_description = "Stop the bake queue after the current bake and restore the bake settings"
+
+    @classmethod
+    def poll(cls, context):
+        return bake_queue.running and not bake_queue.cancel_requested
+
+    def execute(self, context):
+        bake_queue.cancel_requested = True
+        if bpy.app.is_job_running('OBJECT_BAKE'):
+            self.report({'INFO'}, "The queue stops after the current bake (press Esc on the status bar to stop it now)")
+        return {'FINISHED'}
+
+
+@persistent
+def _on_load_pre(*args):
+    # ファイルを開くとモーダルのタイマーが消えるので、前のファイルの設定を戻してキューを空にする
+    if bake_queue.running:
+        bake_queue.pending.clear()
+        bake_queue.restore_active_session()
+        bake_queue.report({'INFO'}, "Bake queue stopped: a file was loaded")
+    bake_queue.reset()
+
+
+def register():
+    bpy.utils.register_class(SimpleBakeQueueOperator)
+    bpy.utils.register_class(SimpleBakeQueueCancelOperator)
+    bpy.app.handlers.load_pre.append(_on_load_pre)
+
+
+def unregister():
+    if _on_load_pre in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.remove(_on_load_pre)
+    bpy.utils.unregister_class(SimpleBakeQueueOperator)
+    bpy.utils.unregister_class(SimpleBakeQueueCancelOperator)
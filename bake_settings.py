@@ -1,4 +1,419 @@
+import sys
+
 import bpy
+from . import bake_targets, bake_timing, bake_tuning, core, node_cache
+from .bake_timing import timed
+from .core import BAKE_TYPE_ITEMS, PASS_TARGET_DEFAULTS
+
+# NumPy を使うモジュール (adaptive_samples, bake_denoise, edge_padding, high_to_low, image_writer, mip_chain, texel_density, tiled_bake) は
+# アドオンの起動を速くするため、使う機能が実行されたときに読み込む
+# bake_cache はプロパティの登録とパネルのために起動時に読み込むが、NumPy はキャッシュを使うときに関数の中で読み込む
+
+# マルチパスベイクで各ベイクタイプのターゲットを探すノードラベル
+PASS_TARGET_PROPS = {
+    'EMIT': "simple_bake_pass_target_emit",
+    'NORMAL': "simple_bake_pass_target_normal",
+    'SHADOW': "simple_bake_pass_target_shadow",
+    'AO': "simple_bake_pass_target_ao",
+}
+
+class BakeSession:
+    # 1回のベイク実行で変更する設定を保持し、ベイク後に元に戻す
+    # 同期実行のオペレーターとベイクキューの両方から使用する
+
+    def __init__(self, scene, objects, report, sources=()):
+        self.scene = scene
+        self.objects = objects
+        self.sources = list(sources)  # セレクテッド→アクティブのソース (ハイポリ)
+        self.report = report
+        self.uv_channel = scene.simple_bake_uv_channel
+        self.uv_name = None  # 名前で指定する場合 (アトラスベイク)
+        self.return_to_original = scene.simple_bake_return_to_original_uv
+        self.auto_save = scene.simple_bake_auto_save
+        self.save_format = scene.simple_bake_save_format
+        self.png_compression = scene.simple_bake_png_compression
+        self.free_after_save = scene.simple_bake_free_saved_images
+        self.use_mip_chain = scene.simple_bake_mip_chain
+        self.mip_min_size = int(scene.simple_bake_mip_min_size)
+        self.mip_filter = scene.simple_bake_mip_filter
+        self.wait_for_save = False  # 次のバッチの前に保存とバッファの解放を終わらせる
+        self.memory_budget = scene.simple_bake_memory_budget_mb * 1024 * 1024
+        self.memory_action = scene.simple_bake_memory_action
+        self.return_to_render_samples = scene.simple_bake_return_to_render_samples
+        self.samples = int(scene.simple_bake_samples)
+        self.default_size = int(scene.simple_bake_target_size)
+        self.bake_passes = self.get_bake_passes(scene)
+        self.use_tiled = scene.simple_bake_tiled
+        self.tile_budget = scene.simple_bake_tile_memory_mb * 1024 * 1024
+        self.use_adaptive = scene.simple_bake_adaptive
+        self.adaptive_min_samples = scene.simple_bake_adaptive_min_samples
+        self.noise_threshold = scene.simple_bake_noise_threshold
+        self.used_samples = {}
+        self.tiled_images = set()  # 分割ベイクした画像 (ファイルに書き出し済みで、後処理と保存を行わない)
+        self.auto_cage = scene.simple_bake_auto_cage
+        self.cage_extrusion = scene.simple_bake_cage_extrusion
+        self.max_ray_distance = scene.simple_bake_max_ray_distance
+        self.use_padding = scene.simple_bake_padding
+        self.padding_mode = scene.simple_bake_padding_mode
+        self.padding_pixels = scene.simple_bake_padding_pixels
+        # エッジパディングを使う場合は Cycles のマージン処理を行わない
+        self.margin = 0 if self.use_padding else core.BAKE_MARGIN
+        self.use_cache = scene.simple_bake_use_cache
+        self.auto_tune = scene.simple_bake_auto_tune
+        self.use_denoise = scene.simple_bake_denoise
+        self.denoise_types = set(scene.simple_bake_denoise_types)
+        self.denoise_guides = scene.simple_bake_denoise_guides
+        self.tuned = False
+        self.cache = None
+        self.cache_keys = {}
+        self.plan = None
+        self.original_uv_indices = {}
+        self.original_settings = None
+        self.original_active_nodes = []
+        self.timing_log = scene.simple_bake_timing_log
+        self.profile = bake_timing.BakeProfile()
+
+    @staticmethod
+    def get_valid_objects(context):
+        objects = [obj for obj in context.selected_objects if obj.type == 'MESH' and obj.data.uv_layers and obj.material_slots]
+        if context.scene.simple_bake_selected_to_active:
+            # アクティブオブジェクト (ローポリ) にだけベイクする
+            return [obj for obj in objects if obj == context.active_object]
+        return objects
+
+    @staticmethod
+    def get_source_objects(context):
+        if not context.scene.simple_bake_selected_to_active:
+            return []
+        return [obj for obj in context.selected_objects if obj.type == 'MESH' and obj != context.active_object]
+
+    @staticmethod
+    def get_bake_passes(scene):
+        labels = {bake_type: getattr(scene, prop_name) for bake_type, prop_name in PASS_TARGET_PROPS.items()}
+        return core.select_bake_passes(scene.simple_bake_multi_pass, scene.simple_bake_type, scene.simple_bake_pass_types, labels)
+
+    def begin(self):
+        scene = self.scene
+        # バッチに分けた場合は前のバッチを待っていた時間を含めない
+        self.profile = bake_timing.BakeProfile()
+        # 元のRender Samplesと、自動調整で変更するスレッド数・タイルサイズを保存
+        paths = ("cycles.samples",) + (bake_tuning.TUNING_PATHS if self.auto_tune else ())
+        self.original_settings = core.SettingsSnapshot(scene, paths)
+        self.original_active_nodes = [(mat.node_tree, mat.node_tree.nodes.active) for mat in bake_targets.iter_materials(self.objects)]
+
+        with self.profile.phase("uv"):
+            for obj in self.objects:
+                self.original_uv_indices[obj.name] = obj.data.uv_layers.active_index
+                if self.uv_name:
+                    index = obj.data.uv_layers.find(self.uv_name)
+                else:
+                    index = self.uv_channel
+                if 0 <= index < len(obj.data.uv_layers):
+                    obj.data.uv_layers.active_index = index
+                elif self.uv_name:
+                    self.report({'WARNING'}, f"Object {obj.name} has no UV layer named {self.uv_name}")
+                else:
+                    self.report({'WARNING'}, f"Object {obj.name} has no UV layer at index {self.uv_channel}")
+        if self.uv_name:
+            # 分割ベイクとエッジパディングはアクティブな UV を使う
+            self.uv_channel = -1
+
+        # Samplesの設定
+        scene.cycles.samples = self.samples
+
+        # ベイク設定を行う
+        scene.render.bake.use_selected_to_active = bool(self.sources)
+        scene.render.bake.use_cage = False
+        scene.render.bake.cage_extrusion = 0.1
+        if self.sources:
+            self.set_ray_distances()
+        scene.render.bake.use_clear = True
+        scene.render.bake.margin = self.margin
+
+        # ベイク先の画像だけを解決し、未初期化のものを確保する
+        with self.profile.phase("plan"):
+            self.plan = bake_targets.build_plan(self.objects, self.bake_passes, self.uv_channel, self.default_size)
+            bake_targets.allocate_targets(self.plan)
+
+        if self.use_cache:
+            from . import bake_cache
+            self.cache = bake_cache.get_cache(scene)
+
+    def plan_memory(self):
+        """(ベイク先の画像の推定メモリ, オブジェクトのバッチのリスト) を返す
+
+        予算を超えない場合や Split が使えない場合のバッチは self.objects だけ
+        """
+        plan = bake_targets.build_plan(self.objects, self.bake_passes, self.uv_channel, self.default_size)
+        total = core.plan_bytes(plan.targets.values())
+        # 保存して解放できない場合は分けてもメモリは減らない
+        if not self.memory_budget or total <= self.memory_budget or self.memory_action != 'SPLIT' or not self.auto_save:
+            return total, [self.objects]
+        sizes = {name: core.image_bytes(target.width, target.height, 4, target.float_buffer) for name, target in plan.targets.items()}
+        objects = {obj.name: obj for obj in self.objects}
+        batches = core.split_by_budget(bake_targets.object_images(plan, self.objects), sizes, self.memory_budget)
+        return total, [[objects[name] for name in batch] for batch in batches]
+
+    def split_by_memory(self):
+        # メモリの予算を確認し、分けた場合はバッチごとのセッションを返す
+        total, batches = self.plan_memory()
+        if not self.memory_budget or total <= self.memory_budget:
+            return [self]
+        message = f"The bake targets need about {total / (1024 * 1024):.0f} MB, more than the memory budget of {self.memory_budget / (1024 * 1024):.0f} MB"
+        if len(batches) == 1:
+            if self.memory_action == 'SPLIT' and not self.auto_save:
+                message += " (turn on Auto Save to split the bake)"
+            self.report({'WARNING'}, message)
+            return [self]
+        self.report({'INFO'}, f"{message}: baking in {len(batches)} batches")
+        sessions = [BakeSession(self.scene, batch, self.report, self.sources) for batch in batches]
+        for session in sessions[:-1]:
+            session.wait_for_save = True
+        return sessions
+
+    def set_ray_distances(self):
+        # ハイポリを覆う最小の押し出し量とレイの距離を BVH で求める
+        bake = self.scene.render.bake
+        if self.auto_cage:
+            from . import high_to_low
+            extrusion, distance = high_to_low.ray_distances(self.objects, self.sources, bpy.context.evaluated_depsgraph_get())
+            self.report({'INFO'}, f"Extrusion {extrusion:.4f}, Max Ray Distance {distance:.4f}")
+        else:
+            extrusion, distance = self.cage_extrusion, self.max_ray_distance
+        bake.cage_extrusion = extrusion
+        bake.max_ray_distance = distance
+
+    def prepare_pass(self, bake_type, target_label):
+        # ターゲットのイメージノードをアクティブにする。見つからない場合は False
+        bake_pass = self.get_plan_pass(bake_type, target_label)
+        if target_label is not None and not bake_targets.activate_pass(bake_pass):
+            self.report({'WARNING'}, f"No image node labeled '{target_label}' for {bake_type}")
+            return False
+        self.scene.cycles.bake_type = bake_type
+
+        # 全てのターゲットがキャッシュにあればベイクを省略する
+        if self.cache is not None and bake_pass is not None and self.load_cached_pass(bake_pass):
+            self.report({'INFO'}, f"{bake_type}: restored {len(bake_pass.image_names)} image(s) from the bake cache")
+            return False
+        # 最初にベイクするパスで、スレッド数とタイルサイズを決める
+        if self.auto_tune and not self.tuned:
+            self.tune(bake_type)
+        return True
+
+    @timed("tune")
+    def tune(self, bake_type):
+        self.tuned = True
+        if not self.plan.targets:
+            return
+        if self.use_tiled:
+            # 分割ベイクするターゲットでは測定のベイクが画像全体で何回も行われるので調整しない
+            from . import tiled_bake
+            if any(tiled_bake.needs_tiling(bpy.data.images[name], self.tile_budget)
+                   for name in self.plan.targets if name in bpy.data.images):
+                self.report({'INFO'}, "Auto Tune skipped: some targets are baked in tiles")
+                return
+        target = max(self.plan.targets.values(), key=lambda target: target.width * target.height)
+        key = bake_tuning.tuning_key(self.scene, target.width, target.height)
+        cache = bake_tuning.load_cache()
+        setting = cache.get(key)
+        if setting is None:
+            with bake_tuning.selected_for_bake(bpy.context.view_layer, self.objects + self.sources, self.objects[0]):
+                setting = bake_tuning.calibrate(self.scene, bake_type, target.width, target.height)
+            cache[key] = setting
+            bake_tuning.save_cache(cache)
+        threads, tile = setting
+        bake_tuning.apply_setting(self.scene, setting)
+        self.report({'INFO'}, f"Auto Tune: {threads} threads, {f'tile {tile}' if tile else 'no tiling'}")
+
+    @timed("bake")
+    def bake_pass(self, bake_type, target_label):
+        # 同期的にベイクする。分割ベイクが有効でメモリ予算を超えるターゲットがあれば領域ごとにベイクする
+        bake_pass = self.get_plan_pass(bake_type, target_label)
+        if self.use_tiled and bake_pass is not None:
+            from . import tiled_bake
+            tiled = tiled_bake.bake_tiled_pass(bake_pass, self.objects, self.uv_channel, self.tile_budget)
+            if tiled:
+                # 後処理で画像全体を読み込むと分割した意味が無くなるので、分割した画像には行わない
+                self.tiled_images.update(tiled)
+                self.report({'INFO'}, f"{bake_type}: {', '.join(tiled)} baked in tiles and written to disk "
+                                      "(denoise, padding, bake cache, Auto Save and LOD textures are skipped for them)")
+                return
+        if self.use_adaptive and bake_pass is not None:
+            from . import adaptive_samples
+            self.used_samples.update(adaptive_samples.bake_adaptive_pass(
+                bake_pass, self.objects, self.scene, bpy.context.view_layer,
+                self.adaptive_min_samples, self.samples, self.noise_threshold, self.report,
+            ))
+            return
+        bpy.ops.object.bake(type=bake_type)
+
+    @property
+    def needs_sync_bake(self):
+        # 分割ベイクとアダプティブサンプリングは複数回のベイクを順に行うので同期的に実行する
+        return self.use_tiled or self.use_adaptive
+
+    def samples_key(self, bake_type):
+        # キャッシュのキーに使うサンプル設定
+        if self.use_adaptive:
+            key = ('ADAPTIVE', self.adaptive_min_samples, self.samples, round(self.noise_threshold, 6))
+        else:
+            key = self.samples
+        if self.uses_denoise(bake_type):
+            return (key, 'DENOISE', self.denoise_guides)
+        return key
+
+    def margin_key(self):
+        # キャッシュのキーに使うマージン設定
+        if self.use_padding:
+            return ('PADDING', self.padding_mode, self.padding_pixels)
+        return self.scene.render.bake.margin
+
+    def uses_denoise(self, bake_type):
+        return self.use_denoise and bake_type in self.denoise_types
+
+    def finish_pass(self, bake_type, target_label):
+        # ノイズ除去とエッジパディングを行い、ベイクした結果をキャッシュに保存する
+        bake_pass = self.get_plan_pass(bake_type, target_label)
+        if bake_pass is not None and self.tiled_images:
+            bake_pass = bake_pass.without_images(self.tiled_images)
+        if self.uses_denoise(bake_type) and bake_pass is not None:
+            from . import bake_denoise
+            with self.profile.phase("denoise"):
+                bake_denoise.denoise_pass(bake_pass, self.objects, self.sources, self.scene, self.denoise_guides, self.report)
+        if self.use_padding and bake_pass is not None:
+            from . import edge_padding
+            with self.profile.phase("padding"):
+                edge_padding.pad_pass(bake_pass, self.objects, self.uv_channel, self.padding_mode, self.padding_pixels)
+        keys = self.cache_keys.pop((bake_type, target_label), None)
+        if self.cache is None or not keys:
+            return
+        with self.profile.phase("cache"):
+            for image_name, key in keys.items():
+                img = bpy.data.images.get(image_name)
+                if img and img.has_data and image_name not in self.tiled_images:
+                    try:
+                        self.cache.store(key, img)
+                    except OSError as e:
+                        self.report({'WARNING'}, f"Could not write the bake cache: {e}")
+                        return
+
+    @timed("cache")
+    def load_cached_pass(self, bake_pass):
+        if self.use_tiled:
+            # 分割ベイクするターゲットはキャッシュから読み込むと画像全体のバッファが作られるので使わない
+            from . import tiled_bake
+            if any(tiled_bake.needs_tiling(bpy.data.images[name], self.tile_budget)
+                   for name in bake_pass.image_names if name in bpy.data.images):
+                return False
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        keys = {}
+        for image_name in bake_pass.image_names:
+            img = bpy.data.images.get(image_name)
+            materials = [bpy.data.materials[mat_name] for mat_name, _node, node_image in bake_pass.nodes
+                         if node_image == image_name and mat_name in bpy.data.materials]
+            objects = [obj for obj in self.objects
+                       if any(slot.material in materials for slot in obj.material_slots)]
+            margin = self.margin_key()
+            if self.sources:
+                # ハイポリから転写する場合はソースのメッシュとマテリアル、レイの距離も結果に影響する
+                objects += self.sources
+                materials += [mat for mat in bake_targets.iter_materials(self.sources) if mat not in materials]
+                bake = self.scene.render.bake
+                margin = (margin, round(bake.cage_extrusion, 6), round(bake.max_ray_distance, 6))
+            keys[image_name] = self.cache.image_key(
+                img, bake_pass.bake_type, self.samples_key(bake_pass.bake_type), margin, self.uv_channel,
+                objects, materials, self.scene, depsgraph,
+            )
+
+        hit = all(self.cache.load(key, bpy.data.images[image_name]) for image_name, key in keys.items())
+        if not hit:
+            self.cache_keys[(bake_pass.bake_type, bake_pass.target_label)] = keys
+        return hit
+
+    @timed("restore")
+    def restore(self):
+        for tree, node in self.original_active_nodes:
+            tree.nodes.active = node
+
+        # ベイクが終わったら元のUVチャンネルに戻す
+        if self.return_to_original:
+            for obj in self.objects:
+                obj.data.uv_layers.active_index = self.original_uv_indices.get(obj.name, self.uv_channel)
+
+        if self.original_settings is not None:
+            # スレッド数とタイルサイズは常に元に戻す
+            if self.auto_tune:
+                self.original_settings.restore(bake_tuning.TUNING_PATHS)
+            # 元のRender Samplesに戻す
+            if self.return_to_render_samples:
+                self.original_settings.restore(("cycles.samples",))
+
+    @timed("save")
+    def save_images(self):
+        # Auto Saveが有効な場合、ベイク先の画像のうち変更があり、PCに保存されているものだけを保存
+        # エンコードと書き込みはバックグラウンドのスレッドで行う
+        if not self.auto_save or self.plan is None:
+            return
+        from . import image_writer
+        if self.use_mip_chain:
+            from . import mip_chain
+            normal_images = {name for bake_pass in self.plan.passes if bake_pass.bake_type == 'NORMAL' for name in bake_pass.image_names}
+        for image_name in self.plan.targets:
+            if image_name in self.tiled_images:
+                # 分割ベイクでファイルに書き出し済み
+                continue
+            img = bpy.data.images.get(image_name)
+            if img and img.is_dirty and img.has_data and img.filepath_raw:  # ローカルに保存されている場合
+                try:
+                    pixels = image_writer.read_pixels(img)
+                    path = image_writer.save_queue.submit(img, self.save_format, self.png_compression, self.free_after_save, pixels)
+                    # 同じピクセルから縮小版を作り、元の画像の隣に保存する
+                    if self.use_mip_chain:
+                        mip_chain.submit_chain(img, pixels, path, image_name in normal_images, self.mip_min_size,
+                                               self.mip_filter, self.save_format, self.png_compression)
+                except (RuntimeError, OSError) as e:
+                    self.report({'ERROR'}, f"Could not save image {img.name}: {e}")
+        if bpy.app.background or self.wait_for_save:
+            image_writer.save_queue.wait()
+
+    def record_profile(self):
+        # 計測結果をパネル用に残し、ログファイルに追記する
+        targets = list(self.plan.targets.values()) if self.plan is not None else []
+        return bake_timing.record(self.profile, self.objects, self.bake_passes, targets, self.timing_log)
+
+    def get_plan_pass(self, bake_type, target_label):
+        for bake_pass in self.plan.passes:
+            if bake_pass.bake_type == bake_type and bake_pass.target_label == target_label:
+                return bake_pass
+        return None
+
+
+def bake_sessions(sessions, view_layer):
+    """sessions (メモリの予算で分けたバッチ) を順にベイクし、合計時間を返す
+
+    bpy.ops.object.bake は選択中のオブジェクトを全てベイクするので、バッチごとにそのバッチのオブジェクトだけを選択する
+    (そうしないと各バッチが全てのオブジェクトをベイクし直し、全てのターゲットを読み込む)
+    """
+    total = 0.0
+    for session in sessions:
+        try:
+            with bake_tuning.selected_for_bake(view_layer, session.objects + session.sources, session.objects[0]):
+                session.begin()
+                # 共通の設定は一度だけ行い、ベイクだけをパスごとに繰り返す
+                for bake_type, target_label in session.bake_passes:
+                    if session.prepare_pass(bake_type, target_label):
+                        session.bake_pass(bake_type, target_label)
+                        session.finish_pass(bake_type, target_label)
+        except Exception:
+            # エラーが発生した場合でもRender Samplesなどを元に戻す
+            session.restore()
+            raise
+
+        session.restore()
+        session.save_images()
+        total += session.record_profile()['total']
+    return total
+
 
 class SimpleBakeOperator(bpy.types.Operator):
     bl_idname = "object.simple_bake_operator"
@@ -6,131 +421,261 @@ class SimpleBakeOperator(bpy.types.Operator):
 
     @classmethod
     def poll(cls, context):
-        obj = context.active_object
-        if obj and obj.type == 'MESH':
-            if obj.material_slots:
-                for mat_slot in obj.material_slots:
-                    if mat_slot.material and mat_slot.material.use_nodes:
-                        active_node = cls.get_active_image_node(context, mat_slot.material.node_tree)
-                        if active_node and active_node.type == 'TEX_IMAGE':
-                            return True
-        return False
+        bake_possible, _image_name, _material_name = node_cache.get_bake_target(context)
+        return bake_possible
 
     def execute(self, context):
-        scene = context.scene
-        uv_channel = scene.simple_bake_uv_channel
-        return_to_original = scene.simple_bake_return_to_original_uv
-        bake_type = scene.simple_bake_type
-        auto_save = scene.simple_bake_auto_save
-        return_to_render_samples = scene.simple_bake_return_to_render_samples
-
-        original_uv_indices = {}
-        original_render_samples = scene.cycles.samples  # 元のRender Samplesを保存
-
-        valid_objects = [obj for obj in context.selected_objects if obj.type == 'MESH' and obj.data.uv_layers and obj.material_slots]
+        valid_objects = BakeSession.get_valid_objects(context)
 
         if not valid_objects:
             self.report({'ERROR'}, "Select the object that contains the material")
             return {'CANCELLED'}
 
-        for obj in valid_objects:
-            original_uv_indices[obj.name] = obj.data.uv_layers.active_index
-            if 0 <= uv_channel < len(obj.data.uv_layers):
-                obj.data.uv_layers.active_index = uv_channel
-            else:
-                self.report({'WARNING'}, f"Object {obj.name} has no UV layer at index {uv_channel}")
+        sources = BakeSession.get_source_objects(context)
+        if context.scene.simple_bake_selected_to_active and not sources:
+            self.report({'ERROR'}, "Select the high poly objects and make the low poly object active")
+            return {'CANCELLED'}
+
+        session = BakeSession(context.scene, valid_objects, self.report, sources)
+        if not session.bake_passes:
+            self.report({'ERROR'}, "Select at least one bake type")
+            return {'CANCELLED'}
 
+        # メモリの予算を超える場合はバッチに分け、バッチごとに保存してから次をベイクする
         try:
-            # Samplesの設定
-            cycles = scene.cycles
-            cycles.samples = int(scene.simple_bake_samples)
-
-            # ベイク設定を行い、ターゲットイメージにベイクを実行
-            scene.cycles.bake_type = bake_type
-            scene.render.bake.use_selected_to_active = False
-            scene.render.bake.use_cage = False
-            scene.render.bake.cage_extrusion = 0.1
-            scene.render.bake.use_clear = True
-            scene.render.bake.margin = 16
-
-            # 画像が未初期化の場合は初期化
-            for img in bpy.data.images:
-                if not img.has_data:
-                    new_img = bpy.data.images.new(
-                        name=img.name,
-                        width=1024,  # 適切な幅に設定
-                        height=1024,  # 適切な高さに設定
-                        alpha=True,  # アルファチャンネルを有効にする
-                        float_buffer=False,  # フロートバッファを無効にする
-                    )
-                    new_img.file_format = 'PNG'
-                    bpy.data.images.remove(img)
-                    img = new_img
-
-            bpy.ops.object.bake(type=bake_type)
+            total = bake_sessions(session.split_by_memory(), context.view_layer)
         except Exception as e:
-            # エラーが発生した場合でもRender Samplesを元に戻す
-            if return_to_render_samples:
-                scene.cycles.samples = original_render_samples
             self.report({'ERROR'}, f"Bake failed: {e}")
             return {'CANCELLED'}
 
-        # ベイクが終わったら元のUVチャンネルに戻す
-        if return_to_original:
-            for obj in valid_objects:
-                obj.data.uv_layers.active_index = original_uv_indices.get(obj.name, uv_channel)
-
-        # 元のRender Samplesに戻す
-        if return_to_render_samples:
-            scene.cycles.samples = original_render_samples
-
-        # Auto Saveが有効な場合、PCに保存されている画像を上書き保存
-        if auto_save:
-            for img in bpy.data.images:
-                if img.has_data and img.filepath_raw:  # ローカルに保存されている場合
-                    try:
-                        img.save()
-                    except RuntimeError as e:
-                        self.report({'ERROR'}, f"Could not save image {img.name}: {e}")
-
-        self.report({'INFO'}, "Bake completed")
+        self.report({'INFO'}, f"Bake completed in {total:.2f} s")
         return {'FINISHED'}
 
-    @classmethod
-    def get_active_image_node(cls, context, node_tree):
-        for area in context.screen.areas:
-            if area.type == 'NODE_EDITOR':
-                for space in area.spaces:
-                    if space.type == 'NODE_EDITOR' and space.node_tree == node_tree:
-                        return space.node_tree.nodes.active
-        return None
-
 
 def register():
     bpy.utils.register_class(SimpleBakeOperator)
     bpy.types.Scene.simple_bake_type = bpy.props.EnumProperty(
         name="Bake Type",
         description="Choose the type of bake",
+        items=BAKE_TYPE_ITEMS,
+        default='EMIT'
+    )
+    bpy.types.Scene.simple_bake_uv_channel = bpy.props.IntProperty(
+        name="Set Bake UV",
+        description="Set the UV channel to be used for baking",
+        default=0,
+        min=0,
+        max=10
+    )
+    bpy.types.Scene.simple_bake_return_to_original_uv = bpy.props.BoolProperty(
+        name="Return to Selected UV",
+        description="Return to the selected UV channel after baking",
+        default=True
+    )
+    bpy.types.Scene.simple_bake_auto_save = bpy.props.BoolProperty(
+        name="Auto Save",
+        description="Automatically save the image after baking",
+        default=False
+    )
+    bpy.types.Scene.simple_bake_target_size = bpy.props.EnumProperty(
+        name="Missing Image Size",
+        description="Size used for bake target images that have no data yet",
         items=[
-            ('EMIT', "Emit", ""),
-            ('NORMAL', "Normal", ""),
-            ('SHADOW', "Shadow", ""),
-            ('AO', "AO", "")
+            ('256', "256", ""),
+            ('512', "512", ""),
+            ('1024', "1024", ""),
+            ('2048', "2048", ""),
+            ('4096', "4096", ""),
+            ('8192', "8K", ""),
+            ('16384', "16K", "")
         ],
-        default='EMIT'
+        default='1024'
+    )
+    bpy.types.Scene.simple_bake_tiled = bpy.props.BoolProperty(
+        name="Tiled Bake",
+        description="Split large and UDIM targets into UV regions and bake them one at a time",
+        default=False
+    )
+    bpy.types.Scene.simple_bake_tile_memory_mb = bpy.props.IntProperty(
+        name="Tile Memory (MB)",
+        description="Memory limit for baking one region of a tiled target",
+        default=2048,
+        min=64
+    )
+    bpy.types.Scene.simple_bake_selected_to_active = bpy.props.BoolProperty(
+        name="Selected to Active",
+        description="Bake the other selected objects (high poly) onto the active object (low poly)",
+        default=False
+    )
+    bpy.types.Scene.simple_bake_auto_cage = bpy.props.BoolProperty(
+        name="Auto Ray Distance",
+        description="Measure the smallest extrusion and ray distance that reach the high poly surface",
+        default=True
+    )
+    bpy.types.Scene.simple_bake_cage_extrusion = bpy.props.FloatProperty(
+        name="Extrusion",
+        description="Distance the rays start above the low poly surface",
+        default=0.1,
+        min=0.0,
+        unit='LENGTH'
+    )
+    bpy.types.Scene.simple_bake_max_ray_distance = bpy.props.FloatProperty(
+        name="Max Ray Distance",
+        description="Maximum length of the rays (0 is no limit)",
+        default=0.0,
+        min=0.0,
+        unit='LENGTH'
+    )
+    bpy.types.Scene.simple_bake_padding = bpy.props.BoolProperty(
+        name="Edge Padding",
+        description="Extend the baked UV islands into the empty texels after baking instead of using the Cycles margin",
+        default=False
+    )
+    bpy.types.Scene.simple_bake_padding_mode = bpy.props.EnumProperty(
+        name="Padding",
+        description="How far the UV islands are extended",
+        items=core.PADDING_MODE_ITEMS,
+        default='AUTO'
+    )
+    bpy.types.Scene.simple_bake_padding_pixels = bpy.props.IntProperty(
+        name="Padding Pixels",
+        description="Number of pixels the UV islands are extended",
+        default=16,
+        min=1,
+        max=1024
+    )
+    bpy.types.Scene.simple_bake_adaptive = bpy.props.BoolProperty(
+        name="Adaptive Samples",
+        description="Start with few samples and raise them only for images that are still noisy (Samples is the upper limit)",
+        default=False
+    )
+    bpy.types.Scene.simple_bake_adaptive_min_samples = bpy.props.IntProperty(
+        name="Start Samples",
+        description="Samples of the first adaptive pass",
+        default=16,
+        min=1,
+        max=1024
+    )
+    bpy.types.Scene.simple_bake_noise_threshold = bpy.props.FloatProperty(
+        name="Noise Threshold",
+        description="An image is done when the noise of its noisiest region is below this value",
+        default=0.01,
+        min=0.0001,
+        max=1.0,
+        precision=4
+    )
+    bpy.types.Scene.simple_bake_save_format = bpy.props.EnumProperty(
+        name="Save Format",
+        description="File format used by Auto Save",
+        items=core.SAVE_FORMAT_ITEMS,
+        default='PNG'
+    )
+    bpy.types.Scene.simple_bake_free_saved_images = bpy.props.BoolProperty(
+        name="Free Saved Images",
+        description="Free the pixels of an image once Auto Save has written it (it is read back from the file when needed)",
+        default=True
+    )
+    bpy.types.Scene.simple_bake_mip_chain = bpy.props.BoolProperty(
+        name="LOD Textures",
+        description="Also save halved copies of each saved image (MatBase_2048.png, MatBase_1024.png, ...) next to it",
+        default=False
+    )
+    bpy.types.Scene.simple_bake_mip_min_size = bpy.props.EnumProperty(
+        name="Smallest LOD",
+        description="Size of the smallest saved copy",
+        items=[
+            ('64', "64", ""),
+            ('128', "128", ""),
+            ('256', "256", ""),
+            ('512', "512", ""),
+            ('1024', "1024", ""),
+            ('2048', "2048", "")
+        ],
+        default='512'
+    )
+    bpy.types.Scene.simple_bake_mip_filter = bpy.props.EnumProperty(
+        name="LOD Filter",
+        description="Filter used to shrink the images (normal maps are renormalized)",
+        items=core.MIP_FILTER_ITEMS,
+        default='BOX'
+    )
+    bpy.types.Scene.simple_bake_memory_budget_mb = bpy.props.IntProperty(
+        name="Memory Budget (MB)",
+        description="Memory the bake target images may use at once (0 is no limit)",
+        default=0,
+        min=0
+    )
+    bpy.types.Scene.simple_bake_memory_action = bpy.props.EnumProperty(
+        name="Over Budget",
+        description="What to do when the bake target images need more memory than the budget",
+        items=[
+            ('WARN', "Warn", "Bake everything at once and show a warning"),
+            ('SPLIT', "Split", "Bake the objects in batches that fit the budget (needs Auto Save)"),
+        ],
+        default='WARN'
+    )
+    bpy.types.Scene.simple_bake_png_compression = bpy.props.IntProperty(
+        name="PNG Compression",
+        description="zlib compression level used by Auto Save for PNG files",
+        default=6,
+        min=0,
+        max=9
+    )
+    bpy.types.Scene.simple_bake_multi_pass = bpy.props.BoolProperty(
+        name="Multi Pass",
+        description="Bake several bake types in one run, each into its own image node",
+        default=False
+    )
+    bpy.types.Scene.simple_bake_pass_types = bpy.props.EnumProperty(
+        name="Bake Types",
+        description="Bake types to bake in one run",
+        items=BAKE_TYPE_ITEMS,
+        options={'ENUM_FLAG'},
+        default={'EMIT'}
+    )
+    for bake_type, prop_name in PASS_TARGET_PROPS.items():
+        setattr(bpy.types.Scene, prop_name, bpy.props.StringProperty(
+            name=f"{bake_type.title()} Target",
+            description=f"Label of the image node that receives the {bake_type} bake",
+            default=PASS_TARGET_DEFAULTS[bake_type]
+        ))
+    bpy.types.Scene.simple_bake_timing_log = bpy.props.StringProperty(
+        name="Timing Log",
+        description="JSON Lines file that receives the timing of every bake (empty: do not write)",
+        default="",
+        subtype='FILE_PATH'
     )
     bpy.types.Scene.simple_bake_samples = bpy.props.EnumProperty(
         name="Samples",
         description="Set the number of samples for rendering",
+        # 保存済みのファイルの値が変わらないように、後から追加した 32 には末尾の番号を付ける
         items=[
-            ('1', "1", ""),
-            ('8', "8", ""),
-            ('64', "64", ""),
-            ('256', "256", ""),
-            ('1024', "1024", "")
+            ('1', "1", "", 0),
+            ('8', "8", "", 1),
+            ('32', "32", "", 5),
+            ('64', "64", "", 2),
+            ('256', "256", "", 3),
+            ('1024', "1024", "", 4)
         ],
         default='1'
     )
+    bpy.types.Scene.simple_bake_denoise = bpy.props.BoolProperty(
+        name="Denoise",
+        description="Denoise the baked images with OpenImageDenoise before they are saved, so fewer samples are needed",
+        default=False
+    )
+    bpy.types.Scene.simple_bake_denoise_types = bpy.props.EnumProperty(
+        name="Denoise Types",
+        description="Bake types that are denoised",
+        items=BAKE_TYPE_ITEMS,
+        options={'ENUM_FLAG'},
+        default={'AO', 'SHADOW'}
+    )
+    bpy.types.Scene.simple_bake_denoise_guides = bpy.props.BoolProperty(
+        name="Normal / Albedo Guides",
+        description="Also bake normal and albedo images and give them to the denoiser to keep edges and texture detail",
+        default=True
+    )
     bpy.types.Scene.simple_bake_return_to_render_samples = bpy.props.BoolProperty(
         name="Return to Render Samples",
         description="Return to the original Render Samples after baking",
@@ -139,7 +684,46 @@ def register():
 
 
 def unregister():
+    # 読み込まれていないモジュールには後片付けするものが無い
+    if f"{__package__}.image_writer" in sys.modules:
+        from . import image_writer
+        image_writer.unregister()
+    if f"{__package__}.high_to_low" in sys.modules:
+        from . import high_to_low
+        high_to_low.clear_cache()
     bpy.utils.unregister_class(SimpleBakeOperator)
     del bpy.types.Scene.simple_bake_type
+    del bpy.types.Scene.simple_bake_uv_channel
+    del bpy.types.Scene.simple_bake_return_to_original_uv
+    del bpy.types.Scene.simple_bake_auto_save
+    del bpy.types.Scene.simple_bake_target_size
+    del bpy.types.Scene.simple_bake_tiled
+    del bpy.types.Scene.simple_bake_tile_memory_mb
+    del bpy.types.Scene.simple_bake_selected_to_active
+    del bpy.types.Scene.simple_bake_auto_cage
+    del bpy.types.Scene.simple_bake_cage_extrusion
+    del bpy.types.Scene.simple_bake_max_ray_distance
+    del bpy.types.Scene.simple_bake_padding
+    del bpy.types.Scene.simple_bake_padding_mode
+    del bpy.types.Scene.simple_bake_padding_pixels
+    del bpy.types.Scene.simple_bake_adaptive
+    del bpy.types.Scene.simple_bake_adaptive_min_samples
+    del bpy.types.Scene.simple_bake_noise_threshold
+    del bpy.types.Scene.simple_bake_save_format
+    del bpy.types.Scene.simple_bake_png_compression
+    del bpy.types.Scene.simple_bake_free_saved_images
+    del bpy.types.Scene.simple_bake_denoise
+    del bpy.types.Scene.simple_bake_denoise_types
+    del bpy.types.Scene.simple_bake_denoise_guides
+    del bpy.types.Scene.simple_bake_mip_chain
+    del bpy.types.Scene.simple_bake_mip_min_size
+    del bpy.types.Scene.simple_bake_mip_filter
+    del bpy.types.Scene.simple_bake_memory_budget_mb
+    del bpy.types.Scene.simple_bake_memory_action
+    del bpy.types.Scene.simple_bake_multi_pass
+    del bpy.types.Scene.simple_bake_pass_types
+    for prop_name in PASS_TARGET_PROPS.values():
+        delattr(bpy.types.Scene, prop_name)
+    del bpy.types.Scene.simple_bake_timing_log
     del bpy.types.Scene.simple_bake_samples
     del bpy.types.Scene.simple_bake_return_to_render_samples
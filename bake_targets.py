@@ -0,0 +1,138 @@
+import os
+
+import bpy
+
+from . import core
+
+# ベイク先の画像を解決するステージ
+# bpy.data.images 全体ではなく、選択オブジェクトのマテリアルで実際にベイク先になる
+# イメージノードの画像だけを集めて初期化する
+# 何をベイクするかは core で決め、ここでは Blender のデータとの変換と画像の確保を行う
+
+# シグネチャー → BakePlan (同じ選択・同じターゲットで繰り返しベイクする場合に再利用する)
+_plan_cache = {}
+_PLAN_CACHE_SIZE = 16
+
+
+def plan_is_valid(plan):
+    # ノードの削除やラベル・画像の変更があればプランを作り直す
+    for bake_pass in plan.passes:
+        for mat_name, node_name, image_name in bake_pass.nodes:
+            mat = bpy.data.materials.get(mat_name)
+            node = mat.node_tree.nodes.get(node_name) if mat and mat.node_tree else None
+            if node is None or node.image is None or node.image.name != image_name:
+                return False
+            if bake_pass.target_label is not None and node.label != bake_pass.target_label:
+                return False
+    return True
+
+
+def iter_materials(objects):
+    seen = set()
+    for obj in objects:
+        for mat_slot in obj.material_slots:
+            mat = mat_slot.material
+            if mat and mat.use_nodes and mat.name not in seen:
+                seen.add(mat.name)
+                yield mat
+
+
+def node_info(node):
+    return core.NodeInfo(node.name, node.type, node.label, node.image.name if node.type == 'TEX_IMAGE' and node.image else None)
+
+
+def material_info(mat):
+    tree = mat.node_tree
+    nodes = [node_info(node) for node in tree.nodes if node.type == 'TEX_IMAGE']
+    active = node_info(tree.nodes.active) if tree.nodes.active else None
+    return core.MaterialInfo(mat.name, nodes, active)
+
+
+def image_info(img):
+    # size を参照すると未読み込みの画像が読み込まれるので、データがある場合だけ参照する
+    if img.has_data:
+        width, height = img.size
+        is_float = img.is_float
+    elif img.source == 'GENERATED':
+        width, height = img.generated_width, img.generated_height
+        is_float = img.use_generated_float
+    else:
+        width = height = None
+        is_float = img.use_generated_float
+    return core.ImageInfo(img.name, width, height, is_float, alpha=img.alpha_mode != 'NONE')
+
+
+def needs_allocation(img):
+    # ディスク上やパックされたデータがある画像はベイク時に読み込まれるので確保しない
+    # 生成画像はベイク時に自動的に作られる
+    if img.has_data or img.source == 'GENERATED':
+        return False
+    if img.packed_file:
+        return False
+    return not (img.filepath and os.path.exists(bpy.path.abspath(img.filepath, library=img.library)))
+
+
+def build_plan(objects, bake_passes, uv_channel, default_size):
+    materials = [material_info(mat) for mat in iter_materials(objects)]
+    signature = core.plan_signature([obj.name for obj in objects], materials, bake_passes, uv_channel, default_size)
+    plan = _plan_cache.get(signature)
+    if plan is not None and plan_is_valid(plan):
+        return plan
+
+    image_names = {node.image_name for mat in materials for node in mat.nodes + [mat.active] if node and node.image_name}
+    images = {name: image_info(bpy.data.images[name]) for name in image_names}
+    plan = core.build_plan(signature, materials, images, bake_passes, default_size)
+
+    if len(_plan_cache) >= _PLAN_CACHE_SIZE:
+        _plan_cache.pop(next(iter(_plan_cache)))
+    _plan_cache[signature] = plan
+    return plan
+
+
+def allocate_targets(plan):
+    # データが無いターゲット画像だけを生成画像として確保する
+    # 画像を作り直さないので、ノードの参照やファイルパスはそのまま残る
+    allocated = []
+    for target in plan.targets.values():
+        img = bpy.data.images.get(target.image_name)
+        if img is None or not needs_allocation(img):
+            continue
+        img.source = 'GENERATED'
+        img.generated_width = target.width
+        img.generated_height = target.height
+        img.use_generated_float = target.float_buffer
+        img.alpha_mode = 'STRAIGHT' if target.alpha else 'NONE'
+        if not img.file_format:
+            img.file_format = 'PNG'
+        allocated.append(img.name)
+    return allocated
+
+
+def object_images(plan, objects):
+    # オブジェクトごとに、プランのどの画像にベイクするか ([(オブジェクト名, 画像名の集合), ...])
+    images_by_material = {}
+    for bake_pass in plan.passes:
+        for mat_name, _node_name, image_name in bake_pass.nodes:
+            images_by_material.setdefault(mat_name, set()).add(image_name)
+    result = []
+    for obj in objects:
+        images = set()
+        for slot in obj.material_slots:
+            if slot.material:
+                images |= images_by_material.get(slot.material.name, set())
+        result.append((obj.name, images))
+    return result
+
+
+def activate_pass(bake_pass):
+    # パスのターゲットノードを各マテリアルのアクティブノードにする
+    for mat_name, node_name, _image_name in bake_pass.nodes:
+        mat = bpy.data.materials.get(mat_name)
+        node = mat.node_tree.nodes.get(node_name) if mat else None
+        if node:
+            mat.node_tree.nodes.active = node
+    return bool(bake_pass.nodes)
+
+
+def clear_cache():
+    _plan_cache.clear()
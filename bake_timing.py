@@ -0,0 +1,109 @@
+import contextlib
+import datetime
+import functools
+import json
+import os
+import sys
+import time
+
+import bpy
+
+from . import core
+
+try:
+    import resource
+except ImportError:  # Windows には resource モジュールが無い
+    resource = None
+
+# ベイクの段階ごとの時間を計測する
+# 最後のベイクの結果はパネルに表示し、ログファイルが指定されていれば JSON Lines で追記する
+
+# パネルに表示する段階の名前
+PHASE_LABELS = {
+    "uv": "UV Switch",
+    "plan": "Image Scan",
+    "tune": "Auto Tune",
+    "bake": "Bake",
+    "denoise": "Denoise",
+    "padding": "Edge Padding",
+    "cache": "Bake Cache",
+    "restore": "Restore",
+    "save": "Auto Save",
+}
+
+last_record = None
+
+
+def peak_memory_mb():
+    # プロセス開始からの最大常駐メモリ (Linux は KB、macOS はバイト単位)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class BakeProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def to_record(self, objects, bake_passes, targets):
+        # targets は BakeTarget のリスト
+        resolutions = {}
+        image_bytes = 0
+        for target in targets:
+            key = f"{target.width}x{target.height}"
+            resolutions[key] = resolutions.get(key, 0) + 1
+            image_bytes += core.image_bytes(target.width, target.height, 4, target.float_buffer)
+        peak = peak_memory_mb()
+        return {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "blend": os.path.basename(bpy.data.filepath),
+            "objects": len(objects),
+            "bake_passes": [bake_type for bake_type, _target_label in bake_passes],
+            "total": round(time.perf_counter() - self.started, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "images": len(targets),
+            "resolutions": resolutions,
+            "image_memory_mb": round(image_bytes / (1024 * 1024), 1),
+            "peak_memory_mb": round(peak, 1) if peak is not None else None,
+        }
+
+
+def timed(phase):
+    # self.profile に phase の時間として記録するメソッドのデコレーター
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profile.phase(phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(profile, objects, bake_passes, targets, log_path):
+    """ベイクの計測結果を last_record に残し、log_path があれば 1 行追記する"""
+    global last_record
+    last_record = profile.to_record(objects, bake_passes, targets)
+    if log_path:
+        path = bpy.path.abspath(log_path)
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(last_record) + "\n")
+        except OSError as e:
+            print(f"Simple Bake: Could not write the timing log: {e}")
+    return last_record
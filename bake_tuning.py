@@ -0,0 +1,148 @@
+import contextlib
+import json
+import os
+import platform
+import time
+
+import bpy
+
+# ベイク用のスレッド数と Cycles のタイルサイズを自動で調整する
+# 最初のパスの前に少ないサンプル数 (CALIBRATION_SAMPLES) で何回かベイクして最も速い設定を選び、
+# ハードウェア・解像度ごとに設定フォルダーの JSON に保存して次からはそれを使う
+# 測定は常に同じサンプル数で行うので、キーにはベイクのサンプル数ではなく測定のサンプル数を含める
+
+# 調整する設定 (ベイク後に元の値に戻す)
+TUNING_PATHS = ("render.threads_mode", "render.threads", "cycles.use_auto_tile", "cycles.tile_size")
+
+TILE_SIZES = (256, 512, 1024, 2048)
+CALIBRATION_SAMPLES = 8
+
+
+def cache_path():
+    return os.path.join(bpy.utils.user_resource('CONFIG', path="simple_bake", create=True), "bake_tuning.json")
+
+
+def load_cache():
+    try:
+        with open(cache_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache):
+    path = cache_path()
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Simple Bake: Could not write the tuning cache: {e}")
+
+
+def hardware_key(scene):
+    # CPU、コア数、Cycles のデバイス、Blender のバージョンが同じなら同じ結果を使う
+    return "|".join([
+        platform.machine(),
+        platform.processor() or platform.system(),
+        str(os.cpu_count()),
+        scene.cycles.device,
+        bpy.app.version_string,
+    ])
+
+
+def tuning_key(scene, width, height):
+    return f"{hardware_key(scene)}|{width}x{height}|{CALIBRATION_SAMPLES}"
+
+
+def thread_candidates():
+    cpu_count = os.cpu_count() or 1
+    return sorted({cpu_count, max(1, cpu_count * 3 // 4), max(1, cpu_count // 2)}, reverse=True)
+
+
+def tile_candidates(width, height):
+    # 0 はタイルに分けない
+    size = max(width, height)
+    return [tile for tile in TILE_SIZES if tile < size] + [0]
+
+
+def apply_setting(scene, setting):
+    threads, tile = setting
+    scene.render.threads_mode = 'FIXED'
+    scene.render.threads = threads
+    scene.cycles.use_auto_tile = tile > 0
+    if tile:
+        scene.cycles.tile_size = tile
+
+
+@contextlib.contextmanager
+def selected_for_bake(view_layer, objects, active):
+    # ベイクする objects だけを選択し、終わったらユーザーの選択に戻す
+    user_selection = [obj for obj in view_layer.objects if obj.select_get()]
+    user_active = view_layer.objects.active
+    for obj in user_selection:
+        obj.select_set(False)
+    for obj in objects:
+        obj.select_set(True)
+    view_layer.objects.active = active
+    try:
+        yield
+    finally:
+        for obj in objects:
+            obj.select_set(False)
+        for obj in user_selection:
+            obj.select_set(True)
+        view_layer.objects.active = user_active
+
+
+def calibrate(scene, bake_type, width, height):
+    """短いベイクを繰り返して最も速い (スレッド数, タイルサイズ) を返す"""
+    samples = scene.cycles.samples
+    scene.cycles.samples = min(samples, CALIBRATION_SAMPLES)
+
+    def measure(setting):
+        apply_setting(scene, setting)
+        start = time.perf_counter()
+        bpy.ops.object.bake(type=bake_type)
+        return time.perf_counter() - start
+
+    try:
+        threads = thread_candidates()
+        # 最初のベイクはシェーダーのコンパイルや BVH の構築を含むので測らない
+        apply_setting(scene, (threads[0], 0))
+        bpy.ops.object.bake(type=bake_type)
+        # タイルサイズを全スレッドで選んでから、そのタイルサイズでスレッド数を選ぶ
+        best_tile = min(tile_candidates(width, height), key=lambda tile: measure((threads[0], tile)))
+        if scene.cycles.device == 'GPU':
+            best_threads = threads[0]
+        else:
+            best_threads = min(threads, key=lambda count: measure((count, best_tile)))
+    finally:
+        scene.cycles.samples = samples
+    return best_threads, best_tile
+
+
+class SimpleBakeClearTuningOperator(bpy.types.Operator):
+    bl_idname = "object.simple_bake_clear_tuning"
+    bl_label = "Clear Auto Tune"
+    bl_description = "Forget the measured thread counts and tile sizes so the next bake measures them again"
+
+    def execute(self, context):
+        save_cache({})
+        self.report({'INFO'}, "Auto tune results cleared")
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(SimpleBakeClearTuningOperator)
+    bpy.types.Scene.simple_bake_auto_tune = bpy.props.BoolProperty(
+        name="Auto Tune",
+        description="Measure the fastest thread count and tile size for this machine and resolution with short test bakes, and use them while baking",
+        default=False
+    )
+
+
+def unregister():
+    bpy.utils.unregister_class(SimpleBakeClearTuningOperator)
+    del bpy.types.Scene.simple_bake_auto_tune
@@ -0,0 +1,487 @@
+"""Simple Bake のヘッドレス・バッチベイク
+
+ジョブマニフェスト (JSON) を読み込み、ベイク対象を複数の Blender ワーカープロセスに
+分割して並列にベイクします。
+
+コーディネーター:
+    blender -b scene.blend --python batch_bake.py -- --manifest job.json --workers 8
+
+ワーカー (コーディネーターが自動で起動します):
+    blender -b scene.blend --python batch_bake.py -- --worker unit-0000.json
+
+マニフェストの例:
+    {
+        "blend": "//scene.blend",
+        "output_dir": "//bake_output",
+        "workers": 8,
+        "samples": 64,
+        "uv_channel": 0,
+        "margin": 16,
+        "jobs": [
+            {"object": "Rock", "bake_types": ["EMIT", "AO"],
+             "targets": {"EMIT": "RockBase.png", "AO": "RockAO.png"}},
+            {"object": "Tree", "bake_types": ["NORMAL"], "samples": 256}
+        ]
+    }
+
+"targets" を省略した場合は、各マテリアルのアクティブなイメージノードにベイクします。
+"labels" ({"EMIT": "Base", ...}) を指定すると、そのラベルのイメージノードにベイクします (マルチパス)。
+複数のベイクタイプを指定するジョブでは、全てのタイプに "targets" か "labels" が必要です
+(同じアクティブノードの画像にベイクすると、後のタイプが前の結果を上書きするため)。
+同じ画像にベイクするオブジェクトは同じワーカーにまとめられます
+(別々のプロセスでベイクすると use_clear で互いの結果を消してしまうため)。
+Blender の外 (python batch_bake.py) でコーディネーターを実行する場合は、全てのベイクタイプに "targets" が必要です。
+"""
+
+import array
+import json
+import os
+import subprocess
+import sys
+import time
+
+try:
+    import bpy
+except ImportError:  # コーディネーターは bpy 無しでも動作する
+    bpy = None
+
+
+BAKE_TYPES = {'EMIT', 'NORMAL', 'SHADOW', 'AO'}
+
+DEFAULT_SETTINGS = {
+    "samples": 1,
+    "uv_channel": 0,
+    "margin": 16,
+    "file_format": 'PNG',
+}
+
+
+class ManifestError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# マニフェスト
+# ---------------------------------------------------------------------------
+
+def resolve_path(path, base_dir):
+    # Blender の相対パス (//) とマニフェストからの相対パスを解決
+    if path.startswith("//"):
+        path = path[2:]
+    path = os.path.expanduser(path)
+    if not os.path.isabs(path):
+        path = os.path.join(base_dir, path)
+    return os.path.normpath(path)
+
+
+def load_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = manifest.get("jobs")
+    if not jobs:
+        raise ManifestError("Manifest has no jobs")
+
+    for job in jobs:
+        if "object" not in job:
+            raise ManifestError(f"Job without object: {job}")
+        bake_types = job.setdefault("bake_types", ['EMIT'])
+        unknown = set(bake_types) - BAKE_TYPES
+        if unknown:
+            raise ManifestError(f"Unknown bake types for {job['object']}: {sorted(unknown)}")
+        targets = job.setdefault("targets", {})
+        labels = job.get("labels", {})
+        if len(bake_types) > 1:
+            unassigned = [bake_type for bake_type in bake_types if not targets.get(bake_type) and not labels.get(bake_type)]
+            if unassigned:
+                raise ManifestError(f"Job for {job['object']} bakes several types into the active image node; "
+                                    f"give targets or labels for {unassigned}")
+
+    if manifest.get("blend"):
+        manifest["blend"] = resolve_path(manifest["blend"], base_dir)
+    manifest["output_dir"] = resolve_path(manifest.get("output_dir", "bake_output"), base_dir)
+    for key, value in DEFAULT_SETTINGS.items():
+        manifest.setdefault(key, value)
+    return manifest
+
+
+def job_settings(manifest, job):
+    # ジョブ単位の設定がマニフェスト全体の設定より優先される
+    return {key: job.get(key, manifest[key]) for key in DEFAULT_SETTINGS}
+
+
+def split_units(manifest, target_images=None):
+    """ジョブをワーカー単位に分割する
+
+    target_images は {オブジェクト名: ベイク先画像名の集合} で、同じ画像を共有する
+    オブジェクトを同じユニットにまとめるために使います。
+    """
+    jobs = manifest["jobs"]
+    target_images = target_images or {}
+
+    # 画像を共有するジョブを Union-Find でまとめる
+    parent = list(range(len(jobs)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for index, job in enumerate(jobs):
+        images = set(job["targets"].values()) | set(target_images.get(job["object"], ()))
+        for image_name in images:
+            if image_name in owner:
+                parent[find(index)] = find(owner[image_name])
+            else:
+                owner[image_name] = index
+
+    groups = {}
+    for index in range(len(jobs)):
+        groups.setdefault(find(index), []).append(jobs[index])
+
+    units = []
+    for unit_index, group in enumerate(groups.values()):
+        units.append({
+            "id": f"unit-{unit_index:04d}",
+            "jobs": [dict(job, **job_settings(manifest, job)) for job in group],
+            "output_dir": manifest["output_dir"],
+        })
+    return units
+
+
+# ---------------------------------------------------------------------------
+# ワーカー (Blender 内で実行)
+# ---------------------------------------------------------------------------
+
+def iter_material_trees(obj):
+    for mat_slot in obj.material_slots:
+        if mat_slot.material and mat_slot.material.use_nodes:
+            yield mat_slot.material.node_tree
+
+
+def find_label_node(tree, label):
+    for node in tree.nodes:
+        if node.type == 'TEX_IMAGE' and node.image and node.label == label:
+            return node
+    return None
+
+
+def jobs_without_targets(jobs):
+    # "targets" の無いベイクタイプがあるジョブのオブジェクト名
+    # (ラベルやアクティブノードの画像は .blend を開かないと分からない)
+    return [job["object"] for job in jobs if any(not job["targets"].get(bake_type) for bake_type in job["bake_types"])]
+
+
+def collect_target_images(jobs):
+    # 各ジョブのオブジェクトが実際にベイクする画像名 (targets の画像、labels のイメージノード、
+    # どちらも無いベイクタイプはアクティブなイメージノードの画像)
+    result = {}
+    for job in jobs:
+        obj = bpy.data.objects.get(job["object"])
+        if obj is None:
+            continue
+        names = result.setdefault(obj.name, set())
+        for bake_type in job["bake_types"]:
+            target = job["targets"].get(bake_type)
+            if target:
+                names.add(target)
+                continue
+            label = job.get("labels", {}).get(bake_type)
+            for tree in iter_material_trees(obj):
+                node = find_label_node(tree, label) if label else tree.nodes.active
+                if node and node.type == 'TEX_IMAGE' and node.image:
+                    names.add(node.image.name)
+    return result
+
+
+def activate_target(obj, image_name):
+    # image_name を持つイメージノードを各マテリアルのアクティブノードにする
+    images = []
+    for tree in iter_material_trees(obj):
+        for node in tree.nodes:
+            if node.type == 'TEX_IMAGE' and node.image and node.image.name == image_name:
+                tree.nodes.active = node
+                images.append(node.image)
+                break
+    return images
+
+
+def activate_label(obj, label):
+    # ラベルが label のイメージノードを各マテリアルのアクティブノードにする
+    images = []
+    for tree in iter_material_trees(obj):
+        node = find_label_node(tree, label)
+        if node is not None:
+            tree.nodes.active = node
+            images.append(node.image)
+    return images
+
+
+def active_target_images(obj):
+    images = []
+    for tree in iter_material_trees(obj):
+        node = tree.nodes.active
+        if node and node.type == 'TEX_IMAGE' and node.image:
+            images.append(node.image)
+    return images
+
+
+def ensure_image_data(img, size=1024):
+    # ディスク上に存在しない画像は生成画像に切り替える (ノードの参照はそのまま)
+    if not img.has_data:
+        img.source = 'GENERATED'
+        img.generated_width = img.size[0] or size
+        img.generated_height = img.size[1] or size
+
+
+def clear_image(img):
+    # use_clear を使わずにベイクする画像を、最初のベイクの前に Cycles と同じく透明な黒にする
+    width, height = img.size
+    img.pixels.foreach_set(array.array('f', bytes(width * height * img.channels * 4)))
+
+
+def save_baked_image(img, output_dir, file_format):
+    ext = ".exr" if file_format == 'OPEN_EXR' else ".png"
+    stem = os.path.splitext(img.name)[0]
+    path = os.path.join(output_dir, stem + ext)
+    img.filepath_raw = path
+    img.file_format = file_format
+    img.save()
+    return path
+
+
+def bake_unit(unit, on_progress=None):
+    # on_progress はベイクのたびに呼ばれる (スプールファームのワーカーがロックを更新する)
+    scene = bpy.context.scene
+    view_layer = bpy.context.view_layer
+    output_dir = unit["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+
+    scene.render.engine = 'CYCLES'
+    scene.render.bake.use_selected_to_active = False
+    scene.render.bake.use_cage = False
+    scene.render.bake.cage_extrusion = 0.1
+
+    # 同じ画像にベイクするオブジェクトは同じユニットにあるので、画像は最初のベイクの前にだけ消去し、
+    # 以降のベイクでは前のオブジェクトの結果を残す (use_clear のままだと最後のオブジェクトの結果しか残らない)
+    cleared = set()
+    baked = {}  # 画像名 → 画像
+    results = []
+    for job in unit["jobs"]:
+        obj = bpy.data.objects.get(job["object"])
+        if obj is None or obj.type != 'MESH' or not obj.material_slots:
+            results.append({"object": job["object"], "error": "Object not found or has no material"})
+            continue
+
+        for other in view_layer.objects:
+            other.select_set(False)
+        obj.select_set(True)
+        view_layer.objects.active = obj
+
+        uv_channel = job["uv_channel"]
+        if 0 <= uv_channel < len(obj.data.uv_layers):
+            obj.data.uv_layers.active_index = uv_channel
+        scene.cycles.samples = int(job["samples"])
+        scene.render.bake.margin = int(job["margin"])
+
+        for bake_type in job["bake_types"]:
+            target = job["targets"].get(bake_type)
+            label = job.get("labels", {}).get(bake_type)
+            if target:
+                images = activate_target(obj, target)
+            elif label:
+                images = activate_label(obj, label)
+            else:
+                images = active_target_images(obj)
+            if not images:
+                results.append({"object": obj.name, "bake_type": bake_type, "error": "No target image"})
+                continue
+            images = list({img.name: img for img in images}.values())
+            for img in images:
+                ensure_image_data(img)
+            if all(img.name not in cleared for img in images):
+                scene.render.bake.use_clear = True
+            else:
+                scene.render.bake.use_clear = False
+                for img in images:
+                    if img.name not in cleared:
+                        clear_image(img)
+            cleared.update(img.name for img in images)
+
+            start = time.perf_counter()
+            try:
+                scene.cycles.bake_type = bake_type
+                bpy.ops.object.bake(type=bake_type)
+            except RuntimeError as e:
+                results.append({"object": obj.name, "bake_type": bake_type, "error": str(e)})
+                continue
+            elapsed = time.perf_counter() - start
+            if on_progress is not None:
+                on_progress()
+
+            for img in images:
+                baked[img.name] = (img, job["file_format"])
+                results.append({
+                    "object": obj.name,
+                    "bake_type": bake_type,
+                    "image": img.name,
+                    "seconds": round(elapsed, 3),
+                })
+
+    # 全てのオブジェクトをベイクしてから、各画像を 1 回だけ保存する
+    paths = {name: save_baked_image(img, output_dir, file_format) for name, (img, file_format) in baked.items()}
+    for result in results:
+        if "image" in result:
+            result["path"] = paths[result["image"]]
+    return results
+
+
+def run_worker(unit_path):
+    with open(unit_path, encoding="utf-8") as f:
+        unit = json.load(f)
+    results = bake_unit(unit)
+    result_path = os.path.splitext(unit_path)[0] + ".result.json"
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({"id": unit["id"], "results": results}, f, indent=2)
+    return 0 if all("error" not in r for r in results) else 1
+
+
+# ---------------------------------------------------------------------------
+# コーディネーター
+# ---------------------------------------------------------------------------
+
+def worker_command(blender, blend, unit_path, threads):
+    return [
+        blender, "-b", blend,
+        "--python", os.path.abspath(__file__),
+        "-t", str(threads),
+        "--", "--worker", unit_path,
+    ]
+
+
+def run_pool(commands, workers, log_dir):
+    # 同時に workers 個までのプロセスを実行し、終了コードを返す
+    pending = list(enumerate(commands))
+    running = {}
+    exit_codes = [None] * len(commands)
+
+    while pending or running:
+        while pending and len(running) < workers:
+            index, command = pending.pop(0)
+            log = open(os.path.join(log_dir, f"unit-{index:04d}.log"), "w", encoding="utf-8")
+            running[index] = (subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT), log)
+
+        for index, (process, log) in list(running.items()):
+            if process.poll() is not None:
+                log.close()
+                exit_codes[index] = process.returncode
+                del running[index]
+        time.sleep(0.1)
+    return exit_codes
+
+
+def collect_results(unit_paths):
+    results = []
+    for unit_path in unit_paths:
+        result_path = os.path.splitext(unit_path)[0] + ".result.json"
+        if os.path.exists(result_path):
+            with open(result_path, encoding="utf-8") as f:
+                results.extend(json.load(f)["results"])
+    return results
+
+
+def apply_results(results):
+    # 読み込まれている blend の画像をベイク結果のファイルに差し替える
+    for result in results:
+        img = bpy.data.images.get(result.get("image", ""))
+        if img and result.get("path"):
+            img.source = 'FILE'
+            img.filepath = result["path"]
+            img.reload()
+
+
+def run_coordinator(manifest_path, workers=None, blender=None):
+    manifest = load_manifest(manifest_path)
+    workers = max(1, workers or manifest.get("workers") or os.cpu_count() or 1)
+
+    blend = manifest.get("blend")
+    target_images = {}
+    if bpy is not None:
+        blend = blend or bpy.data.filepath
+        blender = blender or bpy.app.binary_path
+        target_images = collect_target_images(manifest["jobs"])
+    else:
+        # Blender の外では画像を共有するジョブをまとめられず、別々のワーカーが互いの結果を消してしまう
+        missing = jobs_without_targets(manifest["jobs"])
+        if missing:
+            raise ManifestError(f"Without Blender every bake type needs \"targets\" (missing for {', '.join(missing)}); "
+                                "run the coordinator with blender -b instead")
+    if not blend or not blender:
+        raise ManifestError("Both a saved .blend file and a Blender executable are required")
+
+    units = split_units(manifest, target_images)
+    workers = min(workers, len(units))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    unit_dir = os.path.join(manifest["output_dir"], "units")
+    os.makedirs(unit_dir, exist_ok=True)
+    unit_paths = []
+    for unit in units:
+        unit_path = os.path.join(unit_dir, unit["id"] + ".json")
+        with open(unit_path, "w", encoding="utf-8") as f:
+            json.dump(unit, f, indent=2)
+        unit_paths.append(unit_path)
+
+    start = time.perf_counter()
+    commands = [worker_command(blender, blend, path, threads) for path in unit_paths]
+    exit_codes = run_pool(commands, workers, unit_dir)
+    results = collect_results(unit_paths)
+
+    summary = {
+        "blend": blend,
+        "workers": workers,
+        "threads_per_worker": threads,
+        "seconds": round(time.perf_counter() - start, 3),
+        "failed_units": [units[i]["id"] for i, code in enumerate(exit_codes) if code != 0],
+        "results": results,
+    }
+    with open(os.path.join(manifest["output_dir"], "results.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    if bpy is not None:
+        apply_results(results)
+    return summary
+
+
+def parse_args(argv):
+    import argparse
+
+    # Blender の引数は "--" 以降だけを解釈する
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    parser = argparse.ArgumentParser(prog="batch_bake")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--manifest", help="Job manifest (JSON)")
+    group.add_argument("--worker", help="Work unit written by the coordinator")
+    parser.add_argument("--workers", type=int, help="Number of worker Blender processes")
+    parser.add_argument("--blender", help="Blender executable for the workers")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.worker:
+        return run_worker(args.worker)
+    summary = run_coordinator(args.manifest, args.workers, args.blender)
+    print(f"Simple Bake: {len(summary['results'])} results in {summary['seconds']}s "
+          f"({summary['workers']} workers, {len(summary['failed_units'])} failed units)")
+    return 1 if summary["failed_units"] else 0
+
+
+if __name__ == "__main__":
+    code = main(sys.argv)
+    if code:
+        sys.exit(code)
@@ -0,0 +1,169 @@
+"""Simple Bake のベンチマーク
+
+オブジェクト数・マテリアルスロット数・画像サイズを変えたシーンを生成し、
+Simple Bake のオペレーターでベイクして段階ごとの時間を JSON Lines に書き出します。
+
+    blender -b --factory-startup --python benchmark.py -- \\
+        --objects 1,10,50 --slots 1,4 --sizes 512,2048 --repeat 3 --output bench.jsonl
+
+--baseline に以前の結果を指定すると、設定ごとの合計時間の中央値を比較し、
+--tolerance (既定 0.2 = 20%) より遅くなった設定があれば終了コード 1 を返します。
+"""
+
+import importlib
+import json
+import os
+import statistics
+import sys
+
+import bpy
+
+BAKE_TYPES = {'EMIT', 'NORMAL', 'SHADOW', 'AO'}
+
+
+def load_addon():
+    # このスクリプトが置かれたアドオンのフォルダーをパッケージとして読み込み、未登録なら登録する
+    addon_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir = os.path.dirname(addon_dir)
+    if parent_dir not in sys.path:
+        sys.path.insert(0, parent_dir)
+    addon = importlib.import_module(os.path.basename(addon_dir))
+    if not hasattr(bpy.types.Scene, "simple_bake_type"):
+        addon.register()
+    return addon
+
+
+def clear_scene():
+    for collection in (bpy.data.objects, bpy.data.meshes, bpy.data.materials, bpy.data.images):
+        for item in list(collection):
+            collection.remove(item)
+
+
+def create_material(name, size):
+    # 色付きの Emission と、ベイク先のアクティブなイメージノード
+    mat = bpy.data.materials.new(name)
+    mat.use_nodes = True
+    tree = mat.node_tree
+    tree.nodes.clear()
+    output = tree.nodes.new(type='ShaderNodeOutputMaterial')
+    emission = tree.nodes.new(type='ShaderNodeEmission')
+    emission.inputs['Color'].default_value = (0.8, 0.3, 0.1, 1.0)
+    tree.links.new(emission.outputs['Emission'], output.inputs['Surface'])
+    node = tree.nodes.new(type='ShaderNodeTexImage')
+    node.image = bpy.data.images.new(f"{name}Base.png", size, size)
+    tree.nodes.active = node
+    return mat
+
+
+def build_scene(addon, object_count, slot_count, size):
+    """object_count 個の球を作り、各球の面を slot_count 個のマテリアルに割り当てる"""
+    clear_scene()
+    scene = bpy.context.scene
+    scene.render.engine = 'CYCLES'
+    view_layer = bpy.context.view_layer
+    objects = []
+    for index in range(object_count):
+        bpy.ops.mesh.primitive_uv_sphere_add(segments=32, ring_count=16, location=(index * 2.5, 0.0, 0.0))
+        obj = bpy.context.active_object
+        obj.name = f"Bench{index:03d}"
+        for slot in range(slot_count):
+            obj.data.materials.append(create_material(f"{obj.name}Mat{slot}", size))
+        for polygon in obj.data.polygons:
+            polygon.material_index = polygon.index % slot_count
+        objects.append(obj)
+
+    for obj in view_layer.objects:
+        obj.select_set(obj in objects)
+    view_layer.objects.active = objects[0]
+    # 前のケースと同じオブジェクト名なので、ベイク先の検索結果を使い回さない
+    addon.node_cache.invalidate()
+    return scene
+
+
+def run_case(addon, object_count, slot_count, size, samples, bake_type):
+    scene = build_scene(addon, object_count, slot_count, size)
+    scene.simple_bake_type = bake_type
+    scene.simple_bake_samples = str(samples)
+    scene.simple_bake_multi_pass = False
+    scene.simple_bake_auto_save = False
+    result = bpy.ops.object.simple_bake_operator()
+    if 'FINISHED' not in result:
+        raise RuntimeError(f"Bake failed for {object_count} objects / {slot_count} slots / {size}px")
+    return dict(addon.bake_timing.last_record, case=case_name(object_count, slot_count, size))
+
+
+def case_name(object_count, slot_count, size):
+    return f"{object_count}obj-{slot_count}slot-{size}px"
+
+
+def median_totals(records):
+    totals = {}
+    for record in records:
+        totals.setdefault(record["case"], []).append(record["total"])
+    return {case: statistics.median(values) for case, values in totals.items()}
+
+
+def compare(records, baseline_path, tolerance):
+    # 戻り値は遅くなった設定の (名前, 以前の時間, 今回の時間) のリスト
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = median_totals(json.loads(line) for line in f if line.strip())
+    current = median_totals(records)
+    regressions = []
+    for case, seconds in current.items():
+        previous = baseline.get(case)
+        if previous and seconds > previous * (1.0 + tolerance):
+            regressions.append((case, previous, seconds))
+    return regressions
+
+
+def parse_int_list(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+def parse_args(argv):
+    import argparse
+
+    # Blender の引数は "--" 以降だけを解釈する
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    parser = argparse.ArgumentParser(prog="benchmark")
+    parser.add_argument("--objects", type=parse_int_list, default=[1, 10])
+    parser.add_argument("--slots", type=parse_int_list, default=[1, 4])
+    parser.add_argument("--sizes", type=parse_int_list, default=[512, 2048])
+    parser.add_argument("--samples", type=int, default=1, choices=[1, 8, 32, 64, 256, 1024])
+    parser.add_argument("--bake-type", default='EMIT', choices=sorted(BAKE_TYPES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="simple_bake_benchmark.jsonl")
+    parser.add_argument("--baseline", help="Earlier output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    addon = load_addon()
+
+    records = []
+    with open(args.output, "w", encoding="utf-8") as f:
+        for object_count in args.objects:
+            for slot_count in args.slots:
+                for size in args.sizes:
+                    for _repeat in range(args.repeat):
+                        record = run_case(addon, object_count, slot_count, size, args.samples, args.bake_type)
+                        f.write(json.dumps(record) + "\n")
+                        records.append(record)
+                    print(f"Simple Bake: {case_name(object_count, slot_count, size)} "
+                          f"{median_totals(records)[record['case']]:.3f}s")
+
+    if args.baseline:
+        regressions = compare(records, args.baseline, args.tolerance)
+        for case, previous, seconds in regressions:
+            print(f"Simple Bake: {case} is slower: {previous:.3f}s -> {seconds:.3f}s")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    code = main(sys.argv)
+    if code:
+        sys.exit(code)
@@ -0,0 +1,190 @@
+import os
+
+import bpy
+
+# ベイクしたグレースケール画像を 1 枚の画像のチャンネルにまとめる
+# 元画像の名前は Add Textures と同じ "{プレフィックス}{種類}.png" で探す
+# NumPy はアドオンの起動を速くするため、パックするときに読み込む
+
+# レイアウト → (出力画像の種類名, [(元画像の種類, 元画像が無い場合の値, 反転するか) × チャンネル数])
+PACK_LAYOUTS = {
+    'ORM': ("ORM", [("AO", 1.0, False), ("Roughness", 0.5, False), ("Metallic", 0.0, False)]),
+    'RMA': ("RMA", [("Roughness", 0.5, False), ("Metallic", 0.0, False), ("AO", 1.0, False)]),
+    'MASK': ("Mask", [("Metallic", 0.0, False), ("AO", 1.0, False), ("Detail", 0.0, False), ("Roughness", 0.5, True)]),
+}
+
+PACK_LAYOUT_ITEMS = [
+    ('ORM', "ORM", "AO / Roughness / Metallic in R / G / B"),
+    ('RMA', "RMA", "Roughness / Metallic / AO in R / G / B"),
+    ('MASK', "Mask Map", "Metallic / AO / Detail / Smoothness in R / G / B / A"),
+    ('CUSTOM', "Custom", "Choose the source of each channel"),
+]
+
+SOURCE_ACTION_ITEMS = [
+    ('KEEP', "Keep", "Keep the source images"),
+    ('FREE', "Free Memory", "Free the pixel buffers of source images that are saved on disk"),
+    ('REMOVE', "Remove", "Remove the source images from the Blend file"),
+]
+
+
+def read_channel(img):
+    # グレースケール画像なので R チャンネルだけを使う
+    # 出力は Non-Color なので、sRGB として保存されたバイト画像の値はリニアに戻す (float 画像は元からリニア)
+    import numpy as np
+    from . import image_writer
+    width, height = img.size
+    pixels = np.empty(width * height * img.channels, np.float32)
+    img.pixels.foreach_get(pixels)
+    values = pixels[::img.channels]
+    if not img.is_float and img.colorspace_settings.name not in image_writer.DATA_COLORSPACES:
+        values = image_writer.srgb_to_linear(values)
+    return values
+
+
+def find_source(prefix, suffix, material):
+    # Add Textures の命名規則の画像、無ければマテリアル内でラベルが一致するイメージノードの画像
+    img = bpy.data.images.get(f"{prefix}{suffix}.png")
+    if img is None and material and material.use_nodes:
+        for node in material.node_tree.nodes:
+            if node.type == 'TEX_IMAGE' and node.image and node.label == suffix:
+                return node.image
+    return img
+
+
+def pack_channels(prefix, output_suffix, channels, material=None):
+    """channels の各チャンネルを元画像から集めて 1 枚の画像に書き込み、(出力画像, 使った元画像) を返す"""
+    import numpy as np
+    sources = [find_source(prefix, suffix, material) if suffix else None for suffix, _default, _invert in channels]
+    used = [img for img in sources if img is not None]
+    if not used:
+        raise ValueError(f"No source images for {prefix}")
+    sizes = {tuple(img.size) for img in used}
+    if len(sizes) != 1:
+        raise ValueError(f"Source images for {prefix} have different sizes")
+    width, height = sizes.pop()
+    if not width or not height:
+        raise ValueError(f"Source images for {prefix} have no data")
+
+    # 出力は常に RGBA なので、3 チャンネルのレイアウトではアルファを 1 にする
+    packed = np.ones((width * height, 4), np.float32)
+    for index, ((_suffix, default, invert), img) in enumerate(zip(channels, sources)):
+        values = read_channel(img) if img is not None else np.full(width * height, default, np.float32)
+        packed[:, index] = 1.0 - values if invert else values
+
+    name = f"{prefix}{output_suffix}.png"
+    output = bpy.data.images.get(name)
+    if output is not None and tuple(output.size) != (width, height):
+        bpy.data.images.remove(output)
+        output = None
+    if output is None:
+        output = bpy.data.images.new(name=name, width=width, height=height, alpha=len(channels) == 4)
+    output.colorspace_settings.name = 'Non-Color'
+    output.pixels.foreach_set(packed.ravel())
+    output.update()
+
+    # 元画像と同じフォルダーに保存できるようにファイルパスを設定する
+    saved = next((img for img in used if img.filepath), None)
+    if saved is not None and not output.filepath:
+        output.filepath_raw = os.path.join(os.path.dirname(saved.filepath_raw), name)
+        output.file_format = 'PNG'
+    return output, used
+
+
+def release_sources(images, action):
+    # 戻り値は解放・削除できなかった画像の名前
+    skipped = []
+    for img in images:
+        if action == 'REMOVE':
+            bpy.data.images.remove(img)
+        elif action == 'FREE':
+            # ファイルに保存されていない変更は失われるので解放しない
+            if img.filepath and not img.is_dirty:
+                img.buffers_free()
+            else:
+                skipped.append(img.name)
+    return skipped
+
+
+class SimpleBakePackChannelsOperator(bpy.types.Operator):
+    bl_idname = "object.simple_bake_pack_channels"
+    bl_label = "Pack Channels"
+    bl_description = "Pack baked greyscale textures into the channels of one texture"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    name: bpy.props.StringProperty(name="Name")
+    pack_layout: bpy.props.EnumProperty(name="Layout", items=PACK_LAYOUT_ITEMS, default='ORM')
+    red: bpy.props.StringProperty(name="R", default="AO")
+    green: bpy.props.StringProperty(name="G", default="Roughness")
+    blue: bpy.props.StringProperty(name="B", default="Metallic")
+    alpha: bpy.props.StringProperty(name="A", default="")
+    custom_name: bpy.props.StringProperty(name="Output", default="Packed")
+    source_action: bpy.props.EnumProperty(name="Sources", items=SOURCE_ACTION_ITEMS, default='KEEP')
+
+    @classmethod
+    def poll(cls, context):
+        for obj in context.selected_objects:
+            if obj.type == 'MESH' and obj.material_slots:
+                return True
+        return False
+
+    def get_layout(self):
+        if self.pack_layout != 'CUSTOM':
+            return PACK_LAYOUTS[self.pack_layout]
+        channels = [(self.red, 0.0, False), (self.green, 0.0, False), (self.blue, 0.0, False)]
+        if self.alpha:
+            channels.append((self.alpha, 1.0, False))
+        return self.custom_name, channels
+
+    def execute(self, context):
+        output_suffix, channels = self.get_layout()
+
+        materials = {}
+        for obj in context.selected_objects:
+            if obj.type == 'MESH':
+                for mat_slot in obj.material_slots:
+                    if mat_slot.material:
+                        materials[mat_slot.material.name] = mat_slot.material
+
+        # 名前が指定された場合は 1 組だけまとめる
+        prefixes = [(self.name, None)] if self.name else [(name, mat) for name, mat in materials.items()]
+        packed = []
+        sources = {}
+        for prefix, material in prefixes:
+            try:
+                output, used = pack_channels(prefix, output_suffix, channels, material)
+            except ValueError as e:
+                self.report({'WARNING'}, str(e))
+                continue
+            packed.append(output.name)
+            sources.update((img.name, img) for img in used)
+
+        if not packed:
+            self.report({'ERROR'}, "No textures were packed")
+            return {'CANCELLED'}
+
+        skipped = release_sources(list(sources.values()), self.source_action)
+        if skipped:
+            self.report({'WARNING'}, f"Kept unsaved sources: {', '.join(skipped)}")
+        self.report({'INFO'}, f"Packed {', '.join(packed)}")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "name", text="Name")
+        layout.prop(self, "pack_layout", text="Layout")
+        if self.pack_layout == 'CUSTOM':
+            layout.prop(self, "custom_name", text="Output")
+            for prop in ("red", "green", "blue", "alpha"):
+                layout.prop(self, prop)
+        layout.prop(self, "source_action", text="Sources")
+
+
+def register():
+    bpy.utils.register_class(SimpleBakePackChannelsOperator)
+
+
+def unregister():
+    bpy.utils.unregister_class(SimpleBakePackChannelsOperator)
@@ -0,0 +1,250 @@
+import re
+
+# Blender に依存しないベイクの計画
+# オブジェクト・マテリアル・画像を単純なデータで受け取り、何をどの画像にベイクするかを決める
+# bpy を読み込まないので、Blender の外 (スタブの bpy) でもテストやベンチマークができる
+
+BAKE_TYPE_ITEMS = [
+    ('EMIT', "Emit", ""),
+    ('NORMAL', "Normal", ""),
+    ('SHADOW', "Shadow", ""),
+    ('AO', "AO", "")
+]
+
+# Cycles のベイクのマージン (エッジパディングを使わない場合)
+BAKE_MARGIN = 16
+
+# マルチパスベイクで各ベイクタイプのターゲットを探すノードラベルの既定値
+PASS_TARGET_DEFAULTS = {
+    'EMIT': "Base",
+    'NORMAL': "Normal",
+    'SHADOW': "Shadow",
+    'AO': "AO",
+}
+
+SAVE_FORMAT_ITEMS = [
+    ('PNG', "PNG 8-bit", "8-bit PNG"),
+    ('PNG16', "PNG 16-bit", "16-bit PNG"),
+    ('EXR', "EXR Half", "Uncompressed half-float OpenEXR"),
+]
+
+PADDING_MODE_ITEMS = [
+    ('AUTO', "Auto", "Scale the padding with the image size (1/128 of the size)"),
+    ('PIXELS', "Pixels", "Pad a fixed number of pixels"),
+    ('FULL', "Full", "Fill every empty texel"),
+]
+
+MIP_FILTER_ITEMS = [
+    ('BOX', "Box", "Average each 2×2 block (fast)"),
+    ('KAISER', "Kaiser", "Kaiser-windowed sinc filter (sharper, less aliasing)"),
+]
+
+
+class NodeInfo:
+    def __init__(self, name, node_type, label="", image_name=None):
+        self.name = name
+        self.type = node_type
+        self.label = label
+        self.image_name = image_name
+
+
+class MaterialInfo:
+    # nodes はイメージノードだけで良い。active はアクティブノード (種類を問わない)
+    def __init__(self, name, nodes, active=None):
+        self.name = name
+        self.nodes = nodes
+        self.active = active
+
+
+class ImageInfo:
+    # width / height はデータがある画像と生成画像だけ分かる (それ以外は None)
+    def __init__(self, name, width=None, height=None, is_float=False, alpha=True):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.is_float = is_float
+        self.alpha = alpha
+
+
+class BakeTarget:
+    def __init__(self, image_name, width, height, alpha, float_buffer):
+        self.image_name = image_name
+        self.width = width
+        self.height = height
+        self.alpha = alpha
+        self.float_buffer = float_buffer
+
+
+class BakePass:
+    def __init__(self, bake_type, target_label):
+        self.bake_type = bake_type
+        self.target_label = target_label
+        self.nodes = []  # (マテリアル名, ノード名, 画像名)
+        self.image_names = []
+
+    def without_images(self, image_names):
+        # image_names の画像を除いたパスのコピー (分割ベイクした画像を後処理から外す場合など)
+        bake_pass = BakePass(self.bake_type, self.target_label)
+        bake_pass.nodes = [node for node in self.nodes if node[2] not in image_names]
+        bake_pass.image_names = [name for name in self.image_names if name not in image_names]
+        return bake_pass
+
+
+class BakePlan:
+    def __init__(self, signature):
+        self.signature = signature
+        self.passes = []
+        self.targets = {}  # 画像名 → BakeTarget
+
+
+def clean_texture_name(texture_name, material_name):
+    # マテリアル名を除去
+    cleaned_name = re.sub(f"^{re.escape(material_name)}", "", texture_name)
+    # 拡張子と以降の文字列を除去
+    cleaned_name = re.sub(r"\..*$", "", cleaned_name)
+    return cleaned_name
+
+
+def select_bake_passes(multi_pass, bake_type, pass_types, labels):
+    """(ベイクタイプ, ターゲットノードのラベル) のリストを返す
+
+    シングルパスの場合はアクティブなイメージノードにベイクするのでラベルは None
+    labels はベイクタイプ → ラベルで、マルチパスの順番は BAKE_TYPE_ITEMS の順にする
+    """
+    if not multi_pass:
+        return [(bake_type, None)]
+    return [
+        (item, labels[item])
+        for item, _name, _description in BAKE_TYPE_ITEMS
+        if item in pass_types
+    ]
+
+
+def plan_signature(object_names, materials, bake_passes, uv_channel, default_size):
+    # マテリアルの割り当て・アクティブノード・イメージノード (名前, ラベル, 画像) が同じなら同じプランを使える
+    # イメージノードを含めないと、ラベルを付けたノードを追加・変更してもプランが作り直されない
+    material_nodes = tuple(
+        (
+            mat.name,
+            mat.active.name if mat.active else None,
+            tuple((node.name, node.label, node.image_name) for node in mat.nodes if node.type == 'TEX_IMAGE'),
+        )
+        for mat in materials
+    )
+    return (tuple(object_names), material_nodes, tuple(bake_passes), uv_channel, default_size)
+
+
+def find_target_node(material, target_label):
+    # ラベルが無い場合はアクティブノード、ある場合はラベルが一致するイメージノード
+    if target_label is None:
+        node = material.active
+        return node if node and node.type == 'TEX_IMAGE' else None
+    for node in material.nodes:
+        if node.type == 'TEX_IMAGE' and node.label == target_label:
+            return node
+    return None
+
+
+def texel_density_size(world_area, uv_area, density, min_size, max_size):
+    # density (1 メートルあたりのピクセル数) になる辺の長さを 2 のべき乗に切り上げ、min_size から max_size に収める
+    if world_area <= 0.0 or uv_area <= 0.0:
+        return max_size
+    size = (world_area / uv_area) ** 0.5 * density
+    power = min_size
+    while power < size and power < max_size:
+        power *= 2
+    return min(power, max_size)
+
+
+def image_bytes(width, height, channels=4, is_float=False):
+    # 画像のピクセルバッファの大きさ (バイト画像は 1 チャンネル 1 バイト、float 画像は 4 バイト)
+    return width * height * channels * (4 if is_float else 1)
+
+
+def plan_bytes(targets):
+    return sum(image_bytes(target.width, target.height, 4, target.float_buffer) for target in targets)
+
+
+def split_by_budget(object_images, sizes, budget):
+    """オブジェクトのバッチ (オブジェクト名のリスト) のリストを返す
+
+    object_images は [(オブジェクト名, 画像名の集合), ...]、sizes は画像名 → バイト数
+    同じ画像にベイクするオブジェクトは同じバッチに入れる (別のバッチでベイクすると前の結果が消える)
+    バッチの画像の合計が budget 以下になるように順に詰め、1 つで budget を超えるまとまりはそれだけでバッチにする
+    """
+    # 画像を共有するオブジェクトをまとめる (順番は最初のオブジェクトの順)
+    groups = []  # [オブジェクト名のリスト, 画像名の集合]
+    for name, images in object_images:
+        merged = [[name], set(images)]
+        rest = []
+        for group in groups:
+            if group[1] & merged[1]:
+                merged = [group[0] + merged[0], group[1] | merged[1]]
+            else:
+                rest.append(group)
+        rest.append(merged)
+        groups = rest
+    order = {name: index for index, (name, _images) in enumerate(object_images)}
+    groups.sort(key=lambda group: min(order[name] for name in group[0]))
+
+    batches = []
+    batch_names, batch_bytes = [], 0
+    for names, images in groups:
+        group_bytes = sum(sizes.get(image_name, 0) for image_name in images)
+        if batch_names and batch_bytes + group_bytes > budget:
+            batches.append(batch_names)
+            batch_names, batch_bytes = [], 0
+        batch_names = batch_names + sorted(names, key=order.get)
+        batch_bytes += group_bytes
+    if batch_names:
+        batches.append(batch_names)
+    return batches
+
+
+def make_target(image, default_size):
+    # 画像自身のサイズ・アルファ・フロート設定を使い、サイズが分からない場合だけ既定値を使う
+    width = image.width if image.width else default_size
+    height = image.height if image.height else default_size
+    return BakeTarget(image.name, width, height, alpha=image.alpha, float_buffer=image.is_float)
+
+
+def build_plan(signature, materials, images, bake_passes, default_size):
+    """materials (MaterialInfo のリスト) と images (画像名 → ImageInfo) から BakePlan を作る"""
+    plan = BakePlan(signature)
+    for bake_type, target_label in bake_passes:
+        bake_pass = BakePass(bake_type, target_label)
+        for mat in materials:
+            node = find_target_node(mat, target_label)
+            if node is None or node.image_name is None:
+                continue
+            bake_pass.nodes.append((mat.name, node.name, node.image_name))
+            if node.image_name not in plan.targets:
+                plan.targets[node.image_name] = make_target(images[node.image_name], default_size)
+            if node.image_name not in bake_pass.image_names:
+                bake_pass.image_names.append(node.image_name)
+        plan.passes.append(bake_pass)
+    return plan
+
+
+class SettingsSnapshot:
+    """owner の属性 (ドット区切りのパス) の値を保存し、restore で書き戻す"""
+
+    def __init__(self, owner, paths):
+        self.owner = owner
+        self.values = {path: self._get(path) for path in paths}
+
+    def _resolve(self, path):
+        *parents, name = path.split(".")
+        target = self.owner
+        for parent in parents:
+            target = getattr(target, parent)
+        return target, name
+
+    def _get(self, path):
+        target, name = self._resolve(path)
+        return getattr(target, name)
+
+    def restore(self, paths=None):
+        for path in paths if paths is not None else self.values:
+            target, name = self._resolve(path)
+            setattr(target, name, self.values[path])
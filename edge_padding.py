@@ -0,0 +1,160 @@
+import bpy
+import numpy as np
+
+# ベイク後のエッジパディング (ダイレーション)
+# UV レイアウトからカバーされているテクセルのマスクを作り、空いているテクセルを
+# 解像度を下げながら近くのカバー済みテクセルの色で埋める
+# Cycles のマージン処理の代わりに使うので、パディング中は bake.margin を 0 にする
+
+# 1 回に処理するラスタライズ候補のピクセル数
+_RASTER_CHUNK = 1 << 22
+
+
+def padding_pixels(mode, size, pixels):
+    if mode == 'AUTO':
+        return max(2, size // 128)
+    if mode == 'PIXELS':
+        return pixels
+    return None  # FULL
+
+
+def collect_uv_triangles(objects, material_names, uv_channel):
+    # material_names のマテリアルが割り当てられた三角形の UV を (三角形数, 3, 2) で返す
+    triangles = []
+    for obj in objects:
+        mesh = obj.data
+        if not mesh.uv_layers:
+            continue
+        slot_indices = [i for i, slot in enumerate(obj.material_slots)
+                        if slot.material and slot.material.name in material_names]
+        if not slot_indices:
+            continue
+        mesh.calc_loop_triangles()
+        count = len(mesh.loop_triangles)
+        loops = np.empty(count * 3, np.int32)
+        mesh.loop_triangles.foreach_get("loops", loops)
+        materials = np.empty(count, np.int32)
+        mesh.loop_triangles.foreach_get("material_index", materials)
+
+        layer = mesh.uv_layers[uv_channel] if 0 <= uv_channel < len(mesh.uv_layers) else mesh.uv_layers.active
+        uvs = np.empty(len(mesh.loops) * 2, np.float32)
+        layer.data.foreach_get("uv", uvs)
+        uvs = uvs.reshape(-1, 2)
+
+        keep = np.isin(materials, slot_indices)
+        triangles.append(uvs[loops.reshape(-1, 3)[keep]])
+    if not triangles:
+        return np.empty((0, 3, 2), np.float32)
+    return np.concatenate(triangles)
+
+
+def rasterize_mask(triangles, width, height):
+    """三角形に中心が含まれるテクセルを True にしたマスクを返す (三角形ごとの外接矩形をまとめて判定する)"""
+    mask = np.zeros((height, width), bool)
+    if not len(triangles):
+        return mask
+    points = triangles.astype(np.float32) * np.array((width, height), np.float32)
+    xmin = np.clip(np.floor(points[:, :, 0].min(axis=1) - 0.5), 0, width - 1).astype(np.int64)
+    xmax = np.clip(np.ceil(points[:, :, 0].max(axis=1) - 0.5), 0, width - 1).astype(np.int64)
+    ymin = np.clip(np.floor(points[:, :, 1].min(axis=1) - 0.5), 0, height - 1).astype(np.int64)
+    ymax = np.clip(np.ceil(points[:, :, 1].max(axis=1) - 0.5), 0, height - 1).astype(np.int64)
+    box_width = xmax - xmin + 1
+    counts = box_width * (ymax - ymin + 1)
+
+    start = 0
+    while start < len(points):
+        # 候補ピクセルの合計がチャンクに収まるだけの三角形をまとめて処理する
+        cumulative = np.cumsum(counts[start:])
+        end = start + max(1, int(np.searchsorted(cumulative, _RASTER_CHUNK)))
+        index = np.repeat(np.arange(start, end), counts[start:end])
+        first = np.repeat(np.cumsum(counts[start:end]) - counts[start:end], counts[start:end])
+        local = np.arange(len(index)) - first
+        px = xmin[index] + local % box_width[index]
+        py = ymin[index] + local // box_width[index]
+
+        cx = px.astype(np.float32) + 0.5
+        cy = py.astype(np.float32) + 0.5
+        a, b, c = points[index, 0], points[index, 1], points[index, 2]
+        e0 = (b[:, 0] - a[:, 0]) * (cy - a[:, 1]) - (b[:, 1] - a[:, 1]) * (cx - a[:, 0])
+        e1 = (c[:, 0] - b[:, 0]) * (cy - b[:, 1]) - (c[:, 1] - b[:, 1]) * (cx - b[:, 0])
+        e2 = (a[:, 0] - c[:, 0]) * (cy - c[:, 1]) - (a[:, 1] - c[:, 1]) * (cx - c[:, 0])
+        inside = ((e0 >= 0) & (e1 >= 0) & (e2 >= 0)) | ((e0 <= 0) & (e1 <= 0) & (e2 <= 0))
+        mask[py[inside], px[inside]] = True
+        start = end
+    return mask
+
+
+def _box_any(mask, radius, axis):
+    # 各テクセルの前後 radius テクセルの窓に True があるか (累積和で窓の合計を求める)
+    size = mask.shape[axis]
+    total = np.cumsum(mask, axis=axis, dtype=np.int32)
+    upper = np.take(total, np.minimum(np.arange(size) + radius, size - 1), axis=axis)
+    lower_index = np.arange(size) - radius - 1
+    lower = np.take(total, np.maximum(lower_index, 0), axis=axis)
+    shape = [1, 1]
+    shape[axis] = size
+    lower = np.where((lower_index >= 0).reshape(shape), lower, 0)
+    return upper > lower
+
+
+def dilate(mask, radius):
+    return _box_any(_box_any(mask, radius, 0), radius, 1)
+
+
+def pull_push(color, weight):
+    """カバーされていないテクセルを、解像度を半分にした画像から再帰的に埋める (push-pull 法)
+
+    各レベルでは 2×2 のカバー済みテクセルの平均だけを使うので、島の色が近い順に外側へ広がる
+    処理量は画像のテクセル数にほぼ比例する
+    """
+    height, width = weight.shape
+    if height <= 1 and width <= 1:
+        return color
+    even_height, even_width = height + height % 2, width + width % 2
+    channels = color.shape[2]
+
+    weighted = np.zeros((even_height, even_width, channels), np.float32)
+    weighted[:height, :width] = color * weight[:, :, None]
+    weights = np.zeros((even_height, even_width), np.float32)
+    weights[:height, :width] = weight
+
+    color_sum = weighted.reshape(even_height // 2, 2, even_width // 2, 2, channels).sum(axis=(1, 3))
+    weight_sum = weights.reshape(even_height // 2, 2, even_width // 2, 2).sum(axis=(1, 3))
+    coarse = np.divide(color_sum, weight_sum[:, :, None], out=np.zeros_like(color_sum),
+                       where=weight_sum[:, :, None] > 0)
+    coarse = pull_push(coarse, np.minimum(weight_sum, 1.0))
+
+    upsampled = coarse.repeat(2, axis=0).repeat(2, axis=1)[:height, :width]
+    return np.where(weight[:, :, None] > 0, color, upsampled)
+
+
+def pad_image(img, mask, pixels=None):
+    # pixels が None の場合は空いているテクセルを全て埋める
+    if not mask.any() or mask.all():
+        return
+    width, height = img.size
+    channels = img.channels
+    buffer = np.empty(width * height * channels, np.float32)
+    img.pixels.foreach_get(buffer)
+    buffer = buffer.reshape(height, width, channels)
+
+    filled = pull_push(buffer, mask.astype(np.float32))
+    if pixels is not None:
+        # 指定したテクセル数までだけ広げる
+        filled = np.where(dilate(mask, pixels)[:, :, None], filled, buffer)
+    img.pixels.foreach_set(filled.ravel())
+    img.update()
+
+
+def pad_pass(bake_pass, objects, uv_channel, mode, pixels):
+    # パスのターゲット画像ごとに、その画像を使うマテリアルの UV からマスクを作ってパディングする
+    for image_name in bake_pass.image_names:
+        img = bpy.data.images.get(image_name)
+        # UDIM はピクセルを 1 タイル分しか読み書きできないので対象外
+        if img is None or img.source == 'TILED' or not img.has_data:
+            continue
+        width, height = img.size
+        material_names = {mat_name for mat_name, _node_name, node_image in bake_pass.nodes if node_image == image_name}
+        triangles = collect_uv_triangles(objects, material_names, uv_channel)
+        mask = rasterize_mask(triangles, width, height)
+        pad_image(img, mask, padding_pixels(mode, max(width, height), pixels))
@@ -0,0 +1,133 @@
+import math
+
+import numpy as np
+from mathutils import Vector
+from mathutils.bvhtree import BVHTree
+
+from . import node_cache
+
+# セレクテッド→アクティブ (ハイポリ → ローポリ) ベイクのレイの距離を求める
+# ハイポリの BVH を作り、ローポリの各サンプル点から法線の外側と内側にレイを飛ばして
+# ハイポリの面までの距離を測る。外側の最大距離を押し出し量 (cage_extrusion) に、
+# 内側にしか面が無い点まで届く距離を最大レイ距離 (max_ray_distance) にする
+
+DISTANCE_MARGIN = 1.05  # 測った距離を少しだけ広げる
+NEAREST_FACTOR = 4.0  # 最も近い面までの距離の何倍までをレイで探すか (凹んだ部分で遠くの面に当たらないように)
+MAX_SAMPLES = 20000
+
+# (ソースオブジェクトの名前、メッシュ、行列、形が変わった回数) → BVHTree
+_bvh_cache = {}
+_BVH_CACHE_SIZE = 4
+
+
+def world_mesh(obj, depsgraph):
+    """モディファイアー適用後のメッシュを、ワールド座標の (頂点, 頂点法線, 三角形) の配列で返す"""
+    evaluated = obj.evaluated_get(depsgraph)
+    mesh = evaluated.to_mesh()
+    try:
+        mesh.calc_loop_triangles()
+        co = np.empty(len(mesh.vertices) * 3, np.float32)
+        mesh.vertices.foreach_get("co", co)
+        normals = np.empty(len(mesh.vertices) * 3, np.float32)
+        mesh.vertices.foreach_get("normal", normals)
+        triangles = np.empty(len(mesh.loop_triangles) * 3, np.int32)
+        mesh.loop_triangles.foreach_get("vertices", triangles)
+    finally:
+        evaluated.to_mesh_clear()
+
+    matrix = np.array(obj.matrix_world, np.float32)
+    co = co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+    normals = normals.reshape(-1, 3) @ np.linalg.inv(matrix[:3, :3])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    return co, normals, triangles.reshape(-1, 3)
+
+
+def source_key(obj):
+    # メッシュを評価せずに作れるキー (形の変更は depsgraph の更新の回数で調べる)
+    return (
+        obj.name,
+        obj.data.session_uid,
+        tuple(tuple(row) for row in obj.matrix_world),
+        node_cache.geometry_version(obj),
+    )
+
+
+def source_bvh(sources, depsgraph):
+    # ソースが前回から変わっていなければ、メッシュを評価せずに前回作った BVH を使う
+    key = tuple(source_key(obj) for obj in sources)
+    bvh = _bvh_cache.get(key)
+    if bvh is not None:
+        return bvh
+
+    parts = [world_mesh(obj, depsgraph) for obj in sources]
+    vertices = []
+    triangles = []
+    for co, _normals, tris in parts:
+        triangles.append(tris + len(vertices))
+        vertices.extend(co.tolist())
+    triangles = np.concatenate(triangles) if triangles else np.empty((0, 3), np.int32)
+    bvh = BVHTree.FromPolygons(vertices, triangles.tolist(), all_triangles=True)
+
+    if len(_bvh_cache) >= _BVH_CACHE_SIZE:
+        _bvh_cache.pop(next(iter(_bvh_cache)))
+    _bvh_cache[key] = bvh
+    return bvh
+
+
+def sample_points(obj, depsgraph):
+    # 頂点と三角形の中心をサンプル点にする (多い場合は間引く)
+    co, normals, triangles = world_mesh(obj, depsgraph)
+    centers = co[triangles].mean(axis=1)
+    face_normals = np.cross(co[triangles[:, 1]] - co[triangles[:, 0]], co[triangles[:, 2]] - co[triangles[:, 0]])
+    lengths = np.linalg.norm(face_normals, axis=1, keepdims=True)
+    face_normals = np.divide(face_normals, lengths, out=np.zeros_like(face_normals), where=lengths > 0)
+
+    points = np.concatenate([co, centers])
+    directions = np.concatenate([normals, face_normals])
+    step = max(1, math.ceil(len(points) / MAX_SAMPLES))
+    return points[::step], directions[::step]
+
+
+def measure(bvh, points, directions, epsilon):
+    """(外側の面までの最大距離, 内側にしか面が無い点での最大距離) を返す"""
+    outward = 0.0
+    inward = 0.0
+    for point, direction in zip(points.tolist(), directions.tolist()):
+        point = Vector(point)
+        direction = Vector(direction)
+        if direction.length == 0.0:
+            continue
+        _location, _normal, _index, nearest = bvh.find_nearest(point)
+        if nearest is None:
+            continue
+        search = nearest * NEAREST_FACTOR + epsilon
+        hit, _normal, _index, distance = bvh.ray_cast(point, direction, search)
+        if hit is not None:
+            outward = max(outward, distance)
+            continue
+        hit, _normal, _index, distance = bvh.ray_cast(point, -direction, search)
+        if hit is not None:
+            inward = max(inward, distance)
+    return outward, inward
+
+
+def ray_distances(targets, sources, depsgraph):
+    """全てのターゲット (ローポリ) でソースを覆う (cage_extrusion, max_ray_distance) を返す"""
+    bvh = source_bvh(sources, depsgraph)
+    extrusion = 0.0
+    inward = 0.0
+    for obj in targets:
+        points, directions = sample_points(obj, depsgraph)
+        if not len(points):
+            continue
+        epsilon = float(np.linalg.norm(points.max(axis=0) - points.min(axis=0))) * 1e-4
+        outward_distance, inward_distance = measure(bvh, points, directions, epsilon)
+        extrusion = max(extrusion, outward_distance * DISTANCE_MARGIN + epsilon)
+        inward = max(inward, inward_distance * DISTANCE_MARGIN + epsilon)
+    # レイは押し出した位置から内側へ飛ぶので、ローポリの面を越えて内側の面まで届く長さにする
+    return extrusion, extrusion + inward
+
+
+def clear_cache():
+    _bvh_cache.clear()
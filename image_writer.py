@@ -0,0 +1,283 @@
+import contextlib
+import io
+import os
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import bpy
+import numpy as np
+
+# ベイク結果の画像をメインスレッドの外でエンコードして保存する
+# ピクセルは foreach_get でコピーしてからスレッドプールに渡すので、
+# 保存中も Blender の操作を続けられる (zlib と NumPy は GIL を解放する)
+
+# データとして扱うカラースペース (sRGB の変換を行わない)
+DATA_COLORSPACES = {"Non-Color", "Raw", "Linear", "Linear Rec.709", "Linear CIE-XYZ E"}
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+_EXR_CHANNEL_NAMES = {1: ["Y"], 2: ["Y", "A"], 3: ["R", "G", "B"], 4: ["R", "G", "B", "A"]}
+
+
+def linear_to_srgb(values):
+    return np.where(values <= 0.0031308, values * 12.92, 1.055 * np.power(np.maximum(values, 0.0031308), 1.0 / 2.4) - 0.055)
+
+
+def srgb_to_linear(values):
+    return np.where(values <= 0.04045, values / 12.92, np.power((np.maximum(values, 0.04045) + 0.055) / 1.055, 2.4))
+
+
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+class PNGStream:
+    # 上の行から順に書き込む PNG (行をまとめて受け取り、IDAT を少しずつ出力する)
+
+    def __init__(self, f, width, height, channels, bit_depth=8, compression=6):
+        self.f = f
+        self.width = width
+        self.channels = channels
+        self.bit_depth = bit_depth
+        self.compressor = zlib.compressobj(compression)
+        self.previous = np.zeros(width * channels * bit_depth // 8, np.uint8)
+        header = struct.pack(">IIBBBBB", width, height, bit_depth, _PNG_COLOR_TYPES[channels], 0, 0, 0)
+        f.write(_PNG_SIGNATURE + _png_chunk(b"IHDR", header))
+
+    def write_rows(self, data):
+        # data は上の行から並んだ (行数, 幅, チャンネル) の float 配列
+        data = np.clip(data, 0.0, 1.0)
+        count = data.shape[0]
+        if self.bit_depth == 16:
+            rows = np.round(data * 65535.0).astype(">u2").reshape(count, -1).view(np.uint8)
+        else:
+            rows = np.round(data * 255.0).astype(np.uint8).reshape(count, -1)
+
+        # 全ての行に Up フィルターを掛ける (ベイク結果は縦方向に滑らかなので圧縮が効く)
+        raw = np.empty((count, rows.shape[1] + 1), np.uint8)
+        raw[:, 0] = 2
+        raw[0, 1:] = rows[0] - self.previous
+        raw[1:, 1:] = rows[1:] - rows[:-1]
+        self.previous = rows[-1].copy()
+
+        compressed = self.compressor.compress(raw.tobytes())
+        if compressed:
+            self.f.write(_png_chunk(b"IDAT", compressed))
+
+    def finish(self):
+        self.f.write(_png_chunk(b"IDAT", self.compressor.flush()) + _png_chunk(b"IEND", b""))
+
+
+def _exr_attribute(name, type_name, value):
+    return name.encode() + b"\0" + type_name.encode() + b"\0" + struct.pack("<i", len(value)) + value
+
+
+class EXRStream:
+    # 非圧縮・1スキャンライン単位の half-float OpenEXR
+    # オフセットテーブルは最後に書き戻すので、書き込み先はシーク可能である必要がある
+
+    def __init__(self, f, width, height, channels):
+        self.f = f
+        self.height = height
+        self.next_y = 0
+        names = _EXR_CHANNEL_NAMES[channels]
+        self.order = sorted(range(channels), key=lambda i: names[i])  # チャンネルはアルファベット順に並べる
+
+        chlist = b"".join(names[i].encode() + b"\0" + struct.pack("<iB3xii", 1, 0, 1, 1) for i in self.order) + b"\0"
+        box = struct.pack("<iiii", 0, 0, width - 1, height - 1)
+        header = b"".join([
+            struct.pack("<ii", 20000630, 2),
+            _exr_attribute("channels", "chlist", chlist),
+            _exr_attribute("compression", "compression", b"\0"),
+            _exr_attribute("dataWindow", "box2i", box),
+            _exr_attribute("displayWindow", "box2i", box),
+            _exr_attribute("lineOrder", "lineOrder", b"\0"),
+            _exr_attribute("pixelAspectRatio", "float", struct.pack("<f", 1.0)),
+            _exr_attribute("screenWindowCenter", "v2f", struct.pack("<ff", 0.0, 0.0)),
+            _exr_attribute("screenWindowWidth", "float", struct.pack("<f", 1.0)),
+            b"\0",
+        ])
+        f.write(header)
+        self.table_position = f.tell()
+        f.write(bytes(height * 8))
+        self.offsets = []
+
+    def write_rows(self, data):
+        # (行, チャンネル, 列) の順に並べ替え、各行の先頭に y とデータサイズを付ける
+        count = data.shape[0]
+        lines = np.ascontiguousarray(data[:, :, self.order].transpose(0, 2, 1)).astype("<f2").reshape(count, -1).view(np.uint8)
+        line_size = lines.shape[1]
+        line_headers = np.empty((count, 2), "<i4")
+        line_headers[:, 0] = np.arange(self.next_y, self.next_y + count)
+        line_headers[:, 1] = line_size
+        start = self.f.tell()
+        self.offsets.extend(start + i * (line_size + 8) for i in range(count))
+        self.f.write(np.concatenate([line_headers.view(np.uint8), lines], axis=1).tobytes())
+        self.next_y += count
+
+    def finish(self):
+        end = self.f.tell()
+        self.f.seek(self.table_position)
+        self.f.write(np.array(self.offsets, "<u8").tobytes())
+        self.f.seek(end)
+
+
+def encode_png(pixels, width, height, channels, bit_depth=8, compression=6):
+    # pixels は Blender の並び (下の行から) の float 配列
+    f = io.BytesIO()
+    stream = PNGStream(f, width, height, channels, bit_depth, compression)
+    stream.write_rows(pixels.reshape(height, width, channels)[::-1])
+    stream.finish()
+    return f.getvalue()
+
+
+def encode_exr(pixels, width, height, channels):
+    f = io.BytesIO()
+    stream = EXRStream(f, width, height, channels)
+    stream.write_rows(pixels.reshape(height, width, channels)[::-1])
+    stream.finish()
+    return f.getvalue()
+
+
+@contextlib.contextmanager
+def open_atomic(path):
+    # 一時ファイルに書き込んでから置き換えるので、途中で失敗しても元のファイルは壊れない
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".simple_bake_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_atomic(path, data):
+    with open_atomic(path) as f:
+        f.write(data)
+
+
+def output_path(filepath, save_format):
+    if save_format == 'EXR':
+        return os.path.splitext(filepath)[0] + ".exr"
+    return os.path.splitext(filepath)[0] + ".png"
+
+
+def encode_image(pixels, width, height, channels, save_format, compression, colorspace, is_float):
+    # ファイル形式に合わせてカラースペースを変換する
+    is_data = colorspace in DATA_COLORSPACES
+    if save_format == 'EXR':
+        if not is_float and not is_data:
+            pixels = srgb_to_linear(pixels)
+        return encode_exr(pixels, width, height, channels)
+    if is_float and not is_data:
+        pixels = linear_to_srgb(pixels)
+    bit_depth = 16 if save_format == 'PNG16' else 8
+    return encode_png(pixels, width, height, channels, bit_depth, compression)
+
+
+def read_pixels(img):
+    width, height = img.size
+    pixels = np.empty(width * height * img.channels, np.float32)
+    img.pixels.foreach_get(pixels)
+    return pixels
+
+
+def _save_job(path, pixels, width, height, channels, save_format, compression, colorspace, is_float):
+    data = encode_image(pixels, width, height, channels, save_format, compression, colorspace, is_float)
+    write_atomic(path, data)
+    return path
+
+
+def use_saved_file(img, path, save_format, free_buffers):
+    # 保存したファイル (拡張子が変わった場合も) を画像のソースにして、未保存の状態を解除する
+    # free_buffers の場合はピクセルバッファを解放し、次に画像が使われたときにファイルから読み直す
+    # (何枚ベイクしてもメモリが増え続けない)
+    if img is None or img.source not in {'GENERATED', 'FILE'}:
+        return
+    if os.path.normcase(bpy.path.abspath(img.filepath_raw, library=img.library)) != os.path.normcase(path):
+        img.filepath_raw = bpy.path.relpath(path) if bpy.data.filepath else path
+    img.file_format = 'OPEN_EXR' if save_format == 'EXR' else 'PNG'
+    img.source = 'FILE'
+    if free_buffers:
+        img.buffers_free()
+    else:
+        img.reload()
+
+
+class ImageSaveQueue:
+    # スレッドプールで画像を保存し、タイマーで完了を確認する
+
+    def __init__(self):
+        self.executor = None
+        self.futures = {}  # future → (画像名, 画像自身の保存ならその形式, 保存後にピクセルバッファを解放するか)
+        self.last_message = ""
+        self.errors = []
+
+    @property
+    def pending(self):
+        return len(self.futures)
+
+    def submit(self, img, save_format, compression, free_after_save=False, pixels=None):
+        # pixels を渡した場合はそれを保存する (縮小版と同じコピーを使う)
+        width, height = img.size
+        channels = img.channels
+        if pixels is None:
+            pixels = read_pixels(img)
+
+        path = output_path(bpy.path.abspath(img.filepath_raw, library=img.library), save_format)
+        self.submit_job(
+            img.name, _save_job, path, pixels, width, height, channels, save_format,
+            max(0, min(9, compression)), img.colorspace_settings.name, img.is_float,
+            save_format=save_format, free_after_save=free_after_save,
+        )
+        return path
+
+    def submit_job(self, image_name, job, *args, save_format=None, free_after_save=False):
+        # job は保存したファイルのパスを返す関数 (スレッドで実行する)
+        # save_format は画像自身を保存する場合だけ渡す (保存後に画像のソースをそのファイルにする)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) // 2),
+                                               thread_name_prefix="simple_bake_save")
+        future = self.executor.submit(job, *args)
+        self.futures[future] = (image_name, save_format, free_after_save)
+        if not bpy.app.timers.is_registered(self.check):
+            bpy.app.timers.register(self.check, first_interval=0.1)
+
+    def check(self):
+        for future in [f for f in self.futures if f.done()]:
+            image_name, save_format, free_after_save = self.futures.pop(future)
+            try:
+                path = future.result()
+                self.last_message = f"Saved {image_name} to {os.path.basename(path)}"
+            except Exception as e:
+                self.last_message = f"Could not save image {image_name}: {e}"
+                self.errors.append(self.last_message)
+                print(f"Simple Bake: {self.last_message}")
+                continue
+            if save_format is not None:
+                use_saved_file(bpy.data.images.get(image_name), path, save_format, free_after_save)
+        if self.futures:
+            return 0.1
+        return None
+
+    def wait(self):
+        # バックグラウンド実行やアドオンの無効化時に保存が終わるまで待つ
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.check()
+
+
+save_queue = ImageSaveQueue()
+
+
+def unregister():
+    save_queue.wait()
+    if bpy.app.timers.is_registered(save_queue.check):
+        bpy.app.timers.unregister(save_queue.check)
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+
+from . import image_writer
+
+# ベイクした画像から縮小版 (LOD 用のテクスチャ) を作り、元の画像の隣に保存する
+# 各段は 1 つ上の段を半分にして作るので、4K から 512 までを 1 回で作れる
+# 保存キューのスレッドで実行するので、ベイクの後も Blender の操作を続けられる
+
+KAISER_BETA = 4.0
+KAISER_RADIUS = 2.0  # 縮小後のピクセル単位
+
+
+def kaiser_weights():
+    # 半分に縮小する場合の 8 タップ (縮小後のピクセル中心から ±0.25, ±0.75, ... の位置)
+    x = (np.arange(8) - 3.5) / 2.0
+    window = np.i0(KAISER_BETA * np.sqrt(np.maximum(0.0, 1.0 - (x / KAISER_RADIUS) ** 2))) / np.i0(KAISER_BETA)
+    weights = np.sinc(x) * window
+    return (weights / weights.sum()).astype(np.float32)
+
+
+def downsample_axis(data, axis, filter_type):
+    # data の axis 方向を半分 (奇数の場合は切り上げ) にする
+    size = data.shape[axis]
+    out_size = (size + 1) // 2
+    if filter_type == 'KAISER':
+        before, after = 3, 4 + (2 * out_size - size)
+        taps = kaiser_weights()
+    else:
+        before, after = 0, 2 * out_size - size
+        taps = np.array([0.5, 0.5], np.float32)
+    pad = [(0, 0)] * data.ndim
+    pad[axis] = (before, after)
+    padded = np.pad(data, pad, mode='edge')
+
+    result = np.zeros(data.shape[:axis] + (out_size,) + data.shape[axis + 1:], np.float32)
+    for index, weight in enumerate(taps):
+        taken = [slice(None)] * data.ndim
+        taken[axis] = slice(index, index + 2 * out_size, 2)
+        result += weight * padded[tuple(taken)]
+    return result
+
+
+def downsample(data, filter_type='BOX'):
+    """(高さ, 幅, チャンネル) の画像を縦横半分にする"""
+    return downsample_axis(downsample_axis(data, 0, filter_type), 1, filter_type)
+
+
+def level_path(path, size):
+    # "MatBase.png" → "MatBase_2048.png"
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{size}{ext}"
+
+
+def level_sizes(width, min_size):
+    sizes = []
+    size = width
+    while size // 2 >= min_size and size > 1:
+        size //= 2
+        sizes.append(size)
+    return sizes
+
+
+def write_chain(path, pixels, width, height, channels, save_format, compression, colorspace, is_float,
+                is_normal, min_size, filter_type):
+    """path の隣に縮小版を書き、最後に書いたファイルのパスを返す"""
+    data = pixels.reshape(height, width, channels).astype(np.float32)
+    is_data = colorspace in image_writer.DATA_COLORSPACES
+    # バイト画像の sRGB 値はリニアにしてから平均する (そのままだと暗くなる)
+    encoded_srgb = not is_data and not is_float
+    color = slice(0, min(channels, 3))
+    if encoded_srgb:
+        data[..., color] = image_writer.srgb_to_linear(data[..., color])
+    if is_normal:
+        data[..., color] = data[..., color] * 2.0 - 1.0
+
+    written = None
+    for size in level_sizes(width, min_size):
+        data = downsample(data, filter_type)
+        if is_normal:
+            # 平均した法線は短くなるので長さを 1 に戻す
+            length = np.linalg.norm(data[..., color], axis=2, keepdims=True)
+            data[..., color] /= np.maximum(length, 1e-8)
+        elif filter_type == 'KAISER':
+            # リンギングで負になった値を切り捨てる
+            np.maximum(data, 0.0, out=data)
+
+        level = data.copy()
+        if is_normal:
+            level[..., color] = level[..., color] * 0.5 + 0.5
+        if encoded_srgb:
+            level[..., color] = image_writer.linear_to_srgb(level[..., color])
+        level_height, level_width = level.shape[:2]
+        encoded = image_writer.encode_image(level.ravel(), level_width, level_height, channels,
+                                            save_format, compression, colorspace, is_float)
+        written = level_path(path, size)
+        image_writer.write_atomic(written, encoded)
+    return written
+
+
+def submit_chain(img, pixels, path, is_normal, min_size, filter_type, save_format, compression):
+    # pixels は保存用に読み込んだピクセル (もう一度 foreach_get しない)
+    width, height = img.size
+    if width // 2 < min_size:
+        return
+    image_writer.save_queue.submit_job(
+        img.name, write_chain, path, pixels, width, height, img.channels, save_format,
+        max(0, min(9, compression)), img.colorspace_settings.name, img.is_float,
+        is_normal, min_size, filter_type,
+    )
@@ -0,0 +1,146 @@
+import bpy
+from bpy.app.handlers import persistent
+
+# パネルの描画、poll、オペレーターで共有するアクティブなイメージノードの検索結果
+# 描画のたびに (マテリアルスロット × エリア × スペース) を走査しないようにキャッシュする
+# Undo で参照が無効になるのを避けるため、値には名前とポインターだけを保持する
+_cache = {}
+_msgbus_owner = object()
+
+# オブジェクトの形が変わった回数 (オブジェクト名 → 回数)。ハイポリの BVH のキャッシュのキーに使う
+# Undo やファイルの読み込みでは何が変わったか分からないので、_geometry_epoch を進めて全てを変わったことにする
+_geometry_versions = {}
+_geometry_epoch = 0
+
+# これらのプロパティが変更されたらキャッシュを破棄する
+_WATCHED_PROPERTIES = (
+    (bpy.types.Nodes, "active"),
+    (bpy.types.ShaderNodeTexImage, "image"),
+    (bpy.types.MaterialSlot, "material"),
+    (bpy.types.Object, "active_material_index"),
+    (bpy.types.LayerObjects, "active"),
+    (bpy.types.SpaceNodeEditor, "node_tree"),
+)
+
+
+def invalidate(*args):
+    _cache.clear()
+
+
+def geometry_version(obj):
+    # メッシュを評価せずに、前回から obj の形 (モディファイアー適用後) が変わったかを比べるための値
+    return (_geometry_epoch, _geometry_versions.get(obj.name, 0))
+
+
+def _geometry_changed():
+    global _geometry_epoch
+    _geometry_epoch += 1
+    _geometry_versions.clear()
+
+
+def _screen_key(context):
+    screen = context.screen
+    return (screen.as_pointer(), len(screen.areas)) if screen else (0, 0)
+
+
+def get_displayed_active_nodes(context):
+    # Node Editor に表示されているノードツリーのポインター → アクティブノード名
+    key = ("trees",) + _screen_key(context)
+    active_nodes = _cache.get(key)
+    if active_nodes is None:
+        active_nodes = {}
+        if context.screen:
+            for area in context.screen.areas:
+                if area.type == 'NODE_EDITOR':
+                    for space in area.spaces:
+                        if space.type == 'NODE_EDITOR' and space.node_tree:
+                            tree = space.node_tree
+                            active = tree.nodes.active
+                            active_nodes.setdefault(tree.as_pointer(), active.name if active else None)
+        _cache[key] = active_nodes
+    return active_nodes
+
+
+def get_active_image_node(context, node_tree):
+    # バックグラウンド実行 (blender -b) では画面が無いので、ノードツリーのアクティブノードを使う
+    if context.screen is None:
+        return node_tree.nodes.active
+    node_name = get_displayed_active_nodes(context).get(node_tree.as_pointer())
+    return node_tree.nodes.get(node_name) if node_name else None
+
+
+def get_bake_target(context):
+    """アクティブオブジェクトのベイク先を返す
+
+    (ベイク可能かどうか, 画像名, マテリアル名) のタプルで、画像が無い場合は名前が None
+    """
+    obj = context.active_object
+    if not obj or obj.type != 'MESH' or not obj.material_slots:
+        return False, None, None
+
+    key = ("target", obj.name) + _screen_key(context)
+    target = _cache.get(key)
+    if target is None:
+        bake_possible = False
+        for mat_slot in obj.material_slots:
+            if mat_slot.material and mat_slot.material.use_nodes:
+                active_node = get_active_image_node(context, mat_slot.material.node_tree)
+                if active_node and active_node.type == 'TEX_IMAGE':
+                    bake_possible = True
+                    if active_node.image:
+                        target = (True, active_node.image.name, mat_slot.material.name)
+                        break
+        target = target or (bake_possible, None, None)
+        _cache[key] = target
+    return target
+
+
+def subscribe():
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    for key in _WATCHED_PROPERTIES:
+        bpy.msgbus.subscribe_rna(key=key, owner=_msgbus_owner, args=(), notify=invalidate)
+
+
+@persistent
+def _on_depsgraph_update(scene, depsgraph):
+    invalidate()
+    for update in depsgraph.updates:
+        if update.is_updated_geometry and isinstance(update.id, bpy.types.Object):
+            name = update.id.original.name
+            _geometry_versions[name] = _geometry_versions.get(name, 0) + 1
+
+
+@persistent
+def _on_undo(*args):
+    invalidate()
+    _geometry_changed()
+
+
+@persistent
+def _on_load_post(*args):
+    # ファイルを開くと msgbus の購読が消えるので再登録する
+    invalidate()
+    _geometry_changed()
+    subscribe()
+
+
+_HANDLERS = (
+    (bpy.app.handlers.depsgraph_update_post, _on_depsgraph_update),
+    (bpy.app.handlers.undo_post, _on_undo),
+    (bpy.app.handlers.redo_post, _on_undo),
+    (bpy.app.handlers.load_post, _on_load_post),
+)
+
+
+def register():
+    for handlers, handler in _HANDLERS:
+        handlers.append(handler)
+    subscribe()
+
+
+def unregister():
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    for handlers, handler in _HANDLERS:
+        if handler in handlers:
+            handlers.remove(handler)
+    invalidate()
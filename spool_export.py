@@ -0,0 +1,121 @@
+import datetime
+import os
+
+import bpy
+
+from . import bake_targets
+from .bake_settings import BakeSession
+
+# 選択オブジェクトのベイクをスプールディレクトリのワークユニットとして書き出す
+# ワーカー (spool_farm.py) は保存された .blend を開いてベイクするので、ベイク設定はユニットに書き込む
+
+
+def unsupported_options(session):
+    # ワーカーは Cycles のベイクと保存だけを行うので、ベイク後の処理が必要な設定は書き出せない
+    options = [
+        ("Edge Padding", session.use_padding),
+        ("Denoise", any(session.uses_denoise(bake_type) for bake_type, _target_label in session.bake_passes)),
+        ("Adaptive Samples", session.use_adaptive),
+        ("Tiled Bake", session.use_tiled),
+        ("LOD Textures", session.use_mip_chain),
+        ("PNG 16-bit", session.save_format == 'PNG16'),
+    ]
+    return [name for name, enabled in options if enabled]
+
+
+def build_manifest(session):
+    # batch_bake のマニフェストと同じ形式 (マルチパスの場合はノードのラベルでターゲットを指定する)
+    # ワーカーが再現できる設定 (サンプル数、UV、マージン、保存形式) はセッションの値を書き込む
+    bake_types = [bake_type for bake_type, _target_label in session.bake_passes]
+    labels = {bake_type: target_label for bake_type, target_label in session.bake_passes if target_label}
+    return {
+        "jobs": [
+            {"object": obj.name, "bake_types": bake_types, "labels": labels, "targets": {}}
+            for obj in session.objects
+        ],
+        "samples": session.samples,
+        "uv_channel": session.uv_channel,
+        "margin": session.margin,
+        "file_format": 'OPEN_EXR' if session.save_format == 'EXR' else 'PNG',
+        "output_dir": "",
+    }
+
+
+class SimpleBakeSpoolExportOperator(bpy.types.Operator):
+    bl_idname = "object.simple_bake_export_spool"
+    bl_label = "Export to Spool"
+    bl_description = "Write the bake of the selected objects as work units to a spool directory for spool_farm.py workers"
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'OBJECT' and bool(BakeSession.get_valid_objects(context))
+
+    def execute(self, context):
+        from . import batch_bake, spool_farm
+
+        scene = context.scene
+        spool_dir = bpy.path.abspath(scene.simple_bake_spool_dir)
+        if not scene.simple_bake_spool_dir:
+            self.report({'ERROR'}, "Set the spool directory")
+            return {'CANCELLED'}
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the Blend file first (the workers open it from disk)")
+            return {'CANCELLED'}
+        if scene.simple_bake_selected_to_active:
+            self.report({'ERROR'}, "Selected to Active cannot be exported to the spool")
+            return {'CANCELLED'}
+
+        objects = BakeSession.get_valid_objects(context)
+        session = BakeSession(scene, objects, self.report)
+        if not session.bake_passes:
+            self.report({'ERROR'}, "Select at least one bake type")
+            return {'CANCELLED'}
+        unsupported = unsupported_options(session)
+        if unsupported:
+            self.report({'ERROR'}, f"The spool workers cannot apply {', '.join(unsupported)}; turn them off to export")
+            return {'CANCELLED'}
+
+        # 同じ画像にベイクするオブジェクトは同じユニットにまとめる
+        plan = bake_targets.build_plan(objects, session.bake_passes, session.uv_channel, session.default_size)
+        target_images = dict(bake_targets.object_images(plan, objects))
+        units = batch_bake.split_units(build_manifest(session), target_images)
+
+        job_name = "{}-{}".format(
+            os.path.splitext(os.path.basename(bpy.data.filepath))[0],
+            datetime.datetime.now().strftime("%Y%m%d-%H%M%S"),
+        )
+        try:
+            unit_ids = spool_farm.export_units(spool_dir, os.path.abspath(bpy.data.filepath), units, job_name)
+        except OSError as e:
+            self.report({'ERROR'}, f"Could not write to the spool directory: {e}")
+            return {'CANCELLED'}
+
+        if bpy.data.is_dirty:
+            self.report({'WARNING'}, f"Exported {len(unit_ids)} unit(s), but the workers do not see the unsaved changes")
+        else:
+            self.report({'INFO'}, f"Exported {len(unit_ids)} unit(s) to {spool_dir}")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+        layout.prop(scene, "simple_bake_spool_dir", text="Spool")
+        layout.label(text=f"{len(BakeSession.get_valid_objects(context))} object(s), samples {scene.simple_bake_samples}")
+
+
+def register():
+    bpy.utils.register_class(SimpleBakeSpoolExportOperator)
+    bpy.types.Scene.simple_bake_spool_dir = bpy.props.StringProperty(
+        name="Spool Directory",
+        description="Directory on shared storage that spool_farm.py workers take bake units from",
+        default="",
+        subtype='DIR_PATH'
+    )
+
+
+def unregister():
+    bpy.utils.unregister_class(SimpleBakeSpoolExportOperator)
+    del bpy.types.Scene.simple_bake_spool_dir
@@ -0,0 +1,366 @@
+"""Simple Bake のスプールディレクトリ・ベイクファーム
+
+共有ストレージ上のスプールディレクトリにワークユニットを置き、複数のマシン (または 1 台の複数プロセス) の
+ワーカーがファイルロックでユニットを取り合ってベイクします。ファームマネージャーは不要です。
+
+エクスポート:
+    Simple Bake パネルの Export to Spool (ネットワークドライブのアイコン)
+
+ワーカー (1 台で複数起動しても良い):
+    blender -b --python spool_farm.py -- --spool /mnt/bake/spool
+
+状況の確認 (Blender 無しでも実行できる):
+    python spool_farm.py --spool /mnt/bake/spool --status
+
+スプールディレクトリ:
+    units/<id>.json   ワークユニット (.blend のパス、オブジェクト、ターゲットのノード、ベイク設定)
+    locks/<id>.lock   作業中のユニット (O_CREAT | O_EXCL で作成し、ワーカーがベイクのたびに更新する)
+    done/<id>.json    結果のマニフェスト (画像のパス、時間、ワーカー)
+    output/<id>/      ベイクした画像
+
+ロックが --stale 秒 (既定 600 秒) 更新されていない場合はワーカーが落ちたものとみなし、
+別のワーカーがやり直します (--max-attempts 回まで)。--stale は 1 回のベイクの最長時間より長くしてください。
+.blend と出力のパスはスプールディレクトリからの相対パスで保存するので、
+マシンごとにマウント先が違っても、スプールディレクトリと .blend の位置関係が同じなら動作します。
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+try:
+    import bpy
+except ImportError:  # ロックと状況の確認は bpy 無しでも動作する
+    bpy = None
+
+if __package__:
+    from . import batch_bake
+else:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import batch_bake
+
+
+STALE_SECONDS = 600
+HEARTBEAT_SECONDS = 30
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 10
+
+
+# ---------------------------------------------------------------------------
+# スプールディレクトリ
+# ---------------------------------------------------------------------------
+
+def spool_paths(spool_dir):
+    return {name: os.path.join(spool_dir, name) for name in ("units", "locks", "done", "output")}
+
+
+def worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def write_json_atomic(path, data):
+    # 他のマシンから書きかけのファイルが見えないように、一時ファイルに書いてから置き換える
+    temp_path = f"{path}.{worker_name()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def spool_relpath(path, spool_dir):
+    # 別のドライブにある場合は相対パスにできないので絶対パスのまま
+    try:
+        return os.path.relpath(path, spool_dir)
+    except ValueError:
+        return path
+
+
+def export_units(spool_dir, blend, units, job_name):
+    """units (batch_bake.split_units の戻り値) をスプールディレクトリに書き、ユニットの ID を返す"""
+    paths = spool_paths(spool_dir)
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    unit_ids = []
+    for unit in units:
+        unit_id = f"{job_name}-{unit['id']}"
+        unit = dict(
+            unit,
+            id=unit_id,
+            blend=spool_relpath(blend, spool_dir),
+            output_dir=os.path.join("output", unit_id),
+        )
+        write_json_atomic(os.path.join(paths["units"], unit_id + ".json"), unit)
+        unit_ids.append(unit_id)
+    return unit_ids
+
+
+# ---------------------------------------------------------------------------
+# ロック
+# ---------------------------------------------------------------------------
+
+def try_lock(lock_path, worker, attempt):
+    # O_EXCL で作成できたワーカーだけがユニットを取れる (NFS でもアトミック)
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"worker": worker, "attempt": attempt, "claimed": time.time()}, f)
+    return True
+
+
+def storage_time(directory, worker):
+    # ロックの更新時刻は共有ストレージの時計で付くので、マシンの時計がずれていても比べられるように
+    # 同じディレクトリに一時ファイルを作って更新し、その更新時刻をストレージの現在時刻として使う
+    probe_path = os.path.join(directory, f".clock.{worker}")
+    with open(probe_path, "a", encoding="utf-8"):
+        pass
+    try:
+        os.utime(probe_path)
+        return os.stat(probe_path).st_mtime
+    finally:
+        os.remove(probe_path)
+
+
+def lock_age(path, now):
+    try:
+        return now - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def break_stale_lock(lock_path, worker, stale_seconds):
+    """更新が止まったロックを取り除いて前の試行回数を返す。取り除かなかった場合は None"""
+    now = storage_time(os.path.dirname(lock_path), worker)
+    age = lock_age(lock_path, now)
+    if age is None or age < stale_seconds:
+        return None
+    # 名前を変えられたワーカーだけが取り除ける
+    stale_path = f"{lock_path}.{worker}.stale"
+    try:
+        os.rename(lock_path, stale_path)
+    except FileNotFoundError:
+        return None
+    # 試行回数は名前を変えたファイルから読む (確認の後に取り直されたロックの回数を使わない)
+    previous = read_json(stale_path)
+    age = lock_age(stale_path, now)
+    if age is not None and age < stale_seconds:
+        # 確認の間に他のワーカーがロックを取り直していた場合は元に戻す
+        try:
+            os.link(stale_path, lock_path)
+        except FileExistsError:
+            pass
+        os.remove(stale_path)
+        return None
+    os.remove(stale_path)
+    return previous.get("attempt", 1)
+
+
+def release_lock(lock_path, worker):
+    if read_json(lock_path).get("worker") == worker:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+class Heartbeat:
+    # ロックファイルの更新時刻を定期的に更新し、ワーカーが動いていることを示す
+
+    def __init__(self, lock_path, interval=HEARTBEAT_SECONDS):
+        self.lock_path = lock_path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def touch(self):
+        try:
+            os.utime(self.lock_path)
+        except FileNotFoundError:
+            pass
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.touch()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+
+
+def unit_ids(spool_dir):
+    units_dir = spool_paths(spool_dir)["units"]
+    if not os.path.isdir(units_dir):
+        return []
+    return sorted(name[:-5] for name in os.listdir(units_dir) if name.endswith(".json"))
+
+
+def claim_unit(spool_dir, worker, stale_seconds=STALE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """ロックを取れた最初のユニットを返す。取れるユニットが無い場合は None"""
+    paths = spool_paths(spool_dir)
+    for unit_id in unit_ids(spool_dir):
+        done_path = os.path.join(paths["done"], unit_id + ".json")
+        if os.path.exists(done_path):
+            continue
+        lock_path = os.path.join(paths["locks"], unit_id + ".lock")
+        attempt = 1
+        if not try_lock(lock_path, worker, attempt):
+            previous = break_stale_lock(lock_path, worker, stale_seconds)
+            if previous is None:
+                continue
+            attempt = previous + 1
+            if attempt > max_attempts:
+                # 何度もワーカーが落ちるユニットは失敗として記録し、やり直さない
+                write_json_atomic(done_path, {
+                    "id": unit_id,
+                    "status": "failed",
+                    "worker": worker,
+                    "error": f"Abandoned by {previous} crashed worker(s)",
+                    "results": [],
+                })
+                continue
+            if not try_lock(lock_path, worker, attempt):
+                continue
+
+        # ロックを取る直前に他のワーカーが終えていた場合
+        if os.path.exists(done_path):
+            release_lock(lock_path, worker)
+            continue
+        unit = read_json(os.path.join(paths["units"], unit_id + ".json"))
+        if not unit:
+            release_lock(lock_path, worker)
+            continue
+        unit["attempt"] = attempt
+        return unit
+    return None
+
+
+def complete_unit(spool_dir, unit, worker, results, seconds):
+    paths = spool_paths(spool_dir)
+    manifest = {
+        "id": unit["id"],
+        "status": "failed" if any("error" in result for result in results) else "done",
+        "blend": unit["blend"],
+        "worker": worker,
+        "attempt": unit.get("attempt", 1),
+        "seconds": round(seconds, 3),
+        "finished": time.time(),
+        "results": results,
+    }
+    write_json_atomic(os.path.join(paths["done"], unit["id"] + ".json"), manifest)
+    release_lock(os.path.join(paths["locks"], unit["id"] + ".lock"), worker)
+    return manifest
+
+
+def spool_status(spool_dir):
+    """{"pending": ..., "running": ..., "done": ..., "failed": ...}"""
+    paths = spool_paths(spool_dir)
+    status = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+    for unit_id in unit_ids(spool_dir):
+        done = read_json(os.path.join(paths["done"], unit_id + ".json"))
+        if done:
+            status["failed" if done.get("status") == "failed" else "done"] += 1
+        elif os.path.exists(os.path.join(paths["locks"], unit_id + ".lock")):
+            status["running"] += 1
+        else:
+            status["pending"] += 1
+    return status
+
+
+# ---------------------------------------------------------------------------
+# ワーカー (Blender 内で実行)
+# ---------------------------------------------------------------------------
+
+def bake_claimed_unit(spool_dir, unit, heartbeat_seconds):
+    # ユニットごとに .blend を開き直し、前のユニットで変更した画像の設定を持ち越さない
+    blend = os.path.normpath(os.path.join(spool_dir, unit["blend"]))
+    unit = dict(unit, output_dir=os.path.normpath(os.path.join(spool_dir, unit["output_dir"])))
+
+    lock_path = os.path.join(spool_paths(spool_dir)["locks"], unit["id"] + ".lock")
+    with Heartbeat(lock_path, heartbeat_seconds) as heartbeat:
+        # .blend が開けないときも失敗として記録し、次のワーカーが同じユニットで落ち続けないようにする
+        try:
+            bpy.ops.wm.open_mainfile(filepath=blend)
+        except Exception as e:
+            return [{"error": f"Could not open {blend}: {e}"}]
+        try:
+            return batch_bake.bake_unit(unit, on_progress=heartbeat.touch)
+        except Exception as e:
+            return [{"error": f"{type(e).__name__}: {e}"}]
+
+
+def run_worker(spool_dir, stale_seconds=STALE_SECONDS, heartbeat_seconds=HEARTBEAT_SECONDS,
+               max_attempts=MAX_ATTEMPTS, exit_when_idle=False):
+    """全てのユニットが終わるまで (exit_when_idle の場合は取れるユニットが無くなるまで) ベイクする"""
+    worker = worker_name()
+    failed = 0
+    while True:
+        unit = claim_unit(spool_dir, worker, stale_seconds, max_attempts)
+        if unit is None:
+            status = spool_status(spool_dir)
+            # 他のワーカーが作業中のユニットは、そのワーカーが落ちたときに引き継げるように待つ
+            if exit_when_idle or not (status["pending"] or status["running"]):
+                break
+            time.sleep(POLL_SECONDS)
+            continue
+
+        print(f"Simple Bake: {worker} baking {unit['id']} (attempt {unit['attempt']})")
+        start = time.perf_counter()
+        results = bake_claimed_unit(spool_dir, unit, heartbeat_seconds)
+        manifest = complete_unit(spool_dir, unit, worker, results, time.perf_counter() - start)
+        if manifest["status"] == "failed":
+            failed += 1
+        print(f"Simple Bake: {unit['id']} {manifest['status']} in {manifest['seconds']}s")
+    return 1 if failed else 0
+
+
+def parse_args(argv):
+    import argparse
+
+    # Blender の引数は "--" 以降だけを解釈する
+    if "--" in argv:
+        argv = argv[argv.index("--") + 1:]
+    elif bpy is None:
+        argv = argv[1:]
+    parser = argparse.ArgumentParser(prog="spool_farm")
+    parser.add_argument("--spool", required=True, help="Spool directory on the shared storage")
+    parser.add_argument("--status", action="store_true", help="Print the number of pending, running and finished units")
+    parser.add_argument("--stale", type=float, default=STALE_SECONDS, help="Seconds after which a lock is taken over")
+    parser.add_argument("--heartbeat", type=float, default=HEARTBEAT_SECONDS)
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+    parser.add_argument("--exit-when-idle", action="store_true", help="Exit when no unit can be claimed")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    spool_dir = os.path.abspath(args.spool)
+    if args.status:
+        print(json.dumps(spool_status(spool_dir)))
+        return 0
+    if bpy is None:
+        print("Simple Bake: the worker must run inside Blender (blender -b --python spool_farm.py -- --spool DIR)")
+        return 1
+    return run_worker(spool_dir, args.stale, args.heartbeat, args.max_attempts, args.exit_when_idle)
+
+
+if __name__ == "__main__":
+    code = main(sys.argv)
+    if code:
+        sys.exit(code)
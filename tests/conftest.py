@@ -0,0 +1,55 @@
+import os
+import sys
+import types
+
+# Blender の外でテストするため、bpy をスタブに置き換え、アドオンのフォルダーを "simple_bake" パッケージとして読み込めるようにする
+# アドオンのフォルダーには __init__.py があるので、pytest はテストの前にそれ (全てのモジュール) を読み込む
+# スタブはクラスの定義やプロパティの登録が通るだけのもので、テストするのは bpy を使わない純粋な関数だけ
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Stub:
+    # どの属性も呼び出しもスタブを返し、基底クラスにすると object になる
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _Stub()
+
+    def __call__(self, *args, **kwargs):
+        return _Stub()
+
+    def __iter__(self):
+        return iter(())
+
+    def __mro_entries__(self, bases):
+        return (object,)
+
+
+def _stub_bpy():
+    bpy = types.ModuleType("bpy")
+    for name in ("types", "props", "utils", "msgbus", "ops", "context", "data", "path"):
+        setattr(bpy, name, _Stub())
+    bpy.app = types.ModuleType("bpy.app")
+    bpy.app.background = True
+    bpy.app.version_string = "stub"
+    bpy.app.timers = _Stub()
+    bpy.app.handlers = types.ModuleType("bpy.app.handlers")
+    bpy.app.handlers.persistent = lambda function: function
+    for name in ("depsgraph_update_post", "undo_post", "redo_post", "load_pre", "load_post"):
+        setattr(bpy.app.handlers, name, [])
+    return bpy
+
+
+if "bpy" not in sys.modules:
+    bpy = _stub_bpy()
+    sys.modules["bpy"] = bpy
+    sys.modules["bpy.app"] = bpy.app
+    sys.modules["bpy.app.handlers"] = bpy.app.handlers
+
+if "simple_bake" not in sys.modules:
+    package = types.ModuleType("simple_bake")
+    package.__path__ = [ADDON_DIR]
+    sys.modules["simple_bake"] = package
@@ -0,0 +1,38 @@
+import numpy as np
+
+from simple_bake import adaptive_samples
+
+
+def noisy_pair(shape, sigma, seed=0):
+    rng = np.random.default_rng(seed)
+    base = np.full(shape, 0.5, np.float32)
+    return base + rng.normal(0.0, sigma, shape), base + rng.normal(0.0, sigma, shape)
+
+
+def test_identical_bakes_have_no_noise():
+    first, _second = noisy_pair((64, 64, 4), 0.1)
+    assert adaptive_samples.estimate_noise(first, first.copy()) == 0.0
+
+
+def test_estimate_is_the_noise_left_in_the_average():
+    # 各ベイクの標準偏差が sigma なら、2 回の平均には sigma / sqrt(2) が残る
+    sigma = 0.1
+    first, second = noisy_pair((256, 256, 3), sigma)
+    noise = adaptive_samples.estimate_noise(first, second, grid=1)
+    assert abs(noise - sigma / np.sqrt(2.0)) < 0.005
+
+
+def test_the_noisiest_region_decides():
+    first = np.full((64, 64, 4), 0.5, np.float32)
+    second = first.copy()
+    noisy_first, noisy_second = noisy_pair((8, 8, 4), 0.2)
+    first[:8, :8], second[:8, :8] = noisy_first, noisy_second
+    # 画像全体の平均ではノイズが薄まるが、領域ごとの最大値では薄まらない
+    assert adaptive_samples.estimate_noise(first, second, grid=8) > 4 * adaptive_samples.estimate_noise(first, second, grid=1)
+
+
+def test_unbaked_texels_are_ignored():
+    first, second = noisy_pair((64, 64, 4), 0.1)
+    covered = adaptive_samples.estimate_noise(first, second, grid=1)
+    first[:, 32:], second[:, 32:] = 0.0, 0.0
+    assert abs(adaptive_samples.estimate_noise(first, second, grid=1) - covered) < 0.01
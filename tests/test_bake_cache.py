@@ -0,0 +1,80 @@
+import hashlib
+from types import SimpleNamespace
+
+import numpy as np
+
+from simple_bake import bake_cache
+
+
+class FakeCollection:
+    # foreach_get だけを持つ Blender のコレクション
+    def __init__(self, count, **values):
+        self.count = count
+        self.values = values
+
+    def __len__(self):
+        return self.count
+
+    def foreach_get(self, attr, array):
+        array[:] = np.ravel(self.values[attr])
+
+
+def fake_image(colorspace="sRGB"):
+    return SimpleNamespace(size=(4, 4), channels=4, is_float=False,
+                           colorspace_settings=SimpleNamespace(name=colorspace))
+
+
+def fake_scene(normal_space='TANGENT', normal_g='POS_Y'):
+    bake = SimpleNamespace(normal_space=normal_space, normal_r='POS_X', normal_g=normal_g, normal_b='POS_Z')
+    return SimpleNamespace(render=SimpleNamespace(bake=bake))
+
+
+def image_key(img=None, scene=None, bake_type='NORMAL'):
+    cache = bake_cache.BakeCache("unused", 1)
+    return cache.image_key(img or fake_image(), bake_type, 16, 16, 0, [], [], scene or fake_scene(), None)
+
+
+def fake_object(normals, has_custom_normals=False, use_auto_smooth=False):
+    # 三角形 1 枚のメッシュ (Blender 4.0 以前のように loops から分割法線を読む)
+    loops = FakeCollection(3, vertex_index=[0, 1, 2], normal=normals)
+    mesh = SimpleNamespace(
+        vertices=FakeCollection(3, co=[[0, 0, 0], [1, 0, 0], [0, 1, 0]]),
+        loops=loops,
+        polygons=FakeCollection(1, loop_total=[3], material_index=[0], use_smooth=[True]),
+        uv_layers=[],
+        has_custom_normals=has_custom_normals,
+        use_auto_smooth=use_auto_smooth,
+        auto_smooth_angle=0.5,
+        calc_normals_split=lambda: None,
+    )
+    obj = SimpleNamespace(data=mesh, matrix_world=np.identity(4))
+    obj.evaluated_get = lambda depsgraph: obj
+    return obj
+
+
+def mesh_hash(obj):
+    h = hashlib.sha256()
+    bake_cache.hash_mesh(h, obj, 0, None)
+    return h.hexdigest()
+
+
+def test_image_key_changes_with_the_normal_settings():
+    key = image_key()
+    assert image_key(scene=fake_scene(normal_space='OBJECT')) != key
+    assert image_key(scene=fake_scene(normal_g='NEG_Y')) != key
+
+
+def test_normal_settings_only_change_normal_bakes():
+    assert image_key(bake_type='EMIT') == image_key(scene=fake_scene(normal_space='OBJECT'), bake_type='EMIT')
+
+
+def test_image_key_changes_with_the_colorspace():
+    assert image_key(img=fake_image("Non-Color")) != image_key()
+
+
+def test_mesh_hash_changes_with_the_split_normals():
+    flat = [[0, 0, 1]] * 3
+    key = mesh_hash(fake_object(flat))
+    assert mesh_hash(fake_object(flat)) == key
+    assert mesh_hash(fake_object([[0, 0, 1], [0, 0.6, 0.8], [0, 0, 1]], has_custom_normals=True)) != key
+    assert mesh_hash(fake_object(flat, use_auto_smooth=True)) != key
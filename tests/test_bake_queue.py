@@ -0,0 +1,35 @@
+from simple_bake import bake_queue as bake_queue_module
+from simple_bake.bake_queue import BakeQueue
+
+
+class FakeSession:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.restored = False
+
+    def restore(self):
+        if self.fail:
+            raise ReferenceError("StructRNA of type Object has been removed")
+        self.restored = True
+
+
+def test_loading_a_file_restores_and_clears_the_queue(monkeypatch):
+    queue = BakeQueue()
+    session = FakeSession()
+    queue.running = True
+    queue.active_session = session
+    queue.pending.append(object())
+    monkeypatch.setattr(bake_queue_module, "bake_queue", queue)
+
+    bake_queue_module._on_load_pre()
+
+    assert session.restored
+    assert not queue.running
+    assert queue.pending == [] and queue.active_session is None
+
+
+def test_restore_active_session_drops_a_removed_session():
+    queue = BakeQueue()
+    queue.active_session = FakeSession(fail=True)
+    queue.restore_active_session()
+    assert queue.active_session is None
@@ -0,0 +1,98 @@
+import pytest
+
+from simple_bake import bake_settings
+
+
+class FakeObject:
+    def __init__(self, name, selected=False):
+        self.name = name
+        self.selected = selected
+
+    def select_get(self):
+        return self.selected
+
+    def select_set(self, state):
+        self.selected = state
+
+
+class FakeObjects(list):
+    active = None
+
+
+class FakeViewLayer:
+    def __init__(self, objects):
+        self.objects = FakeObjects(objects)
+
+
+class FakeSession:
+    # ベイクのたびに選択されていたオブジェクトを記録する
+    def __init__(self, objects, view_layer, sources=()):
+        self.objects = objects
+        self.sources = list(sources)
+        self.view_layer = view_layer
+        self.bake_passes = [('EMIT', None), ('AO', None)]
+        self.baked = []
+        self.restored = False
+
+    def begin(self):
+        pass
+
+    def prepare_pass(self, bake_type, target_label):
+        return True
+
+    def bake_pass(self, bake_type, target_label):
+        selected = [obj.name for obj in self.view_layer.objects if obj.select_get()]
+        self.baked.append((bake_type, selected, self.view_layer.objects.active.name))
+
+    def finish_pass(self, bake_type, target_label):
+        pass
+
+    def restore(self):
+        self.restored = True
+
+    def save_images(self):
+        pass
+
+    def record_profile(self):
+        return {'total': 1.0}
+
+
+def test_each_batch_bakes_only_its_own_objects():
+    objects = [FakeObject(name, selected=True) for name in ("A", "B", "C")]
+    view_layer = FakeViewLayer(objects)
+    view_layer.objects.active = objects[2]
+    batches = [FakeSession(objects[:2], view_layer), FakeSession(objects[2:], view_layer)]
+
+    total = bake_settings.bake_sessions(batches, view_layer)
+
+    assert total == 2.0
+    assert batches[0].baked == [('EMIT', ["A", "B"], "A"), ('AO', ["A", "B"], "A")]
+    assert batches[1].baked == [('EMIT', ["C"], "C"), ('AO', ["C"], "C")]
+    # ベイクが終わったらユーザーの選択に戻す
+    assert [obj.select_get() for obj in objects] == [True, True, True]
+    assert view_layer.objects.active is objects[2]
+
+
+def test_batch_selection_includes_the_high_poly_sources():
+    low, high, other = FakeObject("Low"), FakeObject("High"), FakeObject("Other", selected=True)
+    view_layer = FakeViewLayer([low, high, other])
+    session = FakeSession([low], view_layer, sources=[high])
+
+    bake_settings.bake_sessions([session], view_layer)
+
+    assert session.baked[0][1:] == (["Low", "High"], "Low")
+
+
+def test_failed_batch_restores_the_settings_and_the_selection():
+    objects = [FakeObject("A", selected=True), FakeObject("B")]
+    view_layer = FakeViewLayer(objects)
+    session = FakeSession([objects[1]], view_layer)
+
+    def fail(bake_type, target_label):
+        raise RuntimeError("bake failed")
+
+    session.bake_pass = fail
+    with pytest.raises(RuntimeError):
+        bake_settings.bake_sessions([session], view_layer)
+    assert session.restored
+    assert [obj.select_get() for obj in objects] == [True, False]
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from simple_bake import batch_bake
+
+
+def manifest(jobs):
+    return {"jobs": jobs, "output_dir": "/out", **batch_bake.DEFAULT_SETTINGS}
+
+
+def job(name, bake_types=('EMIT',), targets=None, **settings):
+    return {"object": name, "bake_types": list(bake_types), "targets": targets or {}, **settings}
+
+
+def unit_objects(units):
+    return [[job["object"] for job in unit["jobs"]] for unit in units]
+
+
+def test_split_units_one_unit_per_independent_job():
+    units = batch_bake.split_units(manifest([job("A"), job("B"), job("C")]))
+    assert unit_objects(units) == [["A"], ["B"], ["C"]]
+    assert [unit["id"] for unit in units] == ["unit-0000", "unit-0001", "unit-0002"]
+
+
+def test_split_units_groups_jobs_with_the_same_target():
+    jobs = [
+        job("A", targets={'EMIT': "Shared.png"}),
+        job("B", targets={'EMIT': "Own.png"}),
+        job("C", targets={'EMIT': "Shared.png"}),
+    ]
+    assert unit_objects(batch_bake.split_units(manifest(jobs))) == [["A", "C"], ["B"]]
+
+
+def test_split_units_groups_jobs_through_target_images():
+    # A と C は直接は共有しないが、B を介して同じユニットになる
+    target_images = {"A": {"x"}, "B": {"x", "y"}, "C": {"y"}, "D": {"z"}}
+    units = batch_bake.split_units(manifest([job("A"), job("B"), job("C"), job("D")]), target_images)
+    assert unit_objects(units) == [["A", "B", "C"], ["D"]]
+
+
+def test_split_units_applies_job_settings_over_the_manifest():
+    units = batch_bake.split_units(manifest([job("A", samples=256), job("B")]))
+    assert [unit["jobs"][0]["samples"] for unit in units] == [256, batch_bake.DEFAULT_SETTINGS["samples"]]
+    assert all(unit["output_dir"] == "/out" for unit in units)
+
+
+def write_manifest(tmp_path, jobs):
+    path = tmp_path / "job.json"
+    path.write_text(json.dumps({"jobs": jobs}), encoding="utf-8")
+    return str(path)
+
+
+def test_load_manifest_fills_defaults(tmp_path):
+    loaded = batch_bake.load_manifest(write_manifest(tmp_path, [{"object": "A"}]))
+    assert loaded["jobs"][0]["bake_types"] == ['EMIT']
+    assert loaded["margin"] == batch_bake.DEFAULT_SETTINGS["margin"]
+    assert loaded["output_dir"] == str(tmp_path / "bake_output")
+
+
+def test_load_manifest_rejects_several_types_without_targets(tmp_path):
+    path = write_manifest(tmp_path, [{"object": "A", "bake_types": ['EMIT', 'AO']}])
+    with pytest.raises(batch_bake.ManifestError):
+        batch_bake.load_manifest(path)
+
+
+def test_load_manifest_accepts_several_labelled_types(tmp_path):
+    path = write_manifest(tmp_path, [{"object": "A", "bake_types": ['EMIT', 'AO'], "labels": {'EMIT': "Base", 'AO': "AO"}}])
+    assert batch_bake.load_manifest(path)["jobs"][0]["bake_types"] == ['EMIT', 'AO']
+
+
+def test_load_manifest_rejects_unknown_bake_types(tmp_path):
+    with pytest.raises(batch_bake.ManifestError):
+        batch_bake.load_manifest(write_manifest(tmp_path, [{"object": "A", "bake_types": ['GLOSSY']}]))
+
+
+def test_jobs_without_targets():
+    jobs = [
+        job("A", bake_types=('EMIT', 'AO'), targets={'EMIT': "A.png", 'AO': "A_AO.png"}),
+        job("B", bake_types=('EMIT', 'AO'), targets={'EMIT': "B.png"}),
+        job("C"),
+    ]
+    assert batch_bake.jobs_without_targets(jobs) == ["B", "C"]
+
+
+def test_coordinator_without_blender_requires_targets(tmp_path, monkeypatch):
+    # ラベルで指定した画像は Blender の外では分からないので、ワーカーを起動せずに止める
+    monkeypatch.setattr(batch_bake, "bpy", None)
+    path = write_manifest(tmp_path, [{"object": "A", "labels": {'EMIT': "Base"}}, {"object": "B", "labels": {'EMIT': "Base"}}])
+    with pytest.raises(batch_bake.ManifestError, match="targets"):
+        batch_bake.run_coordinator(path, blender="blender")
+    assert not (tmp_path / "bake_output").exists()
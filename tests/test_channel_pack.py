@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from simple_bake import channel_pack, image_writer
+
+
+class FakePixels:
+    def __init__(self, values):
+        self.values = np.asarray(values, np.float32)
+
+    def __len__(self):
+        return len(self.values)
+
+    def foreach_get(self, array):
+        array[:] = self.values
+
+    def foreach_set(self, array):
+        self.values = np.array(array, np.float32)
+
+
+class FakeImage:
+    def __init__(self, name, value, size=(2, 2), colorspace="Non-Color", is_float=False):
+        self.name = name
+        self.size = size
+        self.channels = 4
+        self.is_float = is_float
+        self.colorspace_settings = SimpleNamespace(name=colorspace)
+        self.pixels = FakePixels(np.full(size[0] * size[1] * 4, value))
+        self.filepath = self.filepath_raw = ""
+
+    def update(self):
+        pass
+
+
+class FakeImages(dict):
+    def new(self, name, width, height, alpha):
+        self[name] = FakeImage(name, 0.0, (width, height))
+        return self[name]
+
+    def remove(self, img):
+        del self[img.name]
+
+
+@pytest.fixture
+def images(monkeypatch):
+    images = FakeImages()
+    monkeypatch.setattr(channel_pack, "bpy", SimpleNamespace(data=SimpleNamespace(images=images)))
+    return images
+
+
+def add(images, name, value, **kwargs):
+    images[name] = FakeImage(name, value, **kwargs)
+
+
+def packed_texel(output):
+    return output.pixels.values.reshape(-1, 4)[0].tolist()
+
+
+def test_orm_layout_puts_ao_roughness_metallic_in_rgb(images):
+    add(images, "RockAO.png", 0.25)
+    add(images, "RockRoughness.png", 0.5)
+    add(images, "RockMetallic.png", 0.75)
+    output_suffix, channels = channel_pack.PACK_LAYOUTS['ORM']
+    output, used = channel_pack.pack_channels("Rock", output_suffix, channels)
+    assert output.name == "RockORM.png"
+    assert output.colorspace_settings.name == 'Non-Color'
+    assert packed_texel(output) == [0.25, 0.5, 0.75, 1.0]
+    assert len(used) == 3
+
+
+def test_mask_layout_fills_missing_sources_and_inverts_roughness(images):
+    add(images, "RockMetallic.png", 1.0)
+    add(images, "RockRoughness.png", 0.25)
+    output_suffix, channels = channel_pack.PACK_LAYOUTS['MASK']
+    output, _used = channel_pack.pack_channels("Rock", output_suffix, channels)
+    # AO と Detail は元画像が無いので既定値、アルファはラフネスを反転したスムースネス
+    assert packed_texel(output) == [1.0, 1.0, 0.0, 0.75]
+
+
+def test_byte_srgb_sources_are_converted_to_linear(images):
+    add(images, "RockAO.png", 0.5, colorspace="sRGB")
+    add(images, "RockRoughness.png", 0.5)
+    add(images, "RockMetallic.png", 0.5, colorspace="sRGB", is_float=True)
+    output_suffix, channels = channel_pack.PACK_LAYOUTS['ORM']
+    output, _used = channel_pack.pack_channels("Rock", output_suffix, channels)
+    ao, roughness, metallic, _alpha = packed_texel(output)
+    assert ao == pytest.approx(float(image_writer.srgb_to_linear(np.float32(0.5))))
+    # Non-Color と float 画像の値はそのまま使う
+    assert roughness == metallic == 0.5
+
+
+def test_sources_of_different_sizes_are_rejected(images):
+    add(images, "RockAO.png", 0.5)
+    add(images, "RockRoughness.png", 0.5, size=(4, 4))
+    output_suffix, channels = channel_pack.PACK_LAYOUTS['ORM']
+    with pytest.raises(ValueError):
+        channel_pack.pack_channels("Rock", output_suffix, channels)
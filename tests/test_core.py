@@ -0,0 +1,106 @@
+import types
+
+from simple_bake import core
+
+
+def material(name, nodes, active=None):
+    return core.MaterialInfo(name, nodes, active)
+
+
+def image_node(name, label="", image_name=None):
+    return core.NodeInfo(name, 'TEX_IMAGE', label, image_name)
+
+
+def test_split_by_budget_keeps_shared_images_together():
+    object_images = [("A", {"Shared"}), ("B", {"Own"}), ("C", {"Shared"})]
+    sizes = {"Shared": 100, "Own": 100}
+    assert core.split_by_budget(object_images, sizes, 100) == [["A", "C"], ["B"]]
+
+
+def test_split_by_budget_fills_batches_in_order():
+    object_images = [("A", {"a"}), ("B", {"b"}), ("C", {"c"})]
+    sizes = {"a": 40, "b": 40, "c": 40}
+    assert core.split_by_budget(object_images, sizes, 80) == [["A", "B"], ["C"]]
+
+
+def test_split_by_budget_puts_an_oversized_group_alone():
+    object_images = [("A", {"a"}), ("Big", {"big"}), ("C", {"c"})]
+    sizes = {"a": 10, "big": 500, "c": 10}
+    assert core.split_by_budget(object_images, sizes, 100) == [["A"], ["Big"], ["C"]]
+
+
+def test_select_bake_passes_single_pass():
+    assert core.select_bake_passes(False, 'AO', {'NORMAL'}, core.PASS_TARGET_DEFAULTS) == [('AO', None)]
+
+
+def test_select_bake_passes_multi_pass_follows_bake_type_order():
+    passes = core.select_bake_passes(True, 'EMIT', {'AO', 'EMIT', 'NORMAL'}, core.PASS_TARGET_DEFAULTS)
+    assert passes == [('EMIT', "Base"), ('NORMAL', "Normal"), ('AO', "AO")]
+
+
+def signature(materials):
+    return core.plan_signature(["Rock"], materials, [('EMIT', None)], 0, 1024)
+
+
+def test_plan_signature_is_stable():
+    nodes = [image_node("Image Texture", "Base", "RockBase.png")]
+    assert signature([material("Rock", nodes, nodes[0])]) == signature([material("Rock", list(nodes), nodes[0])])
+
+
+def test_plan_signature_changes_with_image_nodes():
+    base = image_node("Image Texture", "Base", "RockBase.png")
+    before = signature([material("Rock", [base], base)])
+    # ラベル、画像、ノードの追加のどれでも変わる
+    assert signature([material("Rock", [image_node("Image Texture", "Normal", "RockBase.png")], base)]) != before
+    assert signature([material("Rock", [image_node("Image Texture", "Base", "Other.png")], base)]) != before
+    assert signature([material("Rock", [base, image_node("AO", "AO", "RockAO.png")], base)]) != before
+
+
+def test_plan_signature_changes_with_active_node():
+    base = image_node("Image Texture", "Base", "RockBase.png")
+    ao = image_node("AO", "AO", "RockAO.png")
+    assert signature([material("Rock", [base, ao], base)]) != signature([material("Rock", [base, ao], ao)])
+
+
+def test_texel_density_size_rounds_up_to_a_power_of_two():
+    # 1 m² の面が UV の 1/4 を使う → 2 m 四方 × 512 px/m = 1024 px
+    assert core.texel_density_size(1.0, 0.25, 512, 64, 8192) == 1024
+    assert core.texel_density_size(1.0, 0.25, 600, 64, 8192) == 2048
+
+
+def test_texel_density_size_is_clamped():
+    assert core.texel_density_size(0.0001, 1.0, 10, 64, 8192) == 64
+    assert core.texel_density_size(1000.0, 0.001, 4096, 64, 4096) == 4096
+
+
+def test_texel_density_size_without_area_uses_the_maximum():
+    assert core.texel_density_size(0.0, 1.0, 512, 64, 2048) == 2048
+    assert core.texel_density_size(1.0, 0.0, 512, 64, 2048) == 2048
+
+
+def test_settings_snapshot_restores_nested_values():
+    owner = types.SimpleNamespace(
+        cycles=types.SimpleNamespace(samples=128, tile_size=2048),
+        render=types.SimpleNamespace(threads=8),
+    )
+    snapshot = core.SettingsSnapshot(owner, ("cycles.samples", "cycles.tile_size", "render.threads"))
+    owner.cycles.samples = 1
+    owner.cycles.tile_size = 256
+    owner.render.threads = 2
+
+    snapshot.restore(("cycles.tile_size", "render.threads"))
+    assert (owner.cycles.samples, owner.cycles.tile_size, owner.render.threads) == (1, 2048, 8)
+    snapshot.restore()
+    assert owner.cycles.samples == 128
+
+
+def test_build_plan_uses_labelled_nodes():
+    nodes = [image_node("A", "Base", "RockBase.png"), image_node("B", "Normal", "RockNormal.png")]
+    materials = [material("Rock", nodes)]
+    images = {
+        "RockBase.png": core.ImageInfo("RockBase.png", 2048, 2048),
+        "RockNormal.png": core.ImageInfo("RockNormal.png"),
+    }
+    plan = core.build_plan(None, materials, images, [('EMIT', "Base"), ('NORMAL', "Normal")], 1024)
+    assert [bake_pass.image_names for bake_pass in plan.passes] == [["RockBase.png"], ["RockNormal.png"]]
+    assert (plan.targets["RockNormal.png"].width, plan.targets["RockBase.png"].width) == (1024, 2048)
@@ -0,0 +1,69 @@
+import numpy as np
+
+from simple_bake import edge_padding
+
+FULL_SQUARE = np.array([[(0, 0), (1, 0), (1, 1)], [(0, 0), (1, 1), (0, 1)]], np.float32)
+LOWER_LEFT = np.array([[(0, 0), (1, 0), (0, 1)]], np.float32)
+
+
+def test_rasterize_mask_covers_the_whole_square():
+    assert edge_padding.rasterize_mask(FULL_SQUARE, 8, 4).all()
+
+
+def test_rasterize_mask_uses_texel_centers():
+    mask = edge_padding.rasterize_mask(LOWER_LEFT, 4, 4)
+    # 中心が x + y <= 1 のテクセル (行はピクセルの y)
+    expected = np.add.outer(np.arange(4), np.arange(4)) <= 3
+    np.testing.assert_array_equal(mask, expected)
+
+
+def test_rasterize_mask_ignores_the_winding():
+    flipped = LOWER_LEFT[:, ::-1]
+    np.testing.assert_array_equal(edge_padding.rasterize_mask(flipped, 16, 16),
+                                  edge_padding.rasterize_mask(LOWER_LEFT, 16, 16))
+
+
+def test_rasterize_mask_gives_the_same_result_in_chunks(monkeypatch):
+    rng = np.random.default_rng(0)
+    triangles = rng.random((50, 3, 2)).astype(np.float32)
+    whole = edge_padding.rasterize_mask(triangles, 64, 64)
+    monkeypatch.setattr(edge_padding, "_RASTER_CHUNK", 100)
+    np.testing.assert_array_equal(edge_padding.rasterize_mask(triangles, 64, 64), whole)
+
+
+def test_rasterize_mask_without_triangles():
+    assert not edge_padding.rasterize_mask(np.empty((0, 3, 2), np.float32), 4, 4).any()
+
+
+def test_pull_push_keeps_covered_texels_and_fills_the_rest():
+    color = np.zeros((8, 8, 3), np.float32)
+    weight = np.zeros((8, 8), np.float32)
+    color[3, 5] = (0.2, 0.4, 0.6)
+    weight[3, 5] = 1.0
+    filled = edge_padding.pull_push(color, weight)
+    np.testing.assert_allclose(filled.reshape(-1, 3), np.tile((0.2, 0.4, 0.6), (64, 1)), rtol=1e-6)
+
+
+def test_pull_push_fills_from_the_nearest_island():
+    color = np.zeros((8, 8, 1), np.float32)
+    weight = np.zeros((8, 8), np.float32)
+    color[:, 0], weight[:, 0] = 1.0, 1.0
+    weight[:, 7] = 1.0
+    filled = edge_padding.pull_push(color, weight)[..., 0]
+    assert (filled[:, 0] == 1.0).all() and (filled[:, 7] == 0.0).all()
+    assert (filled[:, 1] == 1.0).all() and (filled[:, 6] == 0.0).all()
+
+
+def test_pull_push_handles_odd_sizes():
+    color = np.zeros((5, 3, 4), np.float32)
+    weight = np.zeros((5, 3), np.float32)
+    color[4, 2], weight[4, 2] = 1.0, 1.0
+    np.testing.assert_allclose(edge_padding.pull_push(color, weight), 1.0)
+
+
+def test_dilate_grows_the_mask_by_the_radius():
+    mask = np.zeros((9, 9), bool)
+    mask[4, 4] = True
+    grown = edge_padding.dilate(mask, 2)
+    assert grown[2:7, 2:7].all()
+    assert grown.sum() == 25
@@ -0,0 +1,67 @@
+import struct
+import zlib
+
+import numpy as np
+
+from simple_bake import image_writer
+
+
+def read_png(data):
+    """(IHDR のフィールド, フィルターを戻した行の配列) を返す (Up フィルターだけに対応)"""
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    position = 8
+    header = None
+    compressed = b""
+    while position < len(data):
+        length, tag = struct.unpack(">I4s", data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        crc, = struct.unpack(">I", data[position + 8 + length:position + 12 + length])
+        assert crc == zlib.crc32(tag + body) & 0xFFFFFFFF
+        if tag == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif tag == b"IDAT":
+            compressed += body
+        position += 12 + length
+
+    width, height, bit_depth, _color_type, _compression, _filter, _interlace = header
+    raw = np.frombuffer(zlib.decompress(compressed), np.uint8).reshape(height, -1)
+    assert np.all(raw[:, 0] == 2)
+    rows = np.cumsum(raw[:, 1:].astype(np.uint32), axis=0).astype(np.uint8)
+    return header, rows
+
+
+def test_encode_png_round_trips_8_bit():
+    width, height, channels = 3, 2, 4
+    pixels = np.linspace(0.0, 1.0, width * height * channels, dtype=np.float32)
+    header, rows = read_png(image_writer.encode_png(pixels, width, height, channels))
+    assert header[:4] == (width, height, 8, 6)
+    # Blender の並びは下の行からなので、PNG の最初の行は最後の行
+    expected = np.round(pixels.reshape(height, width * channels)[::-1] * 255.0).astype(np.uint8)
+    np.testing.assert_array_equal(rows, expected)
+
+
+def test_encode_png_round_trips_16_bit():
+    width, height, channels = 2, 2, 3
+    pixels = np.array([0.0, 0.5, 1.0, 0.25] * 3, np.float32)
+    header, rows = read_png(image_writer.encode_png(pixels, width, height, channels, bit_depth=16))
+    assert header[:4] == (width, height, 16, 2)
+    values = rows.reshape(height, -1, 2).astype(np.uint16)
+    decoded = (values[..., 0] << 8) | values[..., 1]
+    expected = np.round(pixels.reshape(height, width * channels)[::-1] * 65535.0).astype(np.uint16)
+    np.testing.assert_array_equal(decoded, expected)
+
+
+def test_encode_png_clips_out_of_range_values():
+    pixels = np.array([-1.0, 2.0], np.float32)
+    _header, rows = read_png(image_writer.encode_png(pixels, 1, 1, 2))
+    np.testing.assert_array_equal(rows, [[0, 255]])
+
+
+def test_srgb_conversion_round_trips():
+    values = np.linspace(0.0, 1.0, 11)
+    np.testing.assert_allclose(image_writer.srgb_to_linear(image_writer.linear_to_srgb(values)), values, atol=1e-6)
+
+
+def test_output_path_follows_the_save_format():
+    assert image_writer.output_path("/tex/Rock.png", 'EXR') == "/tex/Rock.exr"
+    assert image_writer.output_path("/tex/Rock.exr", 'PNG16') == "/tex/Rock.png"
@@ -0,0 +1,39 @@
+import numpy as np
+
+from simple_bake import mip_chain
+
+
+def test_level_sizes_stop_at_the_minimum():
+    assert mip_chain.level_sizes(4096, 512) == [2048, 1024, 512]
+    assert mip_chain.level_sizes(512, 512) == []
+    assert mip_chain.level_sizes(1024, 1) == [512, 256, 128, 64, 32, 16, 8, 4, 2, 1]
+
+
+def test_level_path():
+    assert mip_chain.level_path("/tex/RockBase.png", 1024) == "/tex/RockBase_1024.png"
+
+
+def test_box_downsample_averages_blocks():
+    data = np.arange(16, dtype=np.float32).reshape(4, 4, 1)
+    result = mip_chain.downsample(data, 'BOX')
+    assert result.shape == (2, 2, 1)
+    np.testing.assert_allclose(result[..., 0], [[2.5, 4.5], [10.5, 12.5]])
+
+
+def test_downsample_rounds_odd_sizes_up():
+    data = np.ones((5, 3, 4), np.float32)
+    for filter_type in ('BOX', 'KAISER'):
+        assert mip_chain.downsample(data, filter_type).shape == (3, 2, 4)
+
+
+def test_downsample_keeps_a_constant_image():
+    data = np.full((16, 16, 3), 0.25, np.float32)
+    for filter_type in ('BOX', 'KAISER'):
+        np.testing.assert_allclose(mip_chain.downsample(data, filter_type), 0.25, rtol=1e-5)
+
+
+def test_kaiser_weights_are_normalized():
+    weights = mip_chain.kaiser_weights()
+    assert len(weights) == 8
+    assert abs(float(weights.sum()) - 1.0) < 1e-6
+    np.testing.assert_allclose(weights, weights[::-1])
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+from types import SimpleNamespace
+
+from simple_bake import spool_farm
+
+
+def export(spool_dir, count):
+    units = [{"id": f"unit-{index:04d}", "jobs": [], "output_dir": ""} for index in range(count)]
+    blend = os.path.join(spool_dir, "scene.blend")
+    return spool_farm.export_units(spool_dir, blend, units, "job")
+
+
+def lock_path(spool_dir, unit_id):
+    return os.path.join(spool_farm.spool_paths(spool_dir)["locks"], unit_id + ".lock")
+
+
+def make_stale(path, seconds=1000):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_export_units_writes_relative_paths(tmp_path):
+    unit_ids = export(str(tmp_path), 1)
+    unit = json.loads((tmp_path / "units" / (unit_ids[0] + ".json")).read_text(encoding="utf-8"))
+    assert unit["blend"] == "scene.blend"
+    assert unit["output_dir"] == os.path.join("output", unit_ids[0])
+
+
+def test_claim_unit_gives_each_worker_a_different_unit(tmp_path):
+    spool_dir = str(tmp_path)
+    unit_ids = export(spool_dir, 2)
+    first = spool_farm.claim_unit(spool_dir, "worker-a")
+    second = spool_farm.claim_unit(spool_dir, "worker-b")
+    assert [first["id"], second["id"]] == unit_ids
+    assert first["attempt"] == 1
+    assert spool_farm.claim_unit(spool_dir, "worker-c") is None
+
+
+def test_claim_unit_skips_done_units(tmp_path):
+    spool_dir = str(tmp_path)
+    unit_ids = export(spool_dir, 2)
+    unit = spool_farm.claim_unit(spool_dir, "worker-a")
+    spool_farm.complete_unit(spool_dir, unit, "worker-a", [], 1.0)
+    assert not os.path.exists(lock_path(spool_dir, unit_ids[0]))
+    assert spool_farm.claim_unit(spool_dir, "worker-b")["id"] == unit_ids[1]
+
+
+def test_claim_unit_retries_a_stale_lock(tmp_path):
+    spool_dir = str(tmp_path)
+    unit_ids = export(spool_dir, 1)
+    spool_farm.claim_unit(spool_dir, "crashed")
+    make_stale(lock_path(spool_dir, unit_ids[0]))
+    unit = spool_farm.claim_unit(spool_dir, "worker-b")
+    assert (unit["id"], unit["attempt"]) == (unit_ids[0], 2)
+
+
+def test_claim_unit_fails_a_unit_after_max_attempts(tmp_path):
+    spool_dir = str(tmp_path)
+    unit_ids = export(spool_dir, 1)
+    spool_farm.claim_unit(spool_dir, "crashed")
+    make_stale(lock_path(spool_dir, unit_ids[0]))
+    assert spool_farm.claim_unit(spool_dir, "worker-b", max_attempts=1) is None
+    done = json.loads((tmp_path / "done" / (unit_ids[0] + ".json")).read_text(encoding="utf-8"))
+    assert done["status"] == "failed"
+
+
+def test_break_stale_lock_keeps_a_live_lock(tmp_path):
+    path = str(tmp_path / "unit.lock")
+    assert spool_farm.try_lock(path, "worker-a", 1)
+    assert spool_farm.break_stale_lock(path, "worker-b", 600) is None
+    assert os.path.exists(path)
+
+
+def test_break_stale_lock_returns_the_attempt_of_the_removed_lock(tmp_path):
+    path = str(tmp_path / "unit.lock")
+    assert spool_farm.try_lock(path, "worker-a", 2)
+    make_stale(path)
+    assert spool_farm.break_stale_lock(path, "worker-b", 600) == 2
+    # ロックも、名前を変えたファイルや時刻を調べるファイルも残らない
+    assert os.listdir(tmp_path) == []
+
+
+def test_unit_whose_blend_cannot_be_opened_is_recorded_as_failed(tmp_path, monkeypatch):
+    def open_mainfile(filepath):
+        raise RuntimeError("Cannot read file")
+
+    fake_bpy = SimpleNamespace(ops=SimpleNamespace(wm=SimpleNamespace(open_mainfile=open_mainfile)))
+    monkeypatch.setattr(spool_farm, "bpy", fake_bpy)
+    spool_dir = str(tmp_path)
+    unit_ids = export(spool_dir, 1)
+    unit = spool_farm.claim_unit(spool_dir, "worker-a")
+
+    results = spool_farm.bake_claimed_unit(spool_dir, unit, 60)
+    manifest = spool_farm.complete_unit(spool_dir, unit, "worker-a", results, 1.0)
+
+    assert manifest["status"] == "failed"
+    assert "Cannot read file" in results[0]["error"]
+    # 失敗したユニットは他のワーカーに取られない
+    assert not os.path.exists(lock_path(spool_dir, unit_ids[0]))
+    assert spool_farm.claim_unit(spool_dir, "worker-b") is None
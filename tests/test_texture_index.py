@@ -0,0 +1,35 @@
+import types
+
+from simple_bake import texture_index
+
+
+def image(name, users=0, use_fake_user=False):
+    return types.SimpleNamespace(
+        name=name, users=users, use_fake_user=use_fake_user, has_data=False,
+        size=(0, 0), is_float=False, packed_file=None,
+    )
+
+
+def test_unused_output_needs_an_output_name_and_no_users():
+    assert texture_index.TextureEntry(image("RockBase.png"), [], False).is_unused_output
+    assert not texture_index.TextureEntry(image("Photo.png"), [], False).is_unused_output
+
+
+def test_unused_output_ignores_images_used_outside_image_nodes():
+    # テクスチャやモディファイアーが使っている画像は、イメージノードが無くても消さない
+    entry = texture_index.TextureEntry(image("RockNormal.png", users=1), [], False)
+    assert not entry.is_orphan
+    assert not entry.is_unused_output
+
+
+def test_fake_user_alone_counts_as_orphan():
+    entry = texture_index.TextureEntry(image("RockAO.png", users=1, use_fake_user=True), [], False)
+    assert entry.is_orphan
+    assert entry.is_unused_output
+
+
+def test_matches_filter():
+    entry = texture_index.TextureEntry(image("RockAO.png"), [], True)
+    assert texture_index.matches_filter(entry, 'UNUSED_OUTPUT')
+    assert texture_index.matches_filter(entry, 'BAKE_TARGET')
+    assert not texture_index.matches_filter(entry, 'PACKED')
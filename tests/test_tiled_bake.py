@@ -0,0 +1,33 @@
+import math
+
+from simple_bake import tiled_bake
+
+MB = 1024 * 1024
+
+
+def region_bytes(width, height, channels, n):
+    tile_width, tile_height = math.ceil(width / n), math.ceil(height / n)
+    return tiled_bake.bake_memory(tile_width, tile_height) + width * tile_height * channels * 4
+
+
+def test_plan_grid_keeps_an_image_that_fits_whole():
+    assert tiled_bake.plan_grid(1024, 1024, 4, 1024 * MB) == 1
+
+
+def test_plan_grid_splits_until_a_region_fits_the_budget():
+    budget = 512 * MB
+    n = tiled_bake.plan_grid(8192, 8192, 4, budget)
+    assert n > 1 and n & (n - 1) == 0
+    assert region_bytes(8192, 8192, 4, n) <= budget
+    # 半分の分割数では収まらない (必要以上に分割しない)
+    assert region_bytes(8192, 8192, 4, n // 2) > budget
+
+
+def test_plan_grid_stops_at_one_pixel_regions():
+    assert tiled_bake.plan_grid(16, 4, 4, 1) == 4
+
+
+def test_split_edges_cover_the_whole_size():
+    edges = tiled_bake.split_edges(1000, 3)
+    assert edges[0] == 0 and edges[-1] == 1000
+    assert all(b > a for a, b in zip(edges, edges[1:]))
@@ -0,0 +1,66 @@
+import bpy
+import numpy as np
+
+from . import core
+
+# マテリアルごとのテクセル密度から画像サイズを決める
+# 選択オブジェクトの三角形をマテリアルごとに集計し、ワールド空間の面積と UV 空間の面積を比べる
+
+
+def triangle_areas(points):
+    # points は (三角形数, 3, 次元) で、2D と 3D のどちらでも使える
+    edge1 = points[:, 1] - points[:, 0]
+    edge2 = points[:, 2] - points[:, 0]
+    if points.shape[2] == 2:
+        return np.abs(edge1[:, 0] * edge2[:, 1] - edge1[:, 1] * edge2[:, 0]) * 0.5
+    return np.linalg.norm(np.cross(edge1, edge2), axis=1) * 0.5
+
+
+def material_areas(objects, uv_channel):
+    """マテリアル名 → (ワールド空間の面積, UV 空間の面積) を返す"""
+    areas = {}
+    for obj in objects:
+        mesh = obj.data
+        if not mesh.uv_layers:
+            continue
+        index = uv_channel if 0 <= uv_channel < len(mesh.uv_layers) else mesh.uv_layers.active_index
+        mesh.calc_loop_triangles()
+        count = len(mesh.loop_triangles)
+        if count == 0:
+            continue
+
+        coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", coords)
+        coords = coords.reshape(-1, 3)
+        matrix = np.array(obj.matrix_world, dtype=np.float32)
+        coords = coords @ matrix[:3, :3].T + matrix[:3, 3]
+        uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+        mesh.uv_layers[index].data.foreach_get("uv", uvs)
+        uvs = uvs.reshape(-1, 2)
+
+        tri_vertices = np.empty(count * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("vertices", tri_vertices)
+        tri_loops = np.empty(count * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("loops", tri_loops)
+        material_indices = np.empty(count, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("material_index", material_indices)
+
+        world_areas = triangle_areas(coords[tri_vertices.reshape(-1, 3)])
+        uv_areas = triangle_areas(uvs[tri_loops.reshape(-1, 3)])
+        slot_count = len(obj.material_slots)
+        world_sums = np.bincount(material_indices, weights=world_areas, minlength=slot_count)
+        uv_sums = np.bincount(material_indices, weights=uv_areas, minlength=slot_count)
+        for slot_index, slot in enumerate(obj.material_slots):
+            if slot.material is None or slot_index >= len(world_sums):
+                continue
+            world_area, uv_area = areas.get(slot.material.name, (0.0, 0.0))
+            areas[slot.material.name] = (world_area + float(world_sums[slot_index]), uv_area + float(uv_sums[slot_index]))
+    return areas
+
+
+def material_sizes(objects, uv_channel, density, min_size, max_size):
+    """マテリアル名 → 画像サイズ (ピクセル)"""
+    return {
+        name: core.texel_density_size(world_area, uv_area, density, min_size, max_size)
+        for name, (world_area, uv_area) in material_areas(objects, uv_channel).items()
+    }
@@ -0,0 +1,213 @@
+import os
+
+import bpy
+
+from . import core
+from .bake_settings import PASS_TARGET_PROPS
+
+# テクスチャの一覧 (Remove Textures ダイアログと一括削除で使う)
+# bpy.data.images とノードツリーを 1 回ずつ走査して、画像ごとのユーザー数、参照しているノード、
+# メモリ使用量、ベイク先かどうか、パックされているか、どこからも使われていないかをまとめる
+
+EXCLUDED_IMAGES = {"Render Result", "Viewer Node"}
+
+# Simple Bake が作る画像の名前の末尾 (Add Textures、Multi Pass、Pack Channels、Atlas Bake)
+OUTPUT_SUFFIXES = ("Base", "Roughness", "Metallic", "Normal", "Shadow", "AO", "ORM", "RMA", "Mask", "Packed")
+
+FILTER_ITEMS = [
+    ('ALL', "All", "Show all images"),
+    ('ORPHAN', "Orphans", "Images without users"),
+    ('UNUSED_OUTPUT', "Unused Outputs", "Baked or added textures without users"),
+    ('BAKE_TARGET', "Bake Targets", "Images that the next bake writes to"),
+    ('PACKED', "Packed", "Images packed into the Blend file"),
+]
+
+REMOVE_MODE_ITEMS = [
+    ('SELECTED', "Selected", "Remove the checked images"),
+    ('ORPHAN', "All Orphans", "Remove every image without users"),
+    ('UNUSED_OUTPUT', "Unused Outputs", "Remove every baked or added texture without users"),
+]
+
+
+class SimpleBakeTextureItem(bpy.types.PropertyGroup):
+    select: bpy.props.BoolProperty(name="Select")
+    users: bpy.props.IntProperty(name="Users")
+    memory_mb: bpy.props.FloatProperty(name="Memory (MB)")
+    resolution: bpy.props.StringProperty(name="Resolution")
+    references: bpy.props.StringProperty(name="Referenced By")
+    is_bake_target: bpy.props.BoolProperty(name="Bake Target")
+    is_packed: bpy.props.BoolProperty(name="Packed")
+    is_orphan: bpy.props.BoolProperty(name="Orphan")
+    is_unused_output: bpy.props.BoolProperty(name="Unused Output")
+
+
+def image_memory(img):
+    # 読み込まれているピクセルバッファの大きさ (バイト画像は RGBA 8-bit、float 画像は RGBA 32-bit)
+    if not img.has_data:
+        return 0
+    width, height = img.size
+    return core.image_bytes(width, height, 4, img.is_float)
+
+
+def is_output_name(name):
+    stem = os.path.splitext(name)[0]
+    return stem.endswith(OUTPUT_SUFFIXES)
+
+
+def collect_references(scene):
+    """(画像名 → ["ツリー名/ノード名", ...], ベイク先の画像名の集合) を返す"""
+    labels = {getattr(scene, prop_name) for prop_name in PASS_TARGET_PROPS.values()}
+    references = {}
+    targets = set()
+    trees = [(mat.name, mat.node_tree, True) for mat in bpy.data.materials if mat.use_nodes and mat.node_tree]
+    trees += [(group.name, group, False) for group in bpy.data.node_groups]
+    trees += [(world.name, world.node_tree, False) for world in bpy.data.worlds if world.use_nodes and world.node_tree]
+    for owner_name, tree, is_material in trees:
+        active = tree.nodes.active
+        for node in tree.nodes:
+            if node.type != 'TEX_IMAGE' or node.image is None:
+                continue
+            references.setdefault(node.image.name, []).append(f"{owner_name}/{node.name}")
+            if is_material and (node == active or node.label in labels):
+                targets.add(node.image.name)
+    return references, targets
+
+
+class TextureEntry:
+    # SimpleBakeTextureItem と同じ名前の属性を持つ (matches_filter はどちらにも使える)
+    def __init__(self, img, nodes, is_bake_target):
+        self.name = img.name
+        self.users = img.users
+        self.memory_mb = image_memory(img) / (1024 * 1024)
+        self.resolution = "{}x{}".format(*img.size) if img.has_data else ""
+        self.references = ", ".join(nodes)
+        self.is_bake_target = is_bake_target
+        self.is_packed = img.packed_file is not None
+        self.is_orphan = img.users - (1 if img.use_fake_user else 0) == 0
+        # テクスチャ・モディファイアー・ブラシ・コンポジターのノードなど、イメージノード以外から使われている画像は含めない
+        self.is_unused_output = self.is_orphan and not nodes and is_output_name(img.name)
+
+
+def build_index(scene):
+    references, targets = collect_references(scene)
+    return [
+        TextureEntry(img, references.get(img.name, []), img.name in targets)
+        for img in bpy.data.images
+        if img.name not in EXCLUDED_IMAGES
+    ]
+
+
+def fill_index(collection, entries):
+    collection.clear()
+    for entry in entries:
+        item = collection.add()
+        for prop_name in ("name", "users", "memory_mb", "resolution", "references",
+                          "is_bake_target", "is_packed", "is_orphan", "is_unused_output"):
+            setattr(item, prop_name, getattr(entry, prop_name))
+
+
+def matches_filter(item, mode):
+    if mode == 'ORPHAN':
+        return item.is_orphan
+    if mode == 'UNUSED_OUTPUT':
+        return item.is_unused_output
+    if mode == 'BAKE_TARGET':
+        return item.is_bake_target
+    if mode == 'PACKED':
+        return item.is_packed
+    return True
+
+
+def remove_images(names):
+    # まとめて削除すると 1 枚ずつ削除するより参照の更新が少なくて済む
+    images = [bpy.data.images[name] for name in names if name in bpy.data.images]
+    freed = sum(image_memory(img) for img in images)
+    bpy.data.batch_remove(images)
+    return len(images), freed
+
+
+def format_memory(megabytes):
+    if megabytes >= 1024:
+        return f"{megabytes / 1024:.1f} GB"
+    return f"{megabytes:.1f} MB"
+
+
+class SIMPLEBAKE_UL_textures(bpy.types.UIList):
+    # 表示されている行だけが描画されるので、画像が数千枚あってもダイアログが重くならない
+
+    filter_mode: bpy.props.EnumProperty(name="Show", items=FILTER_ITEMS, default='ALL')
+    sort_by_memory: bpy.props.BoolProperty(name="Sort by Memory", default=False)
+
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, "select", text="")
+        if item.is_packed:
+            icon = 'PACKAGE'
+        elif item.is_orphan:
+            icon = 'ORPHAN_DATA'
+        elif item.is_bake_target:
+            icon = 'RENDER_RESULT'
+        else:
+            icon = 'IMAGE_DATA'
+        row.label(text=item.name, icon=icon)
+        row.label(text=item.resolution)
+        row.label(text=format_memory(item.memory_mb) if item.memory_mb else "Not Loaded")
+        row.label(text=f"{item.users} users")
+
+    def draw_filter(self, context, layout):
+        row = layout.row(align=True)
+        row.prop(self, "filter_name", text="")
+        row.prop(self, "use_filter_invert", text="", icon='ARROW_LEFTRIGHT')
+        row = layout.row(align=True)
+        row.prop(self, "filter_mode", text="")
+        row.prop(self, "sort_by_memory", text="", icon='SORTSIZE')
+        row.prop(self, "use_filter_sort_alpha", text="", icon='SORTALPHA')
+        row.prop(self, "use_filter_sort_reverse", text="", icon='SORT_DESC' if self.use_filter_sort_reverse else 'SORT_ASC')
+
+    def filter_items(self, context, data, propname):
+        items = getattr(data, propname)
+        helper = bpy.types.UI_UL_list
+        flags = helper.filter_items_by_name(self.filter_name, self.bitflag_filter_item, items, "name")
+        if not flags:
+            flags = [self.bitflag_filter_item] * len(items)
+        if self.filter_mode != 'ALL':
+            for index, item in enumerate(items):
+                if not matches_filter(item, self.filter_mode):
+                    flags[index] &= ~self.bitflag_filter_item
+
+        order = []
+        if self.sort_by_memory:
+            order = helper.sort_items_helper([(index, -item.memory_mb) for index, item in enumerate(items)], key=lambda entry: entry[1])
+        elif self.use_filter_sort_alpha:
+            order = helper.sort_items_by_name(items, "name")
+        return flags, order
+
+
+class SimpleBakePurgeTexturesOperator(bpy.types.Operator):
+    bl_idname = "object.simple_bake_purge_textures"
+    bl_label = "Purge Textures"
+    bl_description = "Remove every orphan image or every unused bake output from the Blend file"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    mode: bpy.props.EnumProperty(name="Remove", items=REMOVE_MODE_ITEMS[1:], default='ORPHAN')
+
+    def execute(self, context):
+        names = [entry.name for entry in build_index(context.scene) if matches_filter(entry, self.mode)]
+        count, freed = remove_images(names)
+        self.report({'INFO'}, f"Removed {count} image(s), freed {format_memory(freed / (1024 * 1024))}")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_confirm(self, event)
+
+
+def register():
+    bpy.utils.register_class(SimpleBakeTextureItem)
+    bpy.utils.register_class(SIMPLEBAKE_UL_textures)
+    bpy.utils.register_class(SimpleBakePurgeTexturesOperator)
+
+
+def unregister():
+    bpy.utils.unregister_class(SimpleBakePurgeTexturesOperator)
+    bpy.utils.unregister_class(SIMPLEBAKE_UL_textures)
+    bpy.utils.unregister_class(SimpleBakeTextureItem)
@@ -1,6 +1,18 @@
 import bpy
 import os
 
+from . import bake_targets, core, texture_index
+from .bake_settings import PASS_TARGET_PROPS
+
+# Add Textures で作るマップ (オペレーターのプロパティ名, ラベル)
+TEXTURE_MAPS = [
+    ("base", "Base"),
+    ("roughness", "Roughness"),
+    ("metallic", "Metallic"),
+    ("normal", "Normal"),
+]
+
+
 class SimpleBakeAddTexturesOperator(bpy.types.Operator):
     bl_idname = "object.simple_bake_add_textures"
     bl_label = "Add Textures"
@@ -15,10 +27,33 @@ class SimpleBakeAddTexturesOperator(bpy.types.Operator):
             ('512', "512", ""),
             ('1024', "1024", ""),
             ('2048', "2048", ""),
-            ('4096', "4096", "")
+            ('4096', "4096", ""),
+            ('8192', "8K", ""),
+            ('16384', "16K", "")
         ],
         default='1024'
     )
+    scope: bpy.props.EnumProperty(
+        name="Materials",
+        description="Materials that receive the textures",
+        items=[
+            ('ACTIVE', "Active Material", "Only the active material of the active object"),
+            ('SELECTED', "All Selected", "Every material slot of every selected object"),
+        ],
+        default='ACTIVE'
+    )
+    use_texel_density: bpy.props.BoolProperty(
+        name="Texel Density",
+        description="Size each material's textures from its surface area and UV area, up to Image Size",
+        default=False
+    )
+    texel_density: bpy.props.FloatProperty(
+        name="Pixels per Meter",
+        description="Texel density used to size the textures",
+        default=1024.0,
+        min=1.0,
+        soft_max=8192.0
+    )
     base: bpy.props.BoolProperty(name="Base", default=True)
     roughness: bpy.props.BoolProperty(name="Roughness", default=True)
     metallic: bpy.props.BoolProperty(name="Metallic", default=True)
@@ -32,89 +67,116 @@ class SimpleBakeAddTexturesOperator(bpy.types.Operator):
                 return True
         return False
 
-    def execute(self, context):
-        scene = context.scene
-        material_names = set()
+    def get_materials(self, context):
+        if self.scope == 'SELECTED':
+            objects = [obj for obj in context.selected_objects if obj.type == 'MESH']
+            # 複数のオブジェクトで共有しているマテリアルには 1 回だけ追加する
+            return objects, list(bake_targets.iter_materials(objects))
 
         # アクティブなオブジェクトを取得し、アクティブなマテリアルを追加
         obj = context.active_object
-        if obj and obj.type == 'MESH' and obj.active_material:
-            material_names.add(obj.active_material.name)
-        
-        created_textures = []
-        for mat_name in material_names:
-            name_prefix = self.name if self.name else mat_name
-            if self.base:
-                created_textures.append((self.create_texture(name_prefix, "Base"), "Base"))
-            if self.roughness:
-                created_textures.append((self.create_texture(name_prefix, "Roughness"), "Roughness"))
-            if self.metallic:
-                created_textures.append((self.create_texture(name_prefix, "Metallic"), "Metallic"))
-            if self.normal:
-                created_textures.append((self.create_texture(name_prefix, "Normal"), "Normal"))
-
-        # Shader Editorにノードを追加
-        self.add_nodes_to_shader_editor(context, created_textures)
-
-        self.report({'INFO'}, "Textures added and nodes created")
+        if obj and obj.type == 'MESH' and obj.active_material and obj.active_material.use_nodes:
+            return [obj], [obj.active_material]
+        return [], []
+
+    def execute(self, context):
+        scene = context.scene
+        objects, materials = self.get_materials(context)
+        labels = [label for prop_name, label in TEXTURE_MAPS if getattr(self, prop_name)]
+        if not materials or not labels:
+            self.report({'WARNING'}, "No material or texture to add")
+            return {'CANCELLED'}
+
+        size = int(self.image_size)
+        sizes = {}
+        if self.use_texel_density:
+            from . import texel_density
+            sizes = texel_density.material_sizes(objects, scene.simple_bake_uv_channel, self.texel_density, 256, size)
+
+        # 作る画像のメモリを見積もり、予算を超える場合は警告する
+        budget = scene.simple_bake_memory_budget_mb * 1024 * 1024
+        if budget:
+            needed = sum(core.image_bytes(sizes.get(mat.name, size), sizes.get(mat.name, size)) for mat in materials) * len(labels)
+            if needed > budget:
+                self.report({'WARNING'}, f"The new textures need about {needed / (1024 * 1024):.0f} MB, more than the memory budget")
+
+        # 追加したノードのうち、今のベイクタイプのターゲットをアクティブにしてすぐベイクできるようにする
+        active_label = getattr(scene, PASS_TARGET_PROPS[scene.simple_bake_type])
+        for mat in materials:
+            if len(materials) > 1 or not self.name:
+                name_prefix = f"{self.name}{mat.name}"
+            else:
+                name_prefix = self.name
+            mat_size = sizes.get(mat.name, size)
+            created_textures = [(self.create_texture(name_prefix, label, mat_size), label) for label in labels]
+            self.add_nodes(mat.node_tree, created_textures, active_label)
+
+        self.report({'INFO'}, f"Added {len(labels)} texture(s) to {len(materials)} material(s)")
         return {'FINISHED'}
 
-    def create_texture(self, mat_name, suffix):
+    def create_texture(self, mat_name, suffix, size):
         image_name = f"{mat_name}{suffix}.png"
-        size = int(self.image_size)
         image = bpy.data.images.new(name=image_name, width=size, height=size)
         # Removed code to set the filepath and save the image
         return image
 
-    def add_nodes_to_shader_editor(self, context, textures):
+    def add_nodes(self, tree, textures, active_label):
         y_offset = 0
-        for area in context.screen.areas:
-            if area.type == 'NODE_EDITOR':
-                for space in area.spaces:
-                    if space.type == 'NODE_EDITOR' and space.edit_tree and space.edit_tree.type == 'SHADER':
-                        tree = space.edit_tree
-                        
-                        # Principled BSDFノードを追加
-                        principled_node = tree.nodes.new(type='ShaderNodeBsdfPrincipled')
-                        principled_node.location = (100, 520)
-                        principled_node.width = 140
-                        for socket in principled_node.inputs:
-                            if socket.name not in {"Base Color", "Metallic", "Roughness", "Normal"}:
-                                socket.hide = True
-                        
-                        for texture, label in textures:
-                            if texture is None:
-                                continue
-                            node = tree.nodes.new(type='ShaderNodeTexImage')
-                            node.image = texture
-                            node.location = (-60, 520 - y_offset)
-                            node.width = 140
-                            node.hide = True
-                            node.label = label
-                            if label == "Base":
-                                tree.links.new(node.outputs['Color'], principled_node.inputs['Base Color'])
-                            elif label == "Roughness":
-                                tree.links.new(node.outputs['Color'], principled_node.inputs['Roughness'])
-                            elif label == "Metallic":
-                                tree.links.new(node.outputs['Color'], principled_node.inputs['Metallic'])
-                            elif label == "Normal":
-                                node.image.colorspace_settings.name = 'Non-Color'
-                                normal_map_node = tree.nodes.new(type='ShaderNodeNormalMap')
-                                normal_map_node.location = (node.location.x, node.location.y - 40)
-                                normal_map_node.width = 140
-                                normal_map_node.hide = True
-                                tree.links.new(node.outputs['Color'], normal_map_node.inputs['Color'])
-                                tree.links.new(normal_map_node.outputs['Normal'], principled_node.inputs['Normal'])
-                            y_offset += 40
-                        return
+
+        # Principled BSDFノードを追加
+        principled_node = tree.nodes.new(type='ShaderNodeBsdfPrincipled')
+        principled_node.location = (100, 520)
+        principled_node.width = 140
+        for socket in principled_node.inputs:
+            if socket.name not in {"Base Color", "Metallic", "Roughness", "Normal"}:
+                socket.hide = True
+
+        active_node = None
+        for texture, label in textures:
+            if texture is None:
+                continue
+            node = tree.nodes.new(type='ShaderNodeTexImage')
+            node.image = texture
+            node.location = (-60, 520 - y_offset)
+            node.width = 140
+            node.hide = True
+            node.label = label
+            if active_node is None or label == active_label:
+                active_node = node
+            if label == "Base":
+                tree.links.new(node.outputs['Color'], principled_node.inputs['Base Color'])
+            elif label == "Roughness":
+                tree.links.new(node.outputs['Color'], principled_node.inputs['Roughness'])
+            elif label == "Metallic":
+                tree.links.new(node.outputs['Color'], principled_node.inputs['Metallic'])
+            elif label == "Normal":
+                node.image.colorspace_settings.name = 'Non-Color'
+                normal_map_node = tree.nodes.new(type='ShaderNodeNormalMap')
+                normal_map_node.location = (node.location.x, node.location.y - 40)
+                normal_map_node.width = 140
+                normal_map_node.hide = True
+                tree.links.new(node.outputs['Color'], normal_map_node.inputs['Color'])
+                tree.links.new(normal_map_node.outputs['Normal'], principled_node.inputs['Normal'])
+            y_offset += 40
+
+        if active_node is not None:
+            for node in tree.nodes:
+                node.select = node == active_node
+            tree.nodes.active = active_node
 
     def invoke(self, context, event):
         return context.window_manager.invoke_props_dialog(self)
 
     def draw(self, context):
         layout = self.layout
+        layout.prop(self, "scope", text="Materials")
         layout.prop(self, "name", text="Name")
-        layout.prop(self, "image_size", text="Image Size")
+        layout.prop(self, "image_size", text="Max Size" if self.use_texel_density else "Image Size")
+        row = layout.row(align=True)
+        row.prop(self, "use_texel_density", text="Texel Density")
+        sub = row.row(align=True)
+        sub.active = self.use_texel_density
+        sub.prop(self, "texel_density", text="px/m")
         layout.prop(self, "base", text="Base")
         layout.prop(self, "roughness", text="Roughness")
         layout.prop(self, "metallic", text="Metallic")
@@ -126,51 +188,55 @@ class SimpleBakeRemoveTexturesOperator(bpy.types.Operator):
     bl_label = "Remove Textures"
     bl_options = {'REGISTER', 'UNDO'}
 
-    images_to_remove: bpy.props.CollectionProperty(type=bpy.types.PropertyGroup)
+    images_to_remove: bpy.props.CollectionProperty(type=texture_index.SimpleBakeTextureItem)
+    active_index: bpy.props.IntProperty()
+    mode: bpy.props.EnumProperty(name="Remove", items=texture_index.REMOVE_MODE_ITEMS, default='SELECTED')
 
     @classmethod
     def poll(cls, context):
         # Render ResultとViewer Nodeを除外して、それ以外に画像ファイルが無い場合はボタンを無効にする
         for img in bpy.data.images:
-            if img.name not in {"Render Result", "Viewer Node"}:
+            if img.name not in texture_index.EXCLUDED_IMAGES:
                 return True
         return False
 
     def invoke(self, context, event):
-        self.images_to_remove.clear()
-        for img in bpy.data.images:
-            if img.name not in {"Render Result", "Viewer Node"}:
-                item = self.images_to_remove.add()
-                item.name = img.name
+        texture_index.fill_index(self.images_to_remove, texture_index.build_index(context.scene))
         wm = context.window_manager
-        return wm.invoke_props_dialog(self)
+        return wm.invoke_props_dialog(self, width=600)
 
     def draw(self, context):
         layout = self.layout
         layout.label(text="Select textures to remove:")
-        box = layout.box()
-        for item in self.images_to_remove:
-            row = box.row()
-            row.prop(item, "select", text="")
-            row.label(text=item.name)
+        # 表示する行数を固定し、残りはスクロールで見る
+        layout.template_list("SIMPLEBAKE_UL_textures", "", self, "images_to_remove", self, "active_index", rows=15)
+        if 0 <= self.active_index < len(self.images_to_remove):
+            references = self.images_to_remove[self.active_index].references
+            layout.label(text=f"Referenced by: {references}" if references else "Not referenced by any image node")
+
+        layout.prop(self, "mode", expand=True)
+        items = self.items_to_remove()
+        memory = sum(item.memory_mb for item in items)
+        layout.label(text=f"{len(items)} image(s), {texture_index.format_memory(memory)}")
+
+    def items_to_remove(self):
+        if self.mode == 'SELECTED':
+            return [item for item in self.images_to_remove if item.select]
+        return [item for item in self.images_to_remove if texture_index.matches_filter(item, self.mode)]
 
     def execute(self, context):
-        for item in self.images_to_remove:
-            if item.select:
-                img = bpy.data.images.get(item.name)
-                if img:
-                    bpy.data.images.remove(img)
-        self.report({'INFO'}, "Selected textures removed")
+        names = [item.name for item in self.items_to_remove()]
+        count, freed = texture_index.remove_images(names)
+        self.images_to_remove.clear()
+        self.report({'INFO'}, f"Removed {count} texture(s), freed {texture_index.format_memory(freed / (1024 * 1024))}")
         return {'FINISHED'}
 
 
 def register():
     bpy.utils.register_class(SimpleBakeAddTexturesOperator)
     bpy.utils.register_class(SimpleBakeRemoveTexturesOperator)
-    bpy.types.PropertyGroup.select = bpy.props.BoolProperty(name="Select")
 
 
 def unregister():
     bpy.utils.unregister_class(SimpleBakeAddTexturesOperator)
     bpy.utils.unregister_class(SimpleBakeRemoveTexturesOperator)
-    del bpy.types.PropertyGroup.select
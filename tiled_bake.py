@@ -0,0 +1,229 @@
+import math
+import os
+import tempfile
+
+import bpy
+import numpy as np
+
+from . import image_writer
+
+# 8K 以上や UDIM のベイク先を UV 空間の領域に分割してベイクする
+# 領域ごとに小さい画像へベイクし、結果を上の行から順にファイルへ書き出すので、
+# 一度に確保されるのは 1 領域分のベイクバッファと 1 行分の帯だけになる
+
+# Cycles のベイクで 1 ピクセルあたりに使われるおおよそのメモリ
+# (BakePixel、結果バッファ、ベイク先の画像バッファ)
+BAKE_BYTES_PER_PIXEL = 64
+TILE_UV_NAME = "SimpleBakeTile"
+TILE_IMAGE_NAME = "SimpleBakeTile"
+SCRATCH_IMAGE_NAME = "SimpleBakeScratch"
+
+
+def image_info(img):
+    # 生成画像のバッファを作らずにサイズとフォーマットを調べる
+    if img.source == 'GENERATED':
+        return img.generated_width, img.generated_height, 4, img.use_generated_float
+    width, height = img.size
+    return width, height, img.channels, img.is_float
+
+
+def bake_memory(width, height):
+    return width * height * BAKE_BYTES_PER_PIXEL
+
+
+def needs_tiling(img, budget_bytes):
+    if img.source == 'TILED':
+        return True
+    width, height, _channels, _is_float = image_info(img)
+    return bake_memory(width, height) > budget_bytes
+
+
+def plan_grid(width, height, channels, budget_bytes):
+    # 1 領域のベイクメモリと 1 行分の帯 (float32) が予算に収まる分割数 (n × n) を返す
+    n = 1
+    while n < min(width, height):
+        tile_width = math.ceil(width / n)
+        tile_height = math.ceil(height / n)
+        band = width * tile_height * channels * 4
+        if bake_memory(tile_width, tile_height) + band <= budget_bytes:
+            break
+        n *= 2
+    return n
+
+
+def split_edges(size, n):
+    return [round(i * size / n) for i in range(n + 1)]
+
+
+class TileUVLayers:
+    # ベイク用 UV をコピーした一時 UV レイヤーを作り、領域ごとに UV を変換する
+
+    def __init__(self, objects, uv_channel):
+        self.meshes = {obj.data.name: obj.data for obj in objects}
+        self.uv_channel = uv_channel
+        self.source_uvs = {}
+        self.active_indices = {}
+
+    def create(self):
+        for mesh in self.meshes.values():
+            index = self.uv_channel if 0 <= self.uv_channel < len(mesh.uv_layers) else mesh.uv_layers.active_index
+            uvs = np.empty(len(mesh.loops) * 2, np.float32)
+            mesh.uv_layers[index].data.foreach_get("uv", uvs)
+            self.active_indices[mesh.name] = mesh.uv_layers.active_index
+            layer = mesh.uv_layers.new(name=TILE_UV_NAME, do_init=False)
+            if layer is None:
+                raise RuntimeError(f"{mesh.name} has no free UV map slot for tiled baking")
+            self.source_uvs[mesh.name] = uvs
+            mesh.uv_layers.active = layer
+
+    def set_region(self, u0, v0, size_u, size_v):
+        # 領域 [u0, u0 + size_u] × [v0, v0 + size_v] が 0〜1 になるように変換する
+        for mesh_name, uvs in self.source_uvs.items():
+            mesh = self.meshes[mesh_name]
+            region = np.empty_like(uvs)
+            region[0::2] = (uvs[0::2] - u0) / size_u
+            region[1::2] = (uvs[1::2] - v0) / size_v
+            mesh.uv_layers[TILE_UV_NAME].data.foreach_set("uv", region)
+            mesh.update()
+
+    def remove(self):
+        for mesh_name in self.source_uvs:
+            mesh = self.meshes[mesh_name]
+            layer = mesh.uv_layers.get(TILE_UV_NAME)
+            if layer is not None:
+                mesh.uv_layers.remove(layer)
+            mesh.uv_layers.active_index = self.active_indices[mesh_name]
+        self.source_uvs.clear()
+
+
+def get_scratch_image():
+    # 分割ベイク中の画像以外のターゲットの書き込み先 (1×1 の捨て画像)
+    img = bpy.data.images.get(SCRATCH_IMAGE_NAME)
+    if img is None:
+        img = bpy.data.images.new(SCRATCH_IMAGE_NAME, 1, 1, alpha=True)
+    return img
+
+
+def get_tile_image(width, height, is_float, colorspace):
+    img = bpy.data.images.get(TILE_IMAGE_NAME)
+    if img is not None and (tuple(img.size) != (width, height) or img.is_float != is_float):
+        bpy.data.images.remove(img)
+        img = None
+    if img is None:
+        img = bpy.data.images.new(TILE_IMAGE_NAME, width, height, alpha=True, float_buffer=is_float)
+    img.colorspace_settings.name = colorspace
+    return img
+
+
+def output_path(img, is_float, udim):
+    ext = ".exr" if is_float else ".png"
+    if img.filepath:
+        path = bpy.path.abspath(img.filepath, library=img.library)
+    else:
+        directory = bpy.path.abspath("//") if bpy.data.filepath else os.path.join(tempfile.gettempdir(), "simple_bake_tiles")
+        path = os.path.join(directory, bpy.path.clean_name(os.path.splitext(img.name)[0]))
+    stem = os.path.splitext(path)[0]
+    if udim and "<UDIM>" not in stem:
+        stem += ".<UDIM>"
+    return stem + ext
+
+
+def image_outputs(img, is_float):
+    # (出力パス, 幅, 高さ, UV のオフセット u, v) のリスト。UDIM はタイルごとに 1 ファイル
+    if img.source == 'TILED':
+        pattern = output_path(img, is_float, udim=True)
+        outputs = []
+        for tile in img.tiles:
+            width, height = tile.size
+            if not width or not height:
+                width, height = img.generated_width, img.generated_height
+            offset = tile.number - 1001
+            outputs.append((pattern.replace("<UDIM>", str(tile.number)), width, height, offset % 10, offset // 10))
+        return pattern, outputs
+    width, height, _channels, _is_float = image_info(img)
+    path = output_path(img, is_float, udim=False)
+    return path, [(path, width, height, 0, 0)]
+
+
+def bake_region(bake_type, nodes, target, tile_img, scratch, uv_layers, region):
+    u0, v0, size_u, size_v = region
+    for node, img in nodes:
+        node.image = tile_img if img == target else scratch
+    uv_layers.set_region(u0, v0, size_u, size_v)
+    bpy.ops.object.bake(type=bake_type)
+    width, height = tile_img.size
+    pixels = np.empty(width * height * 4, np.float32)
+    tile_img.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, 4)
+
+
+def bake_large_image(bake_type, img, nodes, scratch, uv_layers, budget_bytes):
+    _width, _height, _channels, is_float = image_info(img)
+    colorspace = img.colorspace_settings.name
+    filepath, outputs = image_outputs(img, is_float)
+
+    for path, width, height, u_offset, v_offset in outputs:
+        n = plan_grid(width, height, 4, budget_bytes)
+        xs = split_edges(width, n)
+        ys = split_edges(height, n)
+        with image_writer.open_atomic(path) as f:
+            stream = image_writer.EXRStream(f, width, height, 4) if is_float else image_writer.PNGStream(f, width, height, 4)
+            # ファイルは上の行から書くので、V の大きい領域からベイクする
+            for j in reversed(range(n)):
+                band = np.empty((ys[j + 1] - ys[j], width, 4), np.float32)
+                for i in range(n):
+                    tile_img = get_tile_image(xs[i + 1] - xs[i], ys[j + 1] - ys[j], is_float, colorspace)
+                    region = (
+                        u_offset + xs[i] / width,
+                        v_offset + ys[j] / height,
+                        (xs[i + 1] - xs[i]) / width,
+                        (ys[j + 1] - ys[j]) / height,
+                    )
+                    band[:, xs[i]:xs[i + 1]] = bake_region(bake_type, nodes, img, tile_img, scratch, uv_layers, region)
+                stream.write_rows(band[::-1])
+            stream.finish()
+
+    # 書き出したファイルを画像のソースにする (ピクセルは次に使われたときに読み込まれる)
+    if img.source != 'TILED':
+        img.source = 'FILE'
+    img.filepath = filepath
+    img.reload()
+
+
+def bake_tiled_pass(bake_pass, objects, uv_channel, budget_bytes):
+    """予算を超えるターゲットを分割してベイクし、分割した画像の名前のリストを返す
+
+    分割が必要なターゲットが無い場合は何もせずに空のリストを返す
+    分割した画像はファイルに書き出してあり、ピクセルは読み込まれていない
+    """
+    images = {name: bpy.data.images[name] for name in bake_pass.image_names if name in bpy.data.images}
+    large = [img for img in images.values() if needs_tiling(img, budget_bytes)]
+    if not large:
+        return []
+
+    nodes = []
+    for mat_name, node_name, image_name in bake_pass.nodes:
+        node = bpy.data.materials[mat_name].node_tree.nodes[node_name]
+        nodes.append((node, images[image_name]))
+
+    scratch = get_scratch_image()
+    uv_layers = TileUVLayers(objects, uv_channel)
+    try:
+        # 予算内のターゲットは通常通り 1 回でベイクする
+        if len(large) < len(images):
+            for node, img in nodes:
+                node.image = scratch if img in large else img
+            bpy.ops.object.bake(type=bake_pass.bake_type)
+
+        uv_layers.create()
+        for img in large:
+            bake_large_image(bake_pass.bake_type, img, nodes, scratch, uv_layers, budget_bytes)
+    finally:
+        for node, img in nodes:
+            node.image = img
+        uv_layers.remove()
+        for name in (TILE_IMAGE_NAME, SCRATCH_IMAGE_NAME):
+            img = bpy.data.images.get(name)
+            if img is not None:
+                bpy.data.images.remove(img)
+    return [img.name for img in large]
@@ -1,5 +1,9 @@
+import sys
+
 import bpy
-import re
+from . import bake_cache, bake_timing, core, node_cache
+from .bake_settings import PASS_TARGET_PROPS
+from .bake_queue import bake_queue
 
 class SimpleBakePanel(bpy.types.Panel):
     bl_label = "Simple Bake"
@@ -16,6 +20,17 @@ class SimpleBakePanel(bpy.types.Panel):
         row = layout.row()
         row.enabled = self.is_bake_possible(context)
         row.operator("object.simple_bake_operator", text="Simple Bake")
+        row.operator("object.simple_bake_queue", text="", icon='SORTTIME')
+        row.operator("object.simple_bake_atlas", text="", icon='UV')
+        row.operator("object.simple_bake_export_spool", text="", icon='NETWORK_DRIVE')
+
+        # ベイクキューの進行状況
+        if bake_queue.running:
+            row = layout.row()
+            row.label(text=bake_queue.status_text(), icon='TIME')
+            row.operator("object.simple_bake_queue_cancel", text="", icon='CANCEL')
+        elif bake_queue.last_message:
+            layout.label(text=bake_queue.last_message, icon='INFO')
 
         # メッセージボックス
         row = layout.row()
@@ -26,52 +41,40 @@ class SimpleBakePanel(bpy.types.Panel):
         # Auto Save チェックボックス
         row = layout.row()
         row.prop(scene, "simple_bake_auto_save", text="Auto Save")
-
-        # Bake Type ラジオボタン
-        layout.label(text="Bake Type")
-        layout.prop(scene, "simple_bake_type", expand=True)
+        if scene.simple_bake_auto_save:
+            row.prop(scene, "simple_bake_save_format", text="")
+            if scene.simple_bake_save_format != 'EXR':
+                row.prop(scene, "simple_bake_png_compression", text="Level")
+            layout.prop(scene, "simple_bake_free_saved_images", text="Free Saved Images")
+            # 保存した画像の縮小版 (LOD)
+            row = layout.row(align=True)
+            row.prop(scene, "simple_bake_mip_chain", text="LOD Textures")
+            if scene.simple_bake_mip_chain:
+                row.prop(scene, "simple_bake_mip_min_size", text="")
+                row.prop(scene, "simple_bake_mip_filter", text="")
+            # 保存キューは Auto Save で初めて保存するときに読み込まれるので、再描画のたびに読み込まない (NumPy を使う)
+            image_writer = sys.modules.get(f"{__package__}.image_writer")
+            if image_writer is not None and image_writer.save_queue.pending:
+                layout.label(text=f"Saving {image_writer.save_queue.pending} image(s)...", icon='FILE_TICK')
+
+        # Bake Type ラジオボタン (マルチパスの場合は複数選択)
+        row = layout.row()
+        row.label(text="Bake Type")
+        row.prop(scene, "simple_bake_multi_pass", text="Multi Pass")
+        if scene.simple_bake_multi_pass:
+            layout.prop(scene, "simple_bake_pass_types", expand=True)
+        else:
+            layout.prop(scene, "simple_bake_type", expand=True)
 
     def is_bake_possible(self, context):
-        obj = context.active_object
-        if obj and obj.type == 'MESH':
-            if obj.material_slots:
-                for mat_slot in obj.material_slots:
-                    if mat_slot.material and mat_slot.material.use_nodes:
-                        active_node = self.get_active_image_node(context, mat_slot.material.node_tree)
-                        if active_node and active_node.type == 'TEX_IMAGE':
-                            return True
-        return False
+        bake_possible, _image_name, _material_name = node_cache.get_bake_target(context)
+        return bake_possible
 
     def get_bake_message(self, context):
-        obj = context.active_object
-        if obj and obj.type == 'MESH':
-            if obj.material_slots:
-                for mat_slot in obj.material_slots:
-                    if mat_slot.material and mat_slot.material.use_nodes:
-                        active_node = self.get_active_image_node(context, mat_slot.material.node_tree)
-                        if active_node and active_node.type == 'TEX_IMAGE' and active_node.image:
-                            texture_name = self.clean_texture_name(active_node.image.name, mat_slot.material.name)
-                            return "Bake to", texture_name
-                return "Bake to", "Not Selected"
-            else:
-                return "Bake to", "Not Selected"
-        else:
-            return "Bake to", "Not Selected"
-
-    def get_active_image_node(self, context, node_tree):
-        for area in context.screen.areas:
-            if area.type == 'NODE_EDITOR':
-                for space in area.spaces:
-                    if space.type == 'NODE_EDITOR' and space.node_tree == node_tree:
-                        return space.node_tree.nodes.active
-        return None
-
-    def clean_texture_name(self, texture_name, material_name):
-        # マテリアル名を除去
-        cleaned_name = re.sub(f"^{re.escape(material_name)}", "", texture_name)
-        # 拡張子と以降の文字列を除去
-        cleaned_name = re.sub(r"\..*$", "", cleaned_name)
-        return cleaned_name
+        _bake_possible, image_name, material_name = node_cache.get_bake_target(context)
+        if image_name:
+            return "Bake to", core.clean_texture_name(image_name, material_name)
+        return "Bake to", "Not Selected"
 
 class DummyOperator(bpy.types.Operator):
     bl_idname = "object.dummy_operator"
@@ -103,9 +106,106 @@ class BakeSettingsPanel(bpy.types.Panel):
         row = col.row(align=True)
         row.prop(scene, "simple_bake_samples", expand=True)
 
+        # アダプティブサンプリング (Samples は上限として使う)
+        col.prop(scene, "simple_bake_adaptive", text="Adaptive Samples")
+        if scene.simple_bake_adaptive:
+            col.prop(scene, "simple_bake_adaptive_min_samples", text="Start Samples")
+            col.prop(scene, "simple_bake_noise_threshold", text="Noise Threshold")
+
+        # 少ないサンプル数でベイクしてノイズ除去する
+        col.prop(scene, "simple_bake_denoise", text="Denoise")
+        if scene.simple_bake_denoise:
+            row = col.row(align=True)
+            row.prop(scene, "simple_bake_denoise_types", expand=True)
+            col.prop(scene, "simple_bake_denoise_guides", text="Normal / Albedo Guides")
+
         # Return to Render Samples チェックボックス
         col.prop(scene, "simple_bake_return_to_render_samples", text="Return to Render Samples")
 
+        # ハイポリ → ローポリのベイク
+        col.prop(scene, "simple_bake_selected_to_active", text="Selected to Active")
+        if scene.simple_bake_selected_to_active:
+            col.prop(scene, "simple_bake_auto_cage", text="Auto Ray Distance")
+            if not scene.simple_bake_auto_cage:
+                col.prop(scene, "simple_bake_cage_extrusion", text="Extrusion")
+                col.prop(scene, "simple_bake_max_ray_distance", text="Max Ray Distance")
+
+        # データが無いベイク先画像のサイズ
+        col.prop(scene, "simple_bake_target_size", text="Missing Image Size")
+
+        # ベイク先の画像のメモリの予算
+        col.prop(scene, "simple_bake_memory_budget_mb", text="Memory Budget (MB)")
+        if scene.simple_bake_memory_budget_mb:
+            row = col.row(align=True)
+            row.prop(scene, "simple_bake_memory_action", expand=True)
+
+        # 大きいターゲットや UDIM の分割ベイク
+        col.prop(scene, "simple_bake_tiled", text="Tiled Bake")
+        if scene.simple_bake_tiled:
+            col.prop(scene, "simple_bake_tile_memory_mb", text="Tile Memory (MB)")
+
+        # UV の島に合わせたエッジパディング
+        col.prop(scene, "simple_bake_padding", text="Edge Padding")
+        if scene.simple_bake_padding:
+            row = col.row(align=True)
+            row.prop(scene, "simple_bake_padding_mode", expand=True)
+            if scene.simple_bake_padding_mode == 'PIXELS':
+                col.prop(scene, "simple_bake_padding_pixels", text="Pixels")
+
+        # スレッド数とタイルサイズの自動調整
+        row = col.row(align=True)
+        row.prop(scene, "simple_bake_auto_tune", text="Auto Tune Threads / Tiles")
+        row.operator("object.simple_bake_clear_tuning", text="", icon='TRASH')
+
+        # ベイク結果のキャッシュ
+        col.prop(scene, "simple_bake_use_cache", text="Use Bake Cache")
+        if scene.simple_bake_use_cache:
+            col.prop(scene, "simple_bake_cache_dir", text="")
+            col.prop(scene, "simple_bake_cache_size_mb", text="Cache Size (MB)")
+            row = col.row(align=True)
+            row.label(text=f"Hits {bake_cache.stats.hits} / Misses {bake_cache.stats.misses}")
+            row.operator("object.simple_bake_clear_cache", text="", icon='TRASH')
+
+        # マルチパスの各ベイクタイプのターゲットノードのラベル
+        if scene.simple_bake_multi_pass:
+            col.label(text="Multi Pass Targets (Node Label)")
+            for bake_type, prop_name in PASS_TARGET_PROPS.items():
+                if bake_type in scene.simple_bake_pass_types:
+                    col.prop(scene, prop_name, text=bake_type.title())
+
+
+class BakeTimingPanel(bpy.types.Panel):
+    bl_label = "Bake Timing"
+    bl_idname = "RENDER_PT_bake_timing"
+    bl_parent_id = "RENDER_PT_simple_bake"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "render"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+        layout.prop(scene, "simple_bake_timing_log", text="Log")
+
+        # 最後のベイクの段階ごとの時間
+        record = bake_timing.last_record
+        if record is None:
+            layout.label(text="No bake has been timed yet")
+            return
+        col = layout.column(align=True)
+        for name, seconds in record["phases"].items():
+            row = col.row()
+            row.label(text=bake_timing.PHASE_LABELS.get(name, name))
+            row.label(text=f"{seconds:.3f} s")
+        row = col.row()
+        row.label(text="Total")
+        row.label(text=f"{record['total']:.3f} s")
+        resolutions = ", ".join(f"{count}× {size}" for size, count in record["resolutions"].items())
+        col.label(text=f"{record['images']} image(s) {resolutions}")
+        if record["peak_memory_mb"] is not None:
+            col.label(text=f"Peak Memory {record['peak_memory_mb']:.0f} MB")
+
 
 class TextureManagerPanel(bpy.types.Panel):
     bl_label = "Texture Manager"
@@ -122,11 +222,16 @@ class TextureManagerPanel(bpy.types.Panel):
         # Texture Managerの項目
         layout.operator("object.simple_bake_add_textures", text="Add")
         layout.operator("object.simple_bake_remove_textures", text="Remove")
+        row = layout.row(align=True)
+        row.operator("object.simple_bake_purge_textures", text="Purge Orphans").mode = 'ORPHAN'
+        row.operator("object.simple_bake_purge_textures", text="Purge Unused Outputs").mode = 'UNUSED_OUTPUT'
+        layout.operator("object.simple_bake_pack_channels", text="Pack Channels")
 
 
 def register():
     bpy.utils.register_class(SimpleBakePanel)
     bpy.utils.register_class(BakeSettingsPanel)
+    bpy.utils.register_class(BakeTimingPanel)
     bpy.utils.register_class(TextureManagerPanel)
     bpy.utils.register_class(DummyOperator)
 
@@ -134,5 +239,6 @@ def register():
 def unregister():
     bpy.utils.unregister_class(SimpleBakePanel)
     bpy.utils.unregister_class(BakeSettingsPanel)
+    bpy.utils.unregister_class(BakeTimingPanel)
     bpy.utils.unregister_class(TextureManagerPanel)
     bpy.utils.unregister_class(DummyOperator)